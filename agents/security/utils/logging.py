@@ -1,11 +1,4 @@
-import datetime
+# The security agents share the agents' audit logger and its sink.
+from agents.utils.logging import log_audit, set_audit_sink
 
-def log_audit(message: str):
-    """
-    Logs an audit message to the console with a timestamp.
-
-    Args:
-        message: The message to log.
-    """
-    timestamp = datetime.datetime.now().isoformat()
-    print(f"[AUDIT] [{timestamp}] {message}")
+__all__ = ["log_audit", "set_audit_sink"]
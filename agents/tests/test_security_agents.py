@@ -24,3 +24,14 @@ def test_anomaly_detector():
     result = service.detect_anomalies(['login', 'logout'])
     assert 'anomaly_detected' in result
     assert isinstance(result['anomaly_detected'], bool)
+
+def test_audit_messages_go_to_the_configured_sink():
+    from agents.utils.logging import set_audit_sink
+
+    messages = []
+    previous = set_audit_sink(messages.append)
+    try:
+        FraudService().get_risk_score({'amount': 500})
+    finally:
+        set_audit_sink(previous)
+    assert messages == ["Calculating risk score for transaction: {'amount': 500}", "Risk score calculated: 0.1"]
@@ -1,11 +1,36 @@
 import datetime
+from typing import Callable, Optional
+
+# Where audit messages go instead of the console, see set_audit_sink.
+_sink: Optional[Callable[[str], None]] = None
+
+
+def set_audit_sink(sink: Optional[Callable[[str], None]]) -> Optional[Callable[[str], None]]:
+    """
+    Sends audit messages to `sink` instead of the console, e.g. to the
+    backend's audit outbox. Passing None restores console logging.
+
+    Args:
+        sink: Callable taking the message, or None.
+
+    Returns:
+        The sink it replaces, so a caller can put it back.
+    """
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
 
 def log_audit(message: str):
     """
-    Logs an audit message to the console with a timestamp.
+    Logs an audit message to the configured sink, or to the console with a
+    timestamp when none is set.
 
     Args:
         message: The message to log.
     """
+    if _sink is not None:
+        _sink(message)
+        return
     timestamp = datetime.datetime.now().isoformat()
     print(f"[AUDIT] [{timestamp}] {message}")
@@ -1,26 +1,43 @@
-from fastapi import APIRouter, Query
+import anyio
+from fastapi import APIRouter, HTTPException, Query, Response, status
 from fastapi.responses import StreamingResponse
-from typing import List
+from pydantic_core import to_json
+from typing import Literal, Optional
 from datetime import date
 from app.schemas.analytics import (
     ActivityFeedResponse,
     ProjectionsResponse,
     IncomeTrendResponse,
     RevenueReportResponse,
+    ReportJobCreate,
+    ReportJobResponse,
     )
 from app.services import analytics as analytics_service
+from app.services.report_jobs import ReportJob, ReportQueueFull, read_chunks, report_jobs
+from app.utils.pagination import NEXT_CURSOR_HEADER
 
 router = APIRouter()
 
 
 @router.get("/activity/{user_id}", response_model=ActivityFeedResponse)
-async def get_user_activity(user_id: str):
+async def get_user_activity(
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1),
+    before: Optional[str] = None,
+):
     """
     Retrieves the activity feed for a specific user, containing a mix of
-    transactions and booking events in reverse chronological order.
+    transactions and booking events in reverse chronological order,
+    `limit` at a time. The cursor for the next (older) page is returned in
+    the X-Next-Cursor header and passed back as `before`.
     """
-    activity_items = await analytics_service.get_activity_feed(user_id)
-    return ActivityFeedResponse(items=activity_items)
+    page = await analytics_service.get_activity_feed(user_id, limit, before)
+    # The items are plain dicts of stored, already validated data; they go
+    # straight to JSON rather than through the response model's validation.
+    response = Response(to_json({"items": page.items}), media_type="application/json")
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return response
 
 
 @router.get("/projections/{user_id}", response_model=ProjectionsResponse)
@@ -37,18 +54,20 @@ async def get_income_trend(
     user_id: str,
     start_date: date,
     end_date: date,
+    granularity: Literal["day", "week", "month"] = Query("day"),
 ):
     """
-    Gets income and expense trends over a specified date range.
+    Gets income and expense trends over a specified date range, one point
+    per day, week or month.
     """
-    trend_data = await analytics_service.get_income_trend(user_id, start_date, end_date)
+    trend_data = await analytics_service.get_income_trend(user_id, start_date, end_date, granularity)
     return IncomeTrendResponse(trend=trend_data)
 
 
 @router.get("/revenue-report/{user_id}", response_model=RevenueReportResponse)
 async def get_revenue_report(
     user_id: str,
-    breakdown_by: str = Query("service", enum=["service", "client"]),
+    breakdown_by: Literal["service", "client"] = Query("service"),
 ):
     """
     Gets a revenue report broken down by service or client.
@@ -58,14 +77,74 @@ async def get_revenue_report(
 
 
 @router.get("/export/financial-report/{user_id}")
-async def export_financial_report(user_id: str):
+async def export_financial_report(
+    user_id: str,
+    compression: Literal["none", "gzip"] = Query("none"),
+):
     """
-    Generates and returns a CSV file of the user's financial history.
+    Streams a CSV file of the user's financial history, oldest first,
+    optionally gzip-compressed for long histories.
     """
-    csv_file = await analytics_service.generate_financial_report_csv(user_id)
-    response = StreamingResponse(
-        iter([csv_file.getvalue()]),
-        media_type="text/csv"
-    )
-    response.headers["Content-Disposition"] = "attachment; filename=financial_report.csv"
+    chunks = analytics_service.stream_financial_report_csv(user_id)
+    media_type, filename = "text/csv", "financial_report.csv"
+    if compression == "gzip":
+        chunks = analytics_service.gzip_chunks(chunks)
+        media_type, filename = "application/gzip", "financial_report.csv.gz"
+    response = StreamingResponse(chunks, media_type=media_type)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+def _get_job(job_id: str) -> ReportJob:
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
+
+@router.post("/jobs", response_model=ReportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_report_job(request: ReportJobCreate):
+    """
+    Starts building a financial report or income trend in the background.
+    Submitting a report that is already built, or being built, for the same
+    parameters and unchanged data returns the existing job. Answers 429
+    while too many jobs are waiting or running already.
+    """
+    try:
+        job = await anyio.to_thread.run_sync(report_jobs.submit, request)
+    except ReportQueueFull:
+        raise HTTPException(status_code=429, detail="Too many report jobs are pending, try again later")
+    return job.describe()
+
+
+@router.get("/jobs/{job_id}", response_model=ReportJobResponse)
+async def get_report_job(job_id: str):
+    """
+    Gets the status of a report job.
+    """
+    return _get_job(job_id).describe()
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_report_job_result(job_id: str, wait: bool = False):
+    """
+    Streams the report a job built. With `wait`, holds the request until
+    the job is done rather than answering 409 while it is still running.
+    """
+    job = _get_job(job_id)
+    if wait:
+        job = await report_jobs.wait(job)
+        if job is None:
+            raise HTTPException(status_code=410, detail="Report job result is no longer available")
+    if not job.done:
+        raise HTTPException(status_code=409, detail="Report job has not finished")
+    if job.error is not None:
+        raise HTTPException(status_code=500, detail=f"Report job failed: {job.error}")
+    try:
+        # Opened now, so that evicting the job later doesn't cut the download short.
+        f = open(job.path, "rb")
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="Report job result is no longer available")
+    response = StreamingResponse(read_chunks(f), media_type=job.media_type)
+    response.headers["Content-Disposition"] = f"attachment; filename={job.filename}"
     return response
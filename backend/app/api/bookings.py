@@ -1,26 +1,41 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import List, Optional
 from app.schemas.bookings import BookingCreate, BookingResponse, BookingUpdate
 from app.services import bookings as bookings_service
 from app.services import redis as redis_service
+from app.utils.pagination import paged_response, parse_fields
 
 router = APIRouter()
 
-
 @router.get("/", response_model=List[BookingResponse])
-async def get_all_bookings():
-    return await bookings_service.get_all_bookings()
+async def get_all_bookings(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated booking fields to return"),
+):
+    fields = parse_fields(fields, BookingResponse)
+    page = await bookings_service.get_all_bookings(limit, cursor)
+    return paged_response(response, page, fields)
 
 
 @router.post("/", response_model=BookingResponse)
 async def create_booking(booking: BookingCreate):
-    slot_key = f"{booking.start_time.isoformat()}-{booking.end_time.isoformat()}"
-    if not redis_service.reserve_slot(slot_key, booking.freelancer_id):
+    slot = (booking.freelancer_id, booking.start_time, booking.end_time)
+    try:
+        held = await redis_service.reserve_slots(*slot)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if not held:
         raise HTTPException(status_code=409, detail="Time slot is currently reserved.")
 
-    new_booking = await bookings_service.create_booking(booking)
+    try:
+        new_booking = await bookings_service.create_booking(booking)
+    except HTTPException:
+        await redis_service.release_slots(*slot)
+        raise
     if not new_booking:
-        redis_service.release_slot(slot_key, booking.freelancer_id)
+        await redis_service.release_slots(*slot)
         raise HTTPException(status_code=400, detail="Booking could not be created.")
     return new_booking
 
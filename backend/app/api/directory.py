@@ -1,25 +1,75 @@
-from fastapi import APIRouter
-from typing import List
+from fastapi import APIRouter, Query, Response
+from typing import List, Optional
 
 from app.schemas.directory import (
+    AutocompleteResponse,
+    CacheStats,
     FreelancerProfile,
+    FacetedFreelancers,
+    NearbyQuery,
     SearchResult,
     SearchQuery,
     FilterParams,
     SortParams,
 )
-from app.crud import search_profiles, filter_freelancers, sort_freelancers
+from app.utils.pagination import paged_response, parse_fields
+from app.crud import (
+    autocomplete,
+    directory_cache,
+    search_profiles,
+    filter_freelancers,
+    filter_freelancers_with_facets,
+    nearest_freelancers,
+    sort_freelancers,
+)
 
 router = APIRouter()
 
+FIELDS_DESCRIPTION = "Comma-separated profile fields to return, e.g. `@laundrID,rating`"
+
+
 @router.post("/search", response_model=SearchResult)
-async def search(query: SearchQuery):
-    return await search_profiles(query)
+async def search(
+    query: SearchQuery,
+    response: Response,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    fields = parse_fields(fields, FreelancerProfile)
+    return paged_response(response, await search_profiles(query), fields)
+
+@router.get("/autocomplete", response_model=AutocompleteResponse)
+async def autocomplete_endpoint(
+    prefix: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+):
+    return await autocomplete(prefix, limit)
 
 @router.post("/freelancers/filter", response_model=List[FreelancerProfile])
-async def filter_freelancers_endpoint(params: FilterParams):
-    return await filter_freelancers(params)
+async def filter_freelancers_endpoint(
+    params: FilterParams,
+    response: Response,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    fields = parse_fields(fields, FreelancerProfile)
+    return paged_response(response, await filter_freelancers(params), fields)
+
+@router.post("/freelancers/filter/faceted", response_model=FacetedFreelancers)
+async def filter_freelancers_faceted_endpoint(params: FilterParams, response: Response):
+    return paged_response(response, await filter_freelancers_with_facets(params))
 
 @router.post("/freelancers/sort", response_model=List[FreelancerProfile])
-async def sort_freelancers_endpoint(params: SortParams):
-    return await sort_freelancers(params)
+async def sort_freelancers_endpoint(
+    params: SortParams,
+    response: Response,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    fields = parse_fields(fields, FreelancerProfile)
+    return paged_response(response, await sort_freelancers(params), fields)
+
+@router.post("/freelancers/nearby", response_model=List[FreelancerProfile])
+async def nearby_freelancers_endpoint(query: NearbyQuery):
+    return await nearest_freelancers(query)
+
+@router.get("/cache/stats", response_model=CacheStats)
+async def cache_stats():
+    return directory_cache.stats()
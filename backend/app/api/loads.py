@@ -1,10 +1,24 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+import logging
+import os
+from typing import List, Optional, Union
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from itsdangerous import URLSafeTimedSerializer
+from pydantic import TypeAdapter, ValidationError
+from pydantic_core import to_json
 
 from app.schemas.loads import LoadCreate, LoadResponse, SwapFunds, AstraRoutineCreate
 from app.services import astra
-from app.fee_calculator import calculate_fees
-from app.crud import get_profile_by_laundr_id
+from app.services.astra_client import AstraError, AstraUnavailable
+from app.services.idempotency import IDEMPOTENCY_HEADER, idempotency_store
+from app.fee_calculator import calculate_fees, calculate_fees_bulk
+from app.crud import db_profiles, get_profile_by_laundr_id
+from app.middleware.compliance import compliance_denial
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -12,14 +26,32 @@ router = APIRouter()
 SECRET_KEY = "a_very_secret_key_for_invites"
 invite_serializer = URLSafeTimedSerializer(SECRET_KEY)
 
+# Astra routines a single /send-batch request creates at the same time
+SEND_BATCH_CONCURRENCY = int(os.getenv("SEND_BATCH_CONCURRENCY", "32"))
+SEND_BATCH_MAX_ITEMS = int(os.getenv("SEND_BATCH_MAX_ITEMS", "10000"))
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+_load_adapter = TypeAdapter(LoadCreate)
+
+# Retries carrying the same key get the first response instead of a second transfer.
+IDEMPOTENCY_KEY = Header(
+    None,
+    alias=IDEMPOTENCY_HEADER,
+    description="Client-generated unique key; retries with the same key are answered once",
+)
+
 
-# Dummy audit log
 def audit_log(action: str, details: dict):
+    """Records a transfer in the activity feed and the audit trail."""
     astra.log_transaction(action, details)
 
 
 @router.post("/send-load", response_model=LoadResponse)
-async def send_load(load: LoadCreate):
+async def send_load(load: LoadCreate, idempotency_key: Optional[str] = IDEMPOTENCY_KEY):
+    return await idempotency_store.run("send-load", idempotency_key, load, lambda: _send_load(load))
+
+
+async def _send_load(load: LoadCreate) -> LoadResponse:
     # 1. Check if sender exists
     sender_profile = await get_profile_by_laundr_id(load.sender_id)
     if not sender_profile:
@@ -27,54 +59,178 @@ async def send_load(load: LoadCreate):
 
     # 2. Calculate fees
     total_fee, sender_fee, recipient_fee = calculate_fees(load.amount)
-    net_amount = load.amount - total_fee
 
     # 3. Check if recipient is on the platform
     recipient_profile = await get_profile_by_laundr_id(load.recipient_id)
-    invite_link = None
-    if not recipient_profile:
-        # Off-platform user, generate invite link
-        token = invite_serializer.dumps(load.recipient_id, salt="invite-salt")
-        invite_link = f"https://laundr.me/claim?token={token}"
-        message = "Load sent to an off-platform user. They will be invited to join."
-    else:
-        message = "Load sent successfully to on-platform user."
 
     # 4. Call Astra service to create routine
-    astra_routine_data = AstraRoutineCreate(
+    routine = await astra.create_routine(_send_routine(load))
+
+    # 5. Log the transaction
+    audit_log("send_load", _send_audit_details(load, routine, total_fee))
+
+    # 6. Return response
+    return _send_response(load, routine, (total_fee, sender_fee, recipient_fee), recipient_profile is not None)
+
+
+def _send_routine(load: LoadCreate) -> AstraRoutineCreate:
+    return AstraRoutineCreate(
         type="send",
         amount=load.amount,
         source_id=load.sender_id,
         destination_id=load.recipient_id
     )
-    routine = await astra.create_routine(astra_routine_data)
 
-    # 5. Log the transaction
-    audit_log(
-        "send_load",
-        {
-            "transaction_id": routine.id,
-            "sender_id": load.sender_id,
-            "recipient_id": load.recipient_id,
-            "amount": load.amount,
-            "fee": total_fee,
-        },
-    )
 
-    # 6. Return response
+def _send_audit_details(load: LoadCreate, routine, total_fee: float) -> dict:
+    return {
+        "transaction_id": routine.id,
+        "sender_id": load.sender_id,
+        "recipient_id": load.recipient_id,
+        "amount": load.amount,
+        "fee": total_fee,
+    }
+
+
+def _send_response(load: LoadCreate, routine, fees: tuple, recipient_on_platform: bool) -> LoadResponse:
+    total_fee, sender_fee, recipient_fee = fees
+    invite_link = None
+    if not recipient_on_platform:
+        # Off-platform user, generate invite link
+        token = invite_serializer.dumps(load.recipient_id, salt="invite-salt")
+        invite_link = f"https://laundr.me/claim?token={token}"
+        message = "Load sent to an off-platform user. They will be invited to join."
+    else:
+        message = "Load sent successfully to on-platform user."
     return LoadResponse(
         transaction_id=routine.id,
         status=routine.status,
         sender_fee=sender_fee,
         recipient_fee=recipient_fee,
         total_fee=total_fee,
-        net_amount=net_amount,
+        net_amount=load.amount - total_fee,
         message=message,
         invite_link=invite_link,
     )
 
+
+@router.post("/send-batch", response_class=StreamingResponse)
+async def send_batch(request: Request):
+    """
+    Sends many loads in one request.
+
+    The body is a JSON array of send-load items, or NDJSON (one item per
+    line) when sent as application/x-ndjson. Profiles are resolved and fees
+    priced for the whole batch up front, then Astra routines are created
+    with up to SEND_BATCH_CONCURRENCY in flight. Every item runs the same
+    compliance checks as /send-load.
+
+    The response is NDJSON with one line per item, written as soon as the
+    item finishes, so lines arrive out of order: each carries the item's
+    `index` and `status_code`, plus the send-load response as `result` or
+    the error as `detail`.
+    """
+    items = await _read_batch(request)
+    loads = [item for item in items if isinstance(item, LoadCreate)]
+    profiles = db_profiles.get_many_by_laundr_id(
+        {laundr_id for load in loads for laundr_id in (load.sender_id, load.recipient_id)}
+    )
+    fees = calculate_fees_bulk(load.amount for load in loads)
+    return StreamingResponse(_send_batch_lines(items, profiles, iter(fees)), media_type="application/x-ndjson")
+
+
+async def _read_batch(request: Request) -> List[Union[LoadCreate, ValidationError]]:
+    body = await request.body()
+    media_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if media_type in NDJSON_MEDIA_TYPES:
+        raw_items = [line for line in body.splitlines() if line.strip()]
+        validate = _load_adapter.validate_json
+    else:
+        try:
+            raw_items = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(raw_items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        validate = _load_adapter.validate_python
+    if len(raw_items) > SEND_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch holds at most {SEND_BATCH_MAX_ITEMS} items")
+
+    items = []
+    for raw in raw_items:
+        try:
+            items.append(validate(raw))
+        except ValidationError as exc:
+            items.append(exc)
+    return items
+
+
+def _batch_line(index: int, status_code: int, result=None, detail=None) -> bytes:
+    line = {"index": index, "status_code": status_code}
+    if result is not None:
+        line["result"] = result
+    else:
+        line["detail"] = detail
+    return to_json(line) + b"\n"
+
+
+async def _send_batch_lines(items: list, profiles: dict, fees):
+    semaphore = asyncio.Semaphore(SEND_BATCH_CONCURRENCY)
+
+    async def send(index: int, load: LoadCreate, load_fees: tuple) -> bytes:
+        try:
+            async with semaphore:
+                routine = await astra.create_routine(_send_routine(load))
+            # Logged as soon as the routine exists, as /send-load does; the audit outbox batches the writes.
+            audit_log("send_load", _send_audit_details(load, routine, load_fees[0]))
+            response = _send_response(load, routine, load_fees, load.recipient_id in profiles)
+        except AstraUnavailable:
+            return _batch_line(index, 503, detail="Astra is unavailable, try again later")
+        except AstraError as exc:
+            return _batch_line(index, 502, detail=str(exc))
+        except ValueError as exc:
+            return _batch_line(index, 400, detail=str(exc))
+        except Exception:
+            # One item failing must not cut the stream short for the others.
+            logger.exception("send-batch item %d failed", index)
+            return _batch_line(index, 500, detail="Internal Server Error")
+        return _batch_line(index, 200, result=response)
+
+    rejected, tasks = [], []
+    for index, item in enumerate(items):
+        if isinstance(item, ValidationError):
+            rejected.append(_batch_line(index, 422, detail=item.errors(include_url=False, include_context=False)))
+            continue
+        load_fees = next(fees)
+        sender_profile = profiles.get(item.sender_id)
+        if sender_profile is None:
+            rejected.append(_batch_line(index, 404, detail=f"Sender with laundr_id {item.sender_id} not found"))
+            continue
+        denial = compliance_denial(sender_profile, item.model_dump())
+        if denial:
+            rejected.append(_batch_line(index, 403, detail=denial))
+            continue
+        if load_fees is None:
+            rejected.append(_batch_line(index, 400, detail="Transaction amount must be at least $5.00"))
+            continue
+        tasks.append(asyncio.create_task(send(index, item, load_fees)))
+
+    try:
+        for line in rejected:
+            yield line
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # The client may disconnect mid-stream: stop creating routines.
+        for task in tasks:
+            task.cancel()
+
 @router.post("/request-load", response_model=LoadResponse)
-async def request_load(load: LoadCreate):
+async def request_load(load: LoadCreate, idempotency_key: Optional[str] = IDEMPOTENCY_KEY):
+    return await idempotency_store.run("request-load", idempotency_key, load, lambda: _request_load(load))
+
+
+async def _request_load(load: LoadCreate) -> LoadResponse:
     # In a request, the sender is the one being asked for money,
     # and the recipient is the one making the request.
 
@@ -124,7 +280,11 @@ async def request_load(load: LoadCreate):
     )
 
 @router.post("/swap-funds", response_model=LoadResponse)
-async def swap_funds(swap: SwapFunds):
+async def swap_funds(swap: SwapFunds, idempotency_key: Optional[str] = IDEMPOTENCY_KEY):
+    return await idempotency_store.run("swap-funds", idempotency_key, swap, lambda: _swap_funds(swap))
+
+
+async def _swap_funds(swap: SwapFunds) -> LoadResponse:
     # 1. Check if both users exist on the platform
     source_profile = await get_profile_by_laundr_id(swap.source_id)
     if not source_profile:
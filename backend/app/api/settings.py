@@ -3,13 +3,10 @@ from app.schemas.settings import Settings, SettingsUpdate
 from app.dependencies import get_current_verified_user
 from app.schemas.profile import Profile
 from app.crud import db_settings
+from app.services.audit import audit_log
 
 router = APIRouter()
 
-# Dummy audit log
-def audit_log(action: str, details: dict):
-    print(f"AUDIT: {action} - {details}")
-
 @router.get("/{user_id}", response_model=Settings)
 async def get_settings(user_id: int):
     if user_id not in db_settings:
@@ -31,6 +28,7 @@ async def update_settings(
 
     for field, value in update_data.items():
         setattr(existing_settings, field, value)
+    db_settings[user_id] = existing_settings
 
     audit_log("update_settings", {"user_id": user_id, "updated_fields": list(update_data.keys())})
     return existing_settings
@@ -1,11 +1,50 @@
 from fastapi import HTTPException
 from app.schemas.profile import Profile
-from app.schemas.directory import FreelancerProfile, SearchQuery, FilterParams, SortParams
-from typing import List
-
-# Dummy databases
-db_profiles = {}
-db_settings = {}
+from app.schemas.directory import (
+    FreelancerProfile,
+    SearchQuery,
+    FilterParams,
+    SortParams,
+    NearbyQuery,
+    parse_location,
+)
+from app.indexes.autocomplete import PrefixIndex
+from app.indexes.facets import FacetIndex
+from app.indexes.fuzzy import FuzzyIndex
+from app.indexes.geo import GeoIndex
+from app.indexes.profile_store import ProfileStore
+from app.indexes.ranking import FreelancerFeatureStore
+from app.indexes.search import SearchIndex
+from app.storage.repositories import storage
+from app.utils.cache import TTLCache
+from app.utils.pagination import Page, decode_cursor, encode_cursor, page_by_id
+from typing import Callable, Hashable, List
+from pydantic import BaseModel
+import numpy as np
+import os
+
+db_profiles = ProfileStore(storage.profiles)
+db_settings = storage.settings
+
+# Secondary indexes, kept in sync by the profile store
+search_index = SearchIndex()
+feature_store = FreelancerFeatureStore()
+facet_index = FacetIndex()
+geo_index = GeoIndex()
+prefix_index = PrefixIndex()
+fuzzy_index = FuzzyIndex()
+db_profiles.register_index(search_index)
+db_profiles.register_index(feature_store)
+db_profiles.register_index(facet_index)
+db_profiles.register_index(geo_index)
+db_profiles.register_index(prefix_index)
+db_profiles.register_index(fuzzy_index)
+
+# Directory query results, keyed on the normalized query and the store generation
+directory_cache = TTLCache(
+    maxsize=int(os.getenv("DIRECTORY_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("DIRECTORY_CACHE_TTL", "30")),
+)
 
 async def get_profile_by_id(user_id: int) -> Profile:
     if user_id not in db_profiles:
@@ -14,74 +53,140 @@ async def get_profile_by_id(user_id: int) -> Profile:
 
 
 async def get_profile_by_laundr_id(laundr_id: str):
-    for profile in db_profiles.values():
-        if profile.laundr_id == laundr_id:
-            return profile
-    return None
-
-async def search_profiles(query: SearchQuery) -> dict:
+    return db_profiles.get_by_laundr_id(laundr_id)
+
+def _cache_key(kind: str, params: BaseModel) -> Hashable:
+    fields = params.model_dump()
+    if fields.get("location"):
+        fields["location"] = parse_location(fields["location"])
+    if kind == "search":
+        fields["term"] = fields["term"].lower()
+    return kind, tuple(sorted(fields.items())), db_profiles.generation
+
+def _cached(kind: str, params: BaseModel, compute: Callable):
+    # Any profile write bumps the generation, so entries computed before it
+    # can never be served again and simply age out of the LRU.
+    key = _cache_key(kind, params)
+    result = directory_cache.get(key)
+    if result is None:
+        result = compute(params)
+        directory_cache.put(key, result)
+    return result
+
+async def search_profiles(query: SearchQuery) -> Page:
+    return _cached("search", query, _search_profiles)
+
+def _search_profiles(query: SearchQuery) -> Page:
     users = []
     freelancers = []
     term = query.term.lower()
-
-    for profile in db_profiles.values():
-        is_match = (
-            term in profile.laundr_id.lower()
-            or (profile.headline and term in profile.headline.lower())
-            or any(term in skill.lower() for skill in profile.skill_tags)
-        )
-
-        if is_match:
-            if isinstance(profile, FreelancerProfile):
-                freelancers.append(profile)
-            else:
-                users.append(profile)
-
-    return {"users": users, "freelancers": freelancers}
-
-async def filter_freelancers(params: FilterParams) -> List[FreelancerProfile]:
-    freelancers = [p for p in db_profiles.values() if isinstance(p, FreelancerProfile)]
-
-    if params.category:
-        freelancers = [f for f in freelancers if params.category in f.skill_tags]
+    user_ids = search_index.search(term)
+    if query.fuzzy and term:
+        user_ids = sorted(set(user_ids) | fuzzy_index.search(term, query.max_distance))
+    user_ids, next_cursor = page_by_id("search", user_ids, query.cursor, query.limit)
+
+    for user_id in user_ids:
+        profile = db_profiles[user_id]
+        if isinstance(profile, FreelancerProfile):
+            freelancers.append(profile)
+        else:
+            users.append(profile)
+
+    return Page({"users": users, "freelancers": freelancers}, next_cursor)
+
+async def autocomplete(prefix: str, limit: int) -> dict:
+    return {"suggestions": prefix_index.complete(prefix, limit)}
+
+async def filter_freelancers(params: FilterParams) -> Page:
+    return _cached("filter", params, _filter_freelancers)
+
+def _filter_freelancers(params: FilterParams) -> Page:
+    bitmap = _match_facets(params)
+    user_ids, next_cursor = page_by_id("filter", facet_index.user_ids(bitmap), params.cursor, params.limit)
+    return Page([db_profiles[user_id] for user_id in user_ids], next_cursor)
+
+async def filter_freelancers_with_facets(params: FilterParams) -> Page:
+    return _cached("faceted", params, _filter_freelancers_with_facets)
+
+def _filter_freelancers_with_facets(params: FilterParams) -> Page:
+    bitmap = _match_facets(params)
+    user_ids, next_cursor = page_by_id("faceted", facet_index.user_ids(bitmap), params.cursor, params.limit)
+    return Page({
+        "freelancers": [db_profiles[user_id] for user_id in user_ids],
+        "facets": facet_index.counts(bitmap),
+    }, next_cursor)
+
+def _match_facets(params: FilterParams):
+    bitmap = facet_index.match(
+        category=params.category,
+        min_rating=params.min_rating,
+        availability=params.availability,
+    )
     if params.location:
-        # Location data is not yet available in the Profile model.
-        # This will be a future implementation.
-        pass
-    if params.min_rating:
-        freelancers = [f for f in freelancers if f.rating and f.rating >= params.min_rating]
+        lat, lon = parse_location(params.location)
+        nearby, _ = geo_index.within(lat, lon, params.radius_km)
+        bitmap = facet_index.restrict(bitmap, nearby.tolist())
+    return bitmap
 
-    return freelancers
+async def nearest_freelancers(query: NearbyQuery) -> List[FreelancerProfile]:
+    lat, lon = parse_location(query.location)
+    return [db_profiles[user_id] for user_id, _ in geo_index.nearest(lat, lon, query.k)]
 
-async def sort_freelancers(params: SortParams) -> List[FreelancerProfile]:
-    freelancers = [p for p in db_profiles.values() if isinstance(p, FreelancerProfile)]
-
-    def calculate_score(freelancer: FreelancerProfile):
-        score = 0
-        # These are dummy values for now, as they are not in the schema
-        sentiment = 0.5
-        activity = 0.5
-        proximity = 0.5
-        price = 0.5
-
-        score += (freelancer.rating or 0) * params.rating_weight
-        score += sentiment * params.sentiment_weight
-        score += activity * params.activity_weight
-        score += proximity * params.proximity_weight
-        score += price * params.price_weight
-        return score
-
-    reverse = params.sort_by in ["rating", "score"]
+async def sort_freelancers(params: SortParams) -> Page:
+    return _cached("sort", params, _sort_freelancers)
 
-    key_func = None
+def _sort_freelancers(params: SortParams) -> Page:
     if params.sort_by == "score":
-        key_func = calculate_score
+        weights = np.array([
+            params.rating_weight,
+            params.sentiment_weight,
+            params.activity_weight,
+            params.proximity_weight,
+            params.price_weight,
+        ])
+        proximity = None
+        if params.location:
+            # Linear falloff from 1 at the point to 0 at the radius edge.
+            lat, lon = parse_location(params.location)
+            nearby, distances = geo_index.within(lat, lon, params.proximity_radius_km)
+            proximity = feature_store.proximity(nearby, 1 - distances / params.proximity_radius_km)
+        keys, descending = feature_store.scores(weights, proximity), True
     elif params.sort_by == "rating":
-        key_func = lambda f: f.rating or 0
-    elif hasattr(FreelancerProfile, params.sort_by):
-        key_func = lambda f: getattr(f, params.sort_by) or 0
-
-    if key_func:
-        return sorted(freelancers, key=key_func, reverse=reverse)
-
-    return freelancers
+        keys, descending = feature_store.column("rating"), True
+    elif params.sort_by == "reviews":
+        keys, descending = feature_store.column("reviews"), False
+    else:
+        return _sort_by_attribute(params)
+
+    after = None
+    if params.cursor:
+        after = tuple(decode_cursor(params.cursor, "sort", (int, float), int))
+    # One extra row tells whether another page follows.
+    limit = None if params.limit is None else params.limit + 1
+    user_ids = feature_store.top(keys, descending, params.offset, limit, after)
+    next_cursor = None
+    if params.limit is not None and len(user_ids) > params.limit:
+        user_ids = user_ids[:params.limit]
+        last = user_ids[-1]
+        next_cursor = encode_cursor("sort", feature_store.key(keys, last), last)
+    return Page([db_profiles[user_id] for user_id in user_ids], next_cursor)
+
+
+def _sort_by_attribute(params: SortParams) -> Page:
+    """Fallback for sort keys that have no column in the feature store."""
+    freelancers = [p for p in db_profiles.values() if isinstance(p, FreelancerProfile)]
+    if hasattr(FreelancerProfile, params.sort_by):
+        freelancers.sort(key=lambda f: getattr(f, params.sort_by) or 0)
+    if params.cursor:
+        # No sort key to seek on, so resume after the last freelancer seen.
+        (last,) = decode_cursor(params.cursor, "sort:" + params.sort_by, int)
+        positions = [i for i, f in enumerate(freelancers) if f.user_id == last]
+        if not positions:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        freelancers = freelancers[positions[0] + 1:]
+    end = None if params.limit is None else params.offset + params.limit
+    page = freelancers[params.offset:end]
+    next_cursor = None
+    if end is not None and len(freelancers) > end:
+        next_cursor = encode_cursor("sort:" + params.sort_by, page[-1].user_id)
+    return Page(page, next_cursor)
@@ -1,15 +1,38 @@
+from typing import Dict, Iterable, List, Optional
+
 from fastapi import HTTPException
 
+MINIMUM_AMOUNT = 5.00
+
+
+def _fees(amount: float) -> tuple[float, float, float]:
+    total_fee = max(1.50, (0.03 * amount) + 0.74)
+    sender_fee = total_fee / 2
+    recipient_fee = total_fee / 2
+    return round(total_fee, 2), round(sender_fee, 2), round(recipient_fee, 2)
+
+
 def calculate_fees(amount: float) -> tuple[float, float, float]:
     """
     Calculates the transaction fees.
     Enforces the minimum transaction amount.
     Returns a tuple of (total_fee, sender_fee, recipient_fee).
     """
-    if amount < 5.00:
+    if amount < MINIMUM_AMOUNT:
         raise HTTPException(status_code=400, detail="Transaction amount must be at least $5.00")
+    return _fees(amount)
 
-    total_fee = max(1.50, (0.03 * amount) + 0.74)
-    sender_fee = total_fee / 2
-    recipient_fee = total_fee / 2
-    return round(total_fee, 2), round(sender_fee, 2), round(recipient_fee, 2)
+
+def calculate_fees_bulk(amounts: Iterable[float]) -> List[Optional[tuple[float, float, float]]]:
+    """
+    Calculates the fees of many transactions at once, giving None for
+    amounts under the minimum instead of raising. Payout batches repeat
+    amounts a lot, so each distinct amount is priced once.
+    """
+    priced: Dict[float, Optional[tuple[float, float, float]]] = {}
+    fees = []
+    for amount in amounts:
+        if amount not in priced:
+            priced[amount] = _fees(amount) if amount >= MINIMUM_AMOUNT else None
+        fees.append(priced[amount])
+    return fees
@@ -0,0 +1,117 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+# A leaf bursts into per-character children once it holds this many entries.
+BURST_THRESHOLD = 2048
+
+# (lowercased term, kind)
+Entry = Tuple[str, str]
+
+
+class _Node:
+    __slots__ = ("depth", "children", "entries")
+
+    def __init__(self, depth: int):
+        self.depth = depth
+        self.children: Optional[Dict[str, "_Node"]] = None
+        self.entries: Optional[List[Entry]] = []
+
+
+class PrefixIndex:
+    """
+    Burst trie over laundr_ids and skill tags for autocomplete.
+
+    Internal nodes branch on one character; leaves hold a sorted list of
+    entries sharing the node's prefix and burst into children when they grow
+    past BURST_THRESHOLD, which keeps inserts cheap without paying for a
+    node per character. Suggestions come back in lexicographic order with
+    the number of profiles carrying each term.
+    """
+
+    def __init__(self):
+        self._root = _Node(0)
+        # entry -> [display text, profile count]
+        self._terms: Dict[Entry, list] = {}
+        self._by_user: Dict[int, Tuple[Tuple[Entry, str], ...]] = {}
+
+    def add(self, user_id: int, profile) -> None:
+        entries = {(profile.laundr_id.lower(), "laundr_id"): profile.laundr_id}
+        for skill in profile.skill_tags:
+            entries.setdefault((skill.lower(), "skill"), skill)
+        self._by_user[user_id] = tuple(entries.items())
+        for entry, text in entries.items():
+            term = self._terms.get(entry)
+            if term is None:
+                self._terms[entry] = [text, 1]
+                self._insert(entry)
+            else:
+                term[1] += 1
+
+    def remove(self, user_id: int) -> None:
+        for entry, _ in self._by_user.pop(user_id, ()):
+            term = self._terms[entry]
+            term[1] -= 1
+            if not term[1]:
+                del self._terms[entry]
+                self._delete(entry)
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def complete(self, prefix: str, limit: int = 10) -> List[dict]:
+        """Returns up to `limit` suggestions whose term starts with `prefix`."""
+        prefix = prefix.lower()
+        node = self._root
+        while node.children is not None and node.depth < len(prefix):
+            node = node.children.get(prefix[node.depth])
+            if node is None:
+                return []
+        suggestions: List[dict] = []
+        self._collect(node, prefix, limit, suggestions)
+        return suggestions
+
+    def _collect(self, node: _Node, prefix: str, limit: int, out: List[dict]) -> None:
+        if node.entries is not None:
+            entries = node.entries
+            for i in range(bisect_left(entries, (prefix, "")), len(entries)):
+                if len(out) >= limit or not entries[i][0].startswith(prefix):
+                    return
+                text, count = self._terms[entries[i]]
+                out.append({"text": text, "kind": entries[i][1], "count": count})
+            return
+        for char in sorted(node.children):
+            if len(out) >= limit:
+                return
+            self._collect(node.children[char], prefix, limit, out)
+
+    def _leaf(self, key: str) -> _Node:
+        node = self._root
+        while node.children is not None:
+            char = key[node.depth] if node.depth < len(key) else ""
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node(node.depth + 1)
+            node = child
+        return node
+
+    def _insert(self, entry: Entry) -> None:
+        node = self._leaf(entry[0])
+        insort(node.entries, entry)
+        if len(node.entries) > BURST_THRESHOLD and any(len(key) > node.depth for key, _ in node.entries):
+            self._burst(node)
+
+    def _delete(self, entry: Entry) -> None:
+        entries = self._leaf(entry[0]).entries
+        del entries[bisect_left(entries, entry)]
+
+    @staticmethod
+    def _burst(node: _Node) -> None:
+        children: Dict[str, _Node] = {}
+        # Entries are sorted, so each child's list is built already in order.
+        for entry in node.entries:
+            char = entry[0][node.depth] if node.depth < len(entry[0]) else ""
+            child = children.get(char)
+            if child is None:
+                child = children[char] = _Node(node.depth + 1)
+            child.entries.append(entry)
+        node.children, node.entries = children, None
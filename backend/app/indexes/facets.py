@@ -0,0 +1,185 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.schemas.directory import FreelancerProfile
+
+_WORD_BITS = 64
+_INITIAL_WORDS = 16
+# Bits set in every byte value, for popcounts over a uint8 view of a bitmap.
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+def _bucket(rating: Optional[float]) -> str:
+    """Rating facet label: the whole-star floor, or "unrated"."""
+    return "unrated" if not rating else str(min(int(rating), 5))
+
+
+def _availability(value: Optional[str]) -> str:
+    return value or "unspecified"
+
+
+def _popcount(words: np.ndarray) -> int:
+    return int(_POPCOUNT[words.view(np.uint8)].sum(dtype=np.int64))
+
+
+class FacetIndex:
+    """
+    Bitmap facet index over freelancers.
+
+    Every freelancer owns a bit position; each skill tag, rating bucket and
+    availability value keeps a bitmap of the positions that carry it, stored
+    as a uint64 word array so single bits can be flipped in place. Filters
+    are answered with vectorized AND/OR over whole bitmaps and facet counts
+    with popcounts, while `min_rating` is resolved by bisecting a sorted
+    (rating, position) list.
+    """
+
+    def __init__(self):
+        self._positions: Dict[int, int] = {}
+        self._user_ids: List[Optional[int]] = []
+        self._free: List[int] = []
+        self._entries: Dict[int, Tuple[Tuple[str, ...], str, str, Optional[float]]] = {}
+        self._words = _INITIAL_WORDS
+        self._all = self._empty()
+        # facet name -> value -> [bitmap, member count]
+        self._facets: Dict[str, Dict[str, list]] = {"skill_tags": {}, "rating": {}, "availability": {}}
+        self._sorted_ratings: List[Tuple[float, int]] = []
+
+    def add(self, user_id: int, profile) -> None:
+        if not isinstance(profile, FreelancerProfile):
+            return
+        if self._free:
+            position = self._free.pop()
+            self._user_ids[position] = user_id
+        else:
+            position = len(self._user_ids)
+            self._user_ids.append(user_id)
+            if position >= self._words * _WORD_BITS:
+                self._grow()
+        entry = (
+            tuple(set(profile.skill_tags)),
+            _bucket(profile.rating),
+            _availability(profile.availability),
+            profile.rating,
+        )
+        self._positions[user_id] = position
+        self._entries[position] = entry
+
+        self._set(self._all, position)
+        for tag in entry[0]:
+            self._join("skill_tags", tag, position)
+        self._join("rating", entry[1], position)
+        self._join("availability", entry[2], position)
+        if profile.rating:
+            insort(self._sorted_ratings, (profile.rating, position))
+
+    def remove(self, user_id: int) -> None:
+        position = self._positions.pop(user_id, None)
+        if position is None:
+            return
+        tags, bucket, availability, rating = self._entries.pop(position)
+
+        self._unset(self._all, position)
+        for tag in tags:
+            self._leave("skill_tags", tag, position)
+        self._leave("rating", bucket, position)
+        self._leave("availability", availability, position)
+        if rating:
+            del self._sorted_ratings[bisect_left(self._sorted_ratings, (rating, position))]
+        self._user_ids[position] = None
+        self._free.append(position)
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def match(
+        self,
+        category: Optional[str] = None,
+        min_rating: Optional[float] = None,
+        availability: Optional[str] = None,
+    ) -> np.ndarray:
+        """Returns the bitmap of freelancers matching every given criterion."""
+        bitmap = self._all.copy()
+        for facet, value in (("skill_tags", category), ("availability", availability)):
+            if value:
+                member = self._facets[facet].get(value)
+                if member is None:
+                    return self._empty()
+                np.bitwise_and(bitmap, member[0], out=bitmap)
+        if min_rating:
+            start = bisect_left(self._sorted_ratings, (min_rating, -1))
+            rated = self._from_positions(position for _, position in self._sorted_ratings[start:])
+            np.bitwise_and(bitmap, rated, out=bitmap)
+        return bitmap
+
+    def restrict(self, bitmap: np.ndarray, user_ids) -> np.ndarray:
+        """Intersects `bitmap` with the positions of the given users."""
+        positions = self._positions
+        members = self._from_positions(
+            positions[user_id] for user_id in user_ids if user_id in positions
+        )
+        return np.bitwise_and(bitmap, members, out=members)
+
+    def user_ids(self, bitmap: np.ndarray) -> List[int]:
+        """Decodes a bitmap into user ids in ascending order."""
+        positions = np.flatnonzero(np.unpackbits(bitmap.view(np.uint8), bitorder="little"))
+        return sorted(self._user_ids[position] for position in positions.tolist())
+
+    def counts(self, bitmap: np.ndarray, top_tags: int = 20) -> Dict[str, Dict[str, int]]:
+        """Per-facet counts within `bitmap`, keeping the `top_tags` busiest skill tags."""
+        scratch = self._empty()
+        counts = {}
+        for facet, values in self._facets.items():
+            found = {}
+            for value, (bits, _) in values.items():
+                n = _popcount(np.bitwise_and(bits, bitmap, out=scratch))
+                if n:
+                    found[value] = n
+            counts[facet] = dict(sorted(found.items()))
+        tags = sorted(counts["skill_tags"].items(), key=lambda item: (-item[1], item[0]))
+        counts["skill_tags"] = dict(tags[:top_tags])
+        return counts
+
+    def _from_positions(self, positions) -> np.ndarray:
+        bitmap = self._empty()
+        positions = np.fromiter(positions, dtype=np.int64)
+        np.bitwise_or.at(
+            bitmap,
+            positions // _WORD_BITS,
+            np.left_shift(np.uint64(1), (positions % _WORD_BITS).astype(np.uint64)),
+        )
+        return bitmap
+
+    def _empty(self) -> np.ndarray:
+        return np.zeros(self._words, dtype="<u8")
+
+    def _grow(self) -> None:
+        self._words *= 2
+        self._all = np.concatenate((self._all, np.zeros_like(self._all)))
+        for values in self._facets.values():
+            for member in values.values():
+                member[0] = np.concatenate((member[0], np.zeros_like(member[0])))
+
+    def _join(self, facet: str, value: str, position: int) -> None:
+        member = self._facets[facet].get(value)
+        if member is None:
+            member = self._facets[facet][value] = [self._empty(), 0]
+        self._set(member[0], position)
+        member[1] += 1
+
+    def _leave(self, facet: str, value: str, position: int) -> None:
+        member = self._facets[facet][value]
+        self._unset(member[0], position)
+        member[1] -= 1
+        if not member[1]:
+            del self._facets[facet][value]
+
+    @staticmethod
+    def _set(bitmap: np.ndarray, position: int) -> None:
+        bitmap[position // _WORD_BITS] |= np.uint64(1 << (position % _WORD_BITS))
+
+    @staticmethod
+    def _unset(bitmap: np.ndarray, position: int) -> None:
+        bitmap[position // _WORD_BITS] &= ~np.uint64(1 << (position % _WORD_BITS))
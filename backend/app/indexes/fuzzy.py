@@ -0,0 +1,132 @@
+import re
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+_WORD = re.compile(r"\w+")
+_PAD = "\x00\x00"
+
+
+def bounded_levenshtein(a: str, b: str, bound: int) -> Optional[int]:
+    """Edit distance between `a` and `b`, or None once it must exceed `bound`."""
+    if abs(len(a) - len(b)) > bound:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > bound:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= bound else None
+
+
+def _grams(term: str) -> Set[str]:
+    padded = _PAD + term + _PAD
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def fuzzy_terms(profile) -> Set[str]:
+    """Lowercased laundr_id, skill tags and headline words of a profile."""
+    terms = {profile.laundr_id.lower()}
+    terms.update(skill.lower() for skill in profile.skill_tags)
+    if profile.headline:
+        terms.update(_WORD.findall(profile.headline.lower()))
+    return terms
+
+
+class FuzzyIndex:
+    """
+    Typo-tolerant term lookup using padded trigram candidate generation.
+
+    Each edit destroys at most three trigrams of a term, so a term within
+    distance k of the query must contain at least one of any 3k+1 distinct
+    query trigrams. Candidates come from the postings of the 3k+1 rarest
+    query trigrams and are then verified with a bounded Levenshtein
+    distance. The bound is lowered for terms too short to have 3k+1
+    trigrams, so one- and two-typo tolerance starts at two and five
+    characters respectively and every query is served from postings.
+    """
+
+    def __init__(self):
+        self._term_ids: Dict[str, int] = {}
+        self._terms: List[Optional[str]] = []
+        self._users: List[Set[int]] = []
+        self._postings: Dict[str, array] = {}
+        self._by_user: Dict[int, Tuple[int, ...]] = {}
+        self._free: List[int] = []
+        self._stale = 0
+
+    def add(self, user_id: int, profile) -> None:
+        term_ids = []
+        for term in fuzzy_terms(profile):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                term_id = self._new_term(term)
+            self._users[term_id].add(user_id)
+            term_ids.append(term_id)
+        self._by_user[user_id] = tuple(term_ids)
+
+    def remove(self, user_id: int) -> None:
+        for term_id in self._by_user.pop(user_id, ()):
+            users = self._users[term_id]
+            users.discard(user_id)
+            if not users:
+                self._drop_term(term_id)
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def search(self, term: str, max_distance: int) -> Set[int]:
+        """Returns the ids of users with a term within `max_distance` edits of `term`."""
+        term = term.lower()
+        grams = _grams(term)
+        max_distance = min(max_distance, (len(grams) - 1) // 3)
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        candidates: Set[int] = set()
+        for posting in postings[:3 * max_distance + 1]:
+            candidates.update(posting)
+
+        matches: Set[int] = set()
+        for term_id in candidates:
+            candidate = self._terms[term_id]
+            if candidate is not None and bounded_levenshtein(term, candidate, max_distance) is not None:
+                matches.update(self._users[term_id])
+        return matches
+
+    def _new_term(self, term: str) -> int:
+        if self._free:
+            term_id = self._free.pop()
+            self._terms[term_id] = term
+        else:
+            term_id = len(self._terms)
+            self._terms.append(term)
+            self._users.append(set())
+        self._term_ids[term] = term_id
+        self._post(term_id, term)
+        return term_id
+
+    def _drop_term(self, term_id: int) -> None:
+        # Postings keep the dead id until compaction; candidates are always
+        # verified against the live term stored in the slot.
+        term = self._terms[term_id]
+        del self._term_ids[term]
+        self._terms[term_id] = None
+        self._free.append(term_id)
+        self._stale += 1
+        if self._stale > max(len(self._term_ids), 1024):
+            self._postings = {}
+            self._stale = 0
+            for live_id in self._term_ids.values():
+                self._post(live_id, self._terms[live_id])
+
+    def _post(self, term_id: int, term: str) -> None:
+        for gram in _grams(term):
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array("q")
+            posting.append(term_id)
@@ -0,0 +1,129 @@
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.schemas.directory import FreelancerProfile
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+Cell = Tuple[int, int]
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distance from one point to arrays of points."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoIndex:
+    """
+    Spatial index of freelancer coordinates.
+
+    Points are bucketed into fixed-size latitude/longitude cells, in the
+    spirit of geohash buckets. A radius query only visits the cells that
+    overlap the query's bounding box and measures exact distances for the
+    points inside them; k-nearest queries widen a radius query until k
+    points are found.
+    """
+
+    def __init__(self, cell_degrees: float = 0.25):
+        self.cell_degrees = cell_degrees
+        self._lon_cells = round(360 / cell_degrees)
+        self._cells: Dict[Cell, Dict[int, Tuple[float, float]]] = {}
+        self._points: Dict[int, Cell] = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def add(self, user_id: int, profile) -> None:
+        if not isinstance(profile, FreelancerProfile):
+            return
+        if profile.latitude is None or profile.longitude is None:
+            return
+        cell = self._cell(profile.latitude, profile.longitude)
+        self._cells.setdefault(cell, {})[user_id] = (profile.latitude, profile.longitude)
+        self._points[user_id] = cell
+
+    def remove(self, user_id: int) -> None:
+        cell = self._points.pop(user_id, None)
+        if cell is None:
+            return
+        bucket = self._cells[cell]
+        del bucket[user_id]
+        if not bucket:
+            del self._cells[cell]
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._points.clear()
+
+    def within(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (user_ids, distances_km) of every point within `radius_km`."""
+        ids: List[int] = []
+        coords: List[Tuple[float, float]] = []
+        for bucket in self._buckets_near(lat, lon, radius_km):
+            ids.extend(bucket.keys())
+            coords.extend(bucket.values())
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        points = np.array(coords)
+        distances = haversine_km(lat, lon, points[:, 0], points[:, 1])
+        inside = distances <= radius_km
+        return np.array(ids, dtype=np.int64)[inside], distances[inside]
+
+    def nearest(self, lat: float, lon: float, k: int) -> List[Tuple[int, float]]:
+        """Returns the `k` closest (user_id, distance_km) pairs, nearest first."""
+        radius = self.cell_degrees * KM_PER_DEGREE
+        while True:
+            ids, distances = self.within(lat, lon, radius)
+            if len(ids) >= k or radius >= MAX_DISTANCE_KM:
+                break
+            radius *= 2
+        order = np.lexsort((ids, distances))[:k]
+        return list(zip(ids[order].tolist(), distances[order].tolist()))
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        row = math.floor(lat / self.cell_degrees)
+        col = math.floor(lon / self.cell_degrees) % self._lon_cells
+        return row, col
+
+    def _buckets_near(self, lat: float, lon: float, radius_km: float):
+        angle = radius_km / EARTH_RADIUS_KM
+        lat_span = math.degrees(angle)
+        first_row = math.floor(max(lat - lat_span, -90.0) / self.cell_degrees)
+        last_row = math.floor(min(lat + lat_span, 90.0) / self.cell_degrees)
+
+        covers_pole = abs(lat) + lat_span >= 90.0
+
+        # row -> (first column, number of columns) to visit
+        spans: Dict[int, Tuple[int, int]] = {}
+        for row in range(first_row, last_row + 1):
+            # sin(dlon) <= sin(radius) / cos(lat), widest at the poleward row edge.
+            edge = max(abs(row * self.cell_degrees), abs((row + 1) * self.cell_degrees))
+            cos_edge = math.cos(math.radians(min(edge, 90.0)))
+            if covers_pole or math.sin(angle) >= cos_edge:
+                spans[row] = (0, self._lon_cells)
+                continue
+            lon_span = math.degrees(math.asin(math.sin(angle) / cos_edge))
+            first = math.floor((lon - lon_span) / self.cell_degrees)
+            last = math.floor((lon + lon_span) / self.cell_degrees)
+            spans[row] = (first % self._lon_cells, min(last - first + 1, self._lon_cells))
+
+        if sum(count for _, count in spans.values()) > len(self._cells):
+            # Cheaper to walk the occupied cells than to probe empty ones.
+            for (row, col), bucket in self._cells.items():
+                span = spans.get(row)
+                if span and (col - span[0]) % self._lon_cells < span[1]:
+                    yield bucket
+            return
+
+        for row, (first, count) in spans.items():
+            for offset in range(count):
+                bucket = self._cells.get((row, (first + offset) % self._lon_cells))
+                if bucket:
+                    yield bucket
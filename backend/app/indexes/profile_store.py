@@ -0,0 +1,165 @@
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
+
+
+class ProfileStore(MutableMapping):
+    """
+    Dict-like profile table that keeps its secondary indexes in sync.
+
+    The store owns a laundr_id -> user_id hash index and notifies every
+    registered index on insert, replace and delete. Handlers that mutate a
+    stored profile in place must call `reindex(user_id)` afterwards so the
+    indexes see the new values and the repository persists them. `generation` is bumped on every write so
+    derived results can be cached against it.
+
+    Profiles live in `repository` (a plain dict when none is given); the
+    indexes are rebuilt from it on startup and follow the changes other
+    worker processes make to it.
+    """
+
+    def __init__(self, repository: Optional[MutableMapping] = None):
+        self._data = {} if repository is None else repository
+        self._by_laundr_id: Dict[str, int] = {}
+        self._laundr_ids: Dict[int, str] = {}
+        self._indexes: List[Any] = []
+        self.generation = 0
+        for user_id, profile in self._data.items():
+            self._link_laundr_id(user_id, profile)
+        if hasattr(self._data, "subscribe"):
+            self._data.subscribe(self._on_external_change)
+
+    def register_index(self, index) -> None:
+        """Attaches an index and back-fills it with the current contents."""
+        self._indexes.append(index)
+        for user_id, profile in self._data.items():
+            index.add(user_id, profile)
+
+    def get_by_laundr_id(self, laundr_id: str) -> Optional[Any]:
+        """Looks a profile up by its @laundrID in O(1)."""
+        user_id = self._by_laundr_id.get(laundr_id)
+        return None if user_id is None else self._data[user_id]
+
+    def get_many_by_laundr_id(self, laundr_ids: Iterable[str]) -> Dict[str, Any]:
+        """Looks several @laundrIDs up at once, skipping unknown ones."""
+        user_ids = {}
+        for laundr_id in laundr_ids:
+            user_id = self._by_laundr_id.get(laundr_id)
+            if user_id is not None:
+                user_ids[laundr_id] = user_id
+        if hasattr(self._data, "get_many"):
+            profiles = self._data.get_many(user_ids.values())
+        else:
+            profiles = {user_id: self._data[user_id] for user_id in user_ids.values()}
+        return {laundr_id: profiles[user_id] for laundr_id, user_id in user_ids.items() if user_id in profiles}
+
+    def put_many(self, profiles: Mapping[int, Any]) -> None:
+        """Inserts or replaces several profiles with one batched repository write."""
+        self.generation += 1
+        for user_id in profiles:
+            if user_id in self._laundr_ids:
+                self._unlink_laundr_id(user_id)
+                for index in self._indexes:
+                    index.remove(user_id)
+        if hasattr(self._data, "put_many"):
+            self._data.put_many(profiles)
+        else:
+            self._data.update(profiles)
+        for user_id, profile in profiles.items():
+            self._link_laundr_id(user_id, profile)
+            for index in self._indexes:
+                index.add(user_id, profile)
+
+    def reindex(self, user_id: int) -> None:
+        """Refreshes the index entries of a profile that was mutated in place."""
+        profile = self._data[user_id]
+        self._data[user_id] = profile
+        self.generation += 1
+        self._unlink_laundr_id(user_id)
+        self._link_laundr_id(user_id, profile)
+        for index in self._indexes:
+            index.remove(user_id)
+            index.add(user_id, profile)
+
+    def __getitem__(self, user_id: int):
+        return self._data[user_id]
+
+    def __setitem__(self, user_id: int, profile) -> None:
+        self.generation += 1
+        if user_id in self._laundr_ids:
+            self._unlink_laundr_id(user_id)
+            for index in self._indexes:
+                index.remove(user_id)
+        self._data[user_id] = profile
+        self._link_laundr_id(user_id, profile)
+        for index in self._indexes:
+            index.add(user_id, profile)
+
+    def __delitem__(self, user_id: int) -> None:
+        self.generation += 1
+        self._unlink_laundr_id(user_id)
+        del self._data[user_id]
+        for index in self._indexes:
+            index.remove(user_id)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._data)
+
+    # Every stored profile has a laundr_id entry, which answers these
+    # without a repository round trip.
+    def __len__(self) -> int:
+        return len(self._laundr_ids)
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._laundr_ids
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._data.clear()
+        self._by_laundr_id.clear()
+        self._laundr_ids.clear()
+        for index in self._indexes:
+            index.clear()
+
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
+
+    def items(self):
+        return self._data.items()
+
+    def _on_external_change(self, user_id: Optional[int]) -> None:
+        # The repository already holds the new state; only the indexes and
+        # the laundr_id map need to catch up.
+        self.generation += 1
+        if user_id is None:
+            self._by_laundr_id.clear()
+            self._laundr_ids.clear()
+            for index in self._indexes:
+                index.clear()
+            for user_id, profile in self._data.items():
+                self._link_laundr_id(user_id, profile)
+                for index in self._indexes:
+                    index.add(user_id, profile)
+            return
+        if user_id in self._laundr_ids:
+            self._unlink_laundr_id(user_id)
+            for index in self._indexes:
+                index.remove(user_id)
+        profile = self._data.get(user_id)
+        if profile is not None:
+            self._link_laundr_id(user_id, profile)
+            for index in self._indexes:
+                index.add(user_id, profile)
+
+    def _link_laundr_id(self, user_id: int, profile) -> None:
+        # The first profile registered under a laundr_id owns the entry, which
+        # matches the first-match semantics of the old linear scan.
+        self._laundr_ids[user_id] = profile.laundr_id
+        self._by_laundr_id.setdefault(profile.laundr_id, user_id)
+
+    def _unlink_laundr_id(self, user_id: int) -> None:
+        laundr_id = self._laundr_ids.pop(user_id, None)
+        if laundr_id is not None and self._by_laundr_id.get(laundr_id) == user_id:
+            del self._by_laundr_id[laundr_id]
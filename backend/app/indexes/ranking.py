@@ -0,0 +1,143 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.schemas.directory import FreelancerProfile
+
+# Column order of the feature matrix; matches the SortParams weights.
+FEATURES = ("rating", "sentiment", "activity", "proximity", "price")
+
+# Neutral value used until a profile carries real data for a feature.
+NEUTRAL_SCORE = 0.5
+
+_INITIAL_CAPACITY = 1024
+
+
+class FreelancerFeatureStore:
+    """
+    Columnar ranking features for every freelancer in the directory.
+
+    Each freelancer owns a row in a float64 feature matrix (one column per
+    entry of FEATURES) plus a reviews column. Rows freed by removals are
+    reused, so the arrays only grow with the peak freelancer count. Weighted
+    scoring is a single matrix-vector product and paging uses a partition
+    instead of a full sort.
+    """
+
+    def __init__(self):
+        self._rows: Dict[int, int] = {}
+        self._free: List[int] = []
+        self._size = 0
+        self._allocate(_INITIAL_CAPACITY)
+
+    def add(self, user_id: int, profile) -> None:
+        if not isinstance(profile, FreelancerProfile):
+            return
+        row = self._free.pop() if self._free else self._next_row()
+        self._rows[user_id] = row
+        self.user_ids[row] = user_id
+        self.alive[row] = True
+        self.features[row] = (
+            profile.rating or 0.0,
+            NEUTRAL_SCORE if profile.sentiment_score is None else profile.sentiment_score,
+            NEUTRAL_SCORE if profile.activity_score is None else profile.activity_score,
+            NEUTRAL_SCORE,
+            NEUTRAL_SCORE,
+        )
+        self.reviews[row] = profile.reviews or 0
+
+    def remove(self, user_id: int) -> None:
+        row = self._rows.pop(user_id, None)
+        if row is not None:
+            self.alive[row] = False
+            self._free.append(row)
+
+    def clear(self) -> None:
+        self._rows.clear()
+        self._free.clear()
+        self._size = 0
+        self.alive[:] = False
+
+    def column(self, name: str) -> np.ndarray:
+        """Returns a per-row view of a ranking feature or of the reviews count."""
+        if name == "reviews":
+            return self.reviews
+        return self.features[:, FEATURES.index(name)]
+
+    def scores(self, weights: np.ndarray, proximity: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Weighted sum of the feature columns for every row, optionally with a
+        per-row proximity vector standing in for the neutral proximity column.
+        """
+        scores = self.features[:self._size] @ weights
+        if proximity is not None:
+            column = FEATURES.index("proximity")
+            scores += weights[column] * (proximity - self.features[:self._size, column])
+        return scores
+
+    def proximity(self, user_ids: np.ndarray, closeness: np.ndarray) -> np.ndarray:
+        """Builds a per-row proximity vector: `closeness` for the given users, 0 elsewhere."""
+        vector = np.zeros(self._size)
+        rows = [self._rows.get(user_id, -1) for user_id in user_ids.tolist()]
+        known = np.array(rows, dtype=np.int64) >= 0
+        vector[np.array(rows, dtype=np.int64)[known]] = closeness[known]
+        return vector
+
+    def top(
+        self,
+        keys: np.ndarray,
+        descending: bool,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None,
+    ) -> List[int]:
+        """
+        Returns the user ids ranked [offset, offset + limit) by `keys`.
+
+        Ties are broken by ascending user id so paging is deterministic.
+        `after` is a (key, user id) pair: only rows ranked strictly behind
+        it are considered, which lets cursors seek instead of skipping.
+        """
+        rows = np.flatnonzero(self.alive[:self._size])
+        ranked = keys[:self._size][rows]
+        if descending:
+            ranked = -ranked
+        if after is not None:
+            key, user_id = after
+            key = -key if descending else key
+            keep = (ranked > key) | ((ranked == key) & (self.user_ids[rows] > user_id))
+            rows, ranked = rows[keep], ranked[keep]
+        end = len(rows) if limit is None else min(len(rows), offset + limit)
+        if end <= offset:
+            return []
+        if end < len(rows):
+            # Everything ranked at or above the end-th key, ties included.
+            kth = np.partition(ranked, end - 1)[end - 1]
+            keep = ranked <= kth
+            rows, ranked = rows[keep], ranked[keep]
+        user_ids = self.user_ids[rows]
+        order = np.lexsort((user_ids, ranked))[offset:end]
+        return user_ids[order].tolist()
+
+    def key(self, keys: np.ndarray, user_id: int) -> float:
+        """Returns the entry of the per-row `keys` belonging to `user_id`."""
+        return float(keys[self._rows[user_id]])
+
+    def _next_row(self) -> int:
+        if self._size == len(self.alive):
+            self._allocate(2 * len(self.alive))
+        self._size += 1
+        return self._size - 1
+
+    def _allocate(self, capacity: int) -> None:
+        old = self._size
+        features = np.zeros((capacity, len(FEATURES)))
+        reviews = np.zeros(capacity)
+        user_ids = np.zeros(capacity, dtype=np.int64)
+        alive = np.zeros(capacity, dtype=bool)
+        if old:
+            features[:old] = self.features[:old]
+            reviews[:old] = self.reviews[:old]
+            user_ids[:old] = self.user_ids[:old]
+            alive[:old] = self.alive[:old]
+        self.features, self.reviews, self.user_ids, self.alive = features, reviews, user_ids, alive
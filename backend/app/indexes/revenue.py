@@ -0,0 +1,158 @@
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.storage.base import Repository
+from app.storage.ledger import micros
+
+# (start time in µs since the epoch, booking id)
+Entry = Tuple[int, Any]
+
+
+def _cents(amount: float) -> int:
+    return round(amount * 100)
+
+
+class FreelancerRevenue:
+    """
+    One freelancer's confirmed bookings sorted by start time, with prefix
+    sums of their prices in cents and totals per service and per client.
+
+    Row i of `prefix` is the revenue of the bookings before entries[i], so
+    the revenue of every booking from a start time on is a bisect and a
+    difference with the last row. The per-service and per-client totals
+    count the first `settled` bookings: those that had started when they
+    were last asked for. As time moves on they take in the next ones.
+    """
+
+    def __init__(self, bookings: Iterable = ()):
+        self.entries: List[Entry] = []
+        # booking id -> (start, price cents, service, client)
+        self.bookings: Dict[Any, Tuple[int, int, str, str]] = {}
+        for booking in bookings:
+            entry = (micros(booking.start_time), booking.id)
+            self.entries.append(entry)
+            self.bookings[booking.id] = (entry[0], _cents(booking.price), booking.service, booking.client_id)
+        self.entries.sort()
+        self.prefix: List[int] = list(accumulate((self.bookings[key][1] for _, key in self.entries), initial=0))
+        self.settled = 0
+        self.services: Dict[str, List[int]] = {}
+        self.clients: Dict[str, List[int]] = {}
+
+    def add(self, booking) -> None:
+        entry = (micros(booking.start_time), booking.id)
+        price = _cents(booking.price)
+        index = bisect_left(self.entries, entry)
+        self.entries.insert(index, entry)
+        # Bookings mostly arrive in the future, so the shifted tail is short.
+        self.prefix.insert(index + 1, self.prefix[index])
+        for row in range(index + 1, len(self.prefix)):
+            self.prefix[row] += price
+        self.bookings[booking.id] = (entry[0], price, booking.service, booking.client_id)
+        if index < self.settled:
+            self._settle(booking.id, 1)
+            self.settled += 1
+
+    def remove(self, booking_id: Any) -> None:
+        start, price, _, _ = self.bookings[booking_id]
+        index = bisect_left(self.entries, (start, booking_id))
+        if index < self.settled:
+            self._settle(booking_id, -1)
+            self.settled -= 1
+        del self.bookings[booking_id]
+        del self.entries[index]
+        del self.prefix[index + 1]
+        for row in range(index + 1, len(self.prefix)):
+            self.prefix[row] -= price
+
+    def after(self, now: int) -> Tuple[int, int]:
+        """Revenue in cents and count of the bookings starting after `now`."""
+        index = bisect_left(self.entries, (now + 1,))
+        return self.prefix[-1] - self.prefix[index], len(self.entries) - index
+
+    def before(self, now: int, breakdown_by: str) -> Dict[str, List[int]]:
+        """Revenue in cents and count per service or client of the bookings starting before `now`."""
+        index = bisect_left(self.entries, (now,))
+        while self.settled < index:
+            self._settle(self.entries[self.settled][1], 1)
+            self.settled += 1
+        if breakdown_by == "service":
+            totals = self.services
+        elif breakdown_by == "client":
+            totals = self.clients
+        else:
+            return {}
+        if index < self.settled:
+            # The clock went back: leave out what hasn't started after all.
+            totals = {category: list(counts) for category, counts in totals.items()}
+            for _, booking_id in self.entries[index:self.settled]:
+                _, price, service, client = self.bookings[booking_id]
+                _count(totals, service if breakdown_by == "service" else client, -price, -1)
+        return totals
+
+    def _settle(self, booking_id: Any, sign: int) -> None:
+        _, price, service, client = self.bookings[booking_id]
+        _count(self.services, service, sign * price, sign)
+        _count(self.clients, client, sign * price, sign)
+
+
+def _count(totals: Dict[str, List[int]], category: str, cents: int, count: int) -> None:
+    counts = totals.setdefault(category, [0, 0])
+    counts[0] += cents
+    counts[1] += count
+    if counts[1] == 0:
+        del totals[category]
+
+
+class RevenueIndex:
+    """
+    Confirmed bookings per freelancer, for revenue projections and reports.
+
+    A freelancer's bookings are read through the booking indexes the first
+    time they are asked for, and from then on follow every booking written,
+    by this process or another, including status changes. Bookings must be
+    keyed by their id.
+    """
+
+    def __init__(self, bookings: Repository):
+        self._bookings = bookings
+        self._freelancers: Dict[str, FreelancerRevenue] = {}
+        # booking id -> the freelancer it is counted under
+        self._counted: Dict[Any, str] = {}
+        bookings.watch(self._on_booking)
+
+    def projection(self, freelancer_id: str, now: int) -> Tuple[float, int]:
+        """Revenue and count of the freelancer's confirmed bookings starting after `now` (µs)."""
+        cents, count = self._freelancer(freelancer_id).after(now)
+        return cents / 100, count
+
+    def breakdown(self, freelancer_id: str, now: int, breakdown_by: str) -> Dict[str, Tuple[float, int]]:
+        """Revenue and count per service or client of the confirmed bookings starting before `now` (µs)."""
+        totals = self._freelancer(freelancer_id).before(now, breakdown_by)
+        return {category: (cents / 100, count) for category, (cents, count) in totals.items()}
+
+    def _freelancer(self, freelancer_id: str) -> FreelancerRevenue:
+        revenue = self._freelancers.get(freelancer_id)
+        if revenue is None:
+            confirmed = [booking for booking in self._bookings.find(freelancer_id=freelancer_id)
+                         if booking.status == "confirmed"]
+            revenue = self._freelancers[freelancer_id] = FreelancerRevenue(confirmed)
+            self._counted.update((booking.id, freelancer_id) for booking in confirmed)
+        return revenue
+
+    def _on_booking(self, key: Any) -> None:
+        if key is None:
+            # Rebuilt from storage as freelancers are next asked for.
+            self._freelancers.clear()
+            self._counted.clear()
+            return
+        freelancer_id = self._counted.pop(key, None)
+        if freelancer_id is not None:
+            self._freelancers[freelancer_id].remove(key)
+        booking = self._bookings.get(key)
+        if booking is None or booking.status != "confirmed":
+            return
+        revenue = self._freelancers.get(booking.freelancer_id)
+        if revenue is not None:
+            revenue.add(booking)
+            self._counted[key] = booking.freelancer_id
@@ -0,0 +1,249 @@
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.storage.base import PARTY_KEYS, EventLog, Repository
+
+GRANULARITIES = ("day", "week", "month")
+
+# Transactions that move money between two users' balances.
+_FLOW_ACTIONS = ("send_load", "swap_funds")
+
+# (user, day ordinal, income cents, expense cents)
+Flow = Tuple[str, int, int, int]
+
+
+def _cents(amount: float) -> int:
+    return round(amount * 100)
+
+
+def transaction_flows(entry: Dict[str, Any]) -> List[Flow]:
+    """The payer's expense and the payee's income from a completed transfer."""
+    action = entry.get("action")
+    if entry.get("status") != "completed" or action not in _FLOW_ACTIONS:
+        return []
+    details = entry["details"]
+    payer_key, payee_key = PARTY_KEYS[action]
+    payer, payee = details.get(payer_key), details.get(payee_key)
+    day = entry["timestamp"].date().toordinal()
+    amount = _cents(details.get("amount", 0.0))
+    flows = []
+    if payer is not None:
+        flows.append((payer, day, 0, amount))
+    if payee is not None and payee != payer:
+        flows.append((payee, day, amount, 0))
+    return flows
+
+
+def booking_flows(booking) -> List[Flow]:
+    """The freelancer's income and the client's expense from a confirmed booking, on its start date."""
+    if booking.status != "confirmed":
+        return []
+    day = booking.start_time.date().toordinal()
+    price = _cents(booking.price)
+    flows = [(booking.freelancer_id, day, price, 0)]
+    if booking.client_id != booking.freelancer_id:
+        flows.append((booking.client_id, day, 0, price))
+    return flows
+
+
+class DailyTotals:
+    """
+    One user's income and expense per day, as prefix sums in cents.
+
+    Row i of `prefix` holds the totals of every day before origin + i, so
+    the totals between two days are the difference of two rows and any
+    series is a diff over the rows at its bucket boundaries. Days before
+    the first or after the last one recorded read as the ends of the array.
+    """
+
+    def __init__(self):
+        self.origin = 0
+        self.days = 0
+        self.prefix = np.zeros((1, 2), dtype=np.int64)
+
+    @classmethod
+    def from_flows(cls, flows: List[Flow]) -> "DailyTotals":
+        """Builds the totals of (user, day, income, expense) flows in one pass."""
+        totals = cls()
+        if flows:
+            days, income, expense = (np.array(column, dtype=np.int64) for column in list(zip(*flows))[1:])
+            totals.origin = int(days.min())
+            totals.days = int(days.max()) - totals.origin + 1
+            daily = np.zeros((totals.days, 2), dtype=np.int64)
+            np.add.at(daily, days - totals.origin, np.column_stack((income, expense)))
+            totals.prefix = np.concatenate((np.zeros((1, 2), dtype=np.int64), np.cumsum(daily, axis=0)))
+        return totals
+
+    def add(self, day: int, income: int, expense: int) -> None:
+        if self.days == 0:
+            self.origin = day
+        if day < self.origin:
+            # Rarely taken: bookings are mostly confirmed ahead of time.
+            shift = self.origin - day
+            prefix = np.zeros((shift + len(self.prefix), 2), dtype=np.int64)
+            prefix[shift:] = self.prefix
+            self.prefix, self.origin, self.days = prefix, day, self.days + shift
+        index = day - self.origin
+        if index >= self.days:
+            self._grow(index + 1)
+        self.prefix[index + 1:self.days + 1] += (income, expense)
+
+    def at(self, days: np.ndarray) -> np.ndarray:
+        """Prefix rows for the given day ordinals: the totals of every day before each."""
+        return self.prefix[np.clip(days - self.origin, 0, self.days)]
+
+    def _grow(self, days: int) -> None:
+        if days + 1 > len(self.prefix):
+            prefix = np.empty((max(days + 1, 2 * len(self.prefix)), 2), dtype=np.int64)
+            prefix[:self.days + 1] = self.prefix[:self.days + 1]
+            self.prefix = prefix
+        # Days with nothing recorded carry the running totals forward.
+        self.prefix[self.days + 1:days + 1] = self.prefix[self.days]
+        self.days = days
+
+
+class IncomeRollups:
+    """
+    Per-user daily income and expense from completed transfers and
+    confirmed bookings, for income trends.
+
+    A user's totals are built from their own transactions and bookings
+    (through the per-user indexes) the first time they are asked for, and
+    from then on follow every transaction logged and every booking written,
+    by this process or, after a storage sync, another. Bookings must be
+    keyed by their id.
+
+    A build doesn't sync storage itself, which would query it on the event
+    loop: what other workers logged is taken in by the sync each request
+    starts with (StorageSyncMiddleware) or a report worker runs, off the
+    loop, so that it isn't counted again when a later sync passes it on.
+
+    Reports built on worker threads read the totals while the event loop
+    adds to them, so both happen under a lock.
+    """
+
+    def __init__(self, transactions: EventLog, bookings: Repository):
+        self._transactions = transactions
+        self._bookings = bookings
+        self._users: Dict[str, DailyTotals] = {}
+        # booking id -> what it added to the users above
+        self._booking_flows: Dict[Any, List[Flow]] = {}
+        self._lock = threading.Lock()
+        transactions.listen(self._on_transactions)
+        bookings.watch(self._on_booking)
+
+    def totals(self, user_id: str, start: date, end: date) -> Tuple[float, float]:
+        """Income and expenses over [start, end]."""
+        rows = self._at(user_id, np.array([start.toordinal(), end.toordinal() + 1]))
+        income, expenses = (rows[1] - rows[0]).tolist()
+        return income / 100, expenses / 100
+
+    def trend(
+        self, user_id: str, start: date, end: date, granularity: str = "day", keep: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Income, expenses and net income over [start, end], a point per day,
+        week (from Monday) or month. Each point is dated by the first day of
+        its period within the range.
+
+        Without `keep`, totals not kept for the user yet are built for this
+        call only. Off the event loop they must be: a build there races the
+        loop logging a transfer, which it may read and then be handed again.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity!r}")
+        if start > end:
+            return []
+        boundaries = _boundaries(start, end, granularity)
+        sums = np.diff(self._at(user_id, boundaries, keep), axis=0).tolist()
+        return [
+            {
+                "date": date.fromordinal(day),
+                "income": income / 100,
+                "expenses": expenses / 100,
+                "net_income": (income - expenses) / 100,
+            }
+            for day, (income, expenses) in zip(boundaries.tolist(), sums)
+        ]
+
+    def _at(self, user_id: str, days: np.ndarray, keep: bool = True) -> np.ndarray:
+        with self._lock:
+            totals = self._users.get(user_id)
+            if totals is not None:
+                return totals.at(days)
+        if not keep:
+            return DailyTotals.from_flows(self._flows(user_id, {})).at(days)
+        with self._lock:
+            return self._user(user_id).at(days)
+
+    def _user(self, user_id: str) -> DailyTotals:
+        totals = self._users.get(user_id)
+        if totals is None:
+            totals = self._users[user_id] = DailyTotals.from_flows(self._flows(user_id, self._booking_flows))
+        return totals
+
+    def _flows(self, user_id: str, by_booking: Dict[Any, List[Flow]]) -> List[Flow]:
+        """The user's flows, from their transactions and bookings; those of each booking go in `by_booking` too."""
+        flows = [
+            flow for entry in self._transactions.involving(user_id)
+            for flow in transaction_flows(entry) if flow[0] == user_id
+        ]
+        for booking in self._bookings.find_any(client_id=user_id, freelancer_id=user_id):
+            for flow in booking_flows(booking):
+                if flow[0] == user_id:
+                    flows.append(flow)
+                    by_booking.setdefault(booking.id, []).append(flow)
+        return flows
+
+    def _on_transactions(self, entries: Optional[List[Dict[str, Any]]]) -> None:
+        with self._lock:
+            if entries is None:
+                self._reset()
+                return
+            for entry in entries:
+                for user, day, income, expense in transaction_flows(entry):
+                    totals = self._users.get(user)
+                    if totals is not None:
+                        totals.add(day, income, expense)
+
+    def _on_booking(self, key: Any) -> None:
+        with self._lock:
+            if key is None:
+                self._reset()
+                return
+            for user, day, income, expense in self._booking_flows.pop(key, ()):
+                self._users[user].add(day, -income, -expense)
+            booking = self._bookings.get(key)
+            if booking is None:
+                return
+            flows = [flow for flow in booking_flows(booking) if flow[0] in self._users]
+            for user, day, income, expense in flows:
+                self._users[user].add(day, income, expense)
+            if flows:
+                self._booking_flows[key] = flows
+
+    def _reset(self) -> None:
+        # Totals are rebuilt from storage as users are next asked for.
+        self._users.clear()
+        self._booking_flows.clear()
+
+
+def _boundaries(start: date, end: date, granularity: str) -> np.ndarray:
+    """Ordinals of the first day of each period in [start, end], then of the day after `end`."""
+    first, stop = start.toordinal(), end.toordinal() + 1
+    if granularity == "day":
+        return np.arange(first, stop + 1)
+    if granularity == "week":
+        monday = first + 7 - start.weekday()
+        return np.array([first, *range(monday, stop, 7), stop])
+    days = [first]
+    month = date(start.year, start.month, 1)
+    while True:
+        month = (month + timedelta(days=32)).replace(day=1)
+        if month.toordinal() >= stop:
+            break
+        days.append(month.toordinal())
+    return np.array([*days, stop])
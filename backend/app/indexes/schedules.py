@@ -0,0 +1,263 @@
+import random
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.schemas.bookings import BookingStatus
+from app.storage.base import Repository
+from app.storage.ledger import micros
+
+# ("booking" or "event", its id)
+Owner = Tuple[str, Any]
+# (start, end in µs since the epoch, owner)
+Interval = Tuple[int, int, Owner]
+
+# Bookings that hold their slot: the rest were turned down or called off.
+ACTIVE_STATUSES = frozenset({
+    BookingStatus.PENDING, BookingStatus.APPROVED, BookingStatus.COUNTERED, BookingStatus.CONFIRMED,
+})
+
+
+class _Node:
+    __slots__ = ("interval", "priority", "left", "right", "max_end")
+
+    def __init__(self, interval: Interval, priority: float):
+        self.interval = interval
+        self.priority = priority
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+        self.max_end = interval[1]
+
+    def update(self) -> None:
+        max_end = self.interval[1]
+        if self.left is not None and self.left.max_end > max_end:
+            max_end = self.left.max_end
+        if self.right is not None and self.right.max_end > max_end:
+            max_end = self.right.max_end
+        self.max_end = max_end
+
+
+class IntervalTree:
+    """
+    Half-open intervals [start, end), which may overlap each other, in a
+    treap ordered by (start, end, owner) where every node also holds the
+    latest end in its subtree.
+
+    Finding the k intervals that overlap another takes O(log n + k): a
+    subtree is skipped as soon as its latest end is no later than the
+    query's start, or its node starts no earlier than the query's end.
+    Adding and removing take O(log n); all of it expected, by the random
+    priorities.
+    """
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self._rng = random.Random()
+        self._root = self._build(sorted(intervals))
+        self._count = 0 if self._root is None else self._size(self._root)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, interval: Interval) -> None:
+        left, right = self._split(self._root, interval)
+        self._root = self._merge(self._merge(left, _Node(interval, self._rng.random())), right)
+        self._count += 1
+
+    def remove(self, interval: Interval) -> None:
+        left, right = self._split(self._root, interval)
+        node, rest = self._split_first(right)
+        if node is None or node.interval != interval:
+            self._root = self._merge(left, right if node is None else self._merge(node, rest))
+            raise KeyError(interval)
+        self._root = self._merge(left, rest)
+        self._count -= 1
+
+    def overlapping(self, start: int, end: int) -> List[Interval]:
+        """The intervals that overlap [start, end), in order."""
+        found = []
+        stack, node = [], self._root
+        while stack or node is not None:
+            # In order, going left while a subtree can still reach past `start`.
+            while node is not None and node.max_end > start:
+                stack.append(node)
+                node = node.left
+            if not stack:
+                break
+            node = stack.pop()
+            if node.interval[0] >= end:
+                # It and everything after it start too late.
+                break
+            if node.interval[1] > start:
+                found.append(node.interval)
+            node = node.right
+        return found
+
+    def _build(self, intervals: List[Interval]) -> Optional[_Node]:
+        # Sorted input, so a Cartesian tree over random priorities: the
+        # same shape adding them one at a time would give, in O(n).
+        stack: List[_Node] = []
+        for interval in intervals:
+            node = _Node(interval, self._rng.random())
+            last = None
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+                last.update()
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+        for node in reversed(stack):
+            node.update()
+        return stack[0] if stack else None
+
+    @staticmethod
+    def _size(node: _Node) -> int:
+        size, stack = 0, [node]
+        while stack:
+            node = stack.pop()
+            size += 1
+            stack.extend(child for child in (node.left, node.right) if child is not None)
+        return size
+
+    def _split(self, node: Optional[_Node], interval: Interval) -> Tuple[Optional[_Node], Optional[_Node]]:
+        """Splits into the intervals before `interval` and the rest."""
+        if node is None:
+            return None, None
+        if node.interval < interval:
+            node.right, right = self._split(node.right, interval)
+            node.update()
+            return node, right
+        left, node.left = self._split(node.left, interval)
+        node.update()
+        return left, node
+
+    def _split_first(self, node: Optional[_Node]) -> Tuple[Optional[_Node], Optional[_Node]]:
+        """Takes the first interval off the tree."""
+        if node is None:
+            return None, None
+        if node.left is None:
+            rest, node.right = node.right, None
+            node.update()
+            return node, rest
+        first, node.left = self._split_first(node.left)
+        node.update()
+        return first, node
+
+    def _merge(self, left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+        """Joins two trees where every interval of `left` comes before those of `right`."""
+        if left is None:
+            return right
+        if right is None:
+            return left
+        if left.priority > right.priority:
+            left.right = self._merge(left.right, right)
+            left.update()
+            return left
+        right.left = self._merge(left, right.left)
+        right.update()
+        return right
+
+
+class FreelancerSchedules:
+    """
+    Each freelancer's busy time: active bookings and calendar events that
+    mark them unavailable, in an IntervalTree.
+
+    A freelancer's schedule is read through the booking and calendar
+    indexes the first time it is asked for, and from then on follows every
+    booking and event written, by this process or another. Bookings and
+    events must be keyed by their id.
+
+    `reserve` checks and takes a slot under one lock, so two bookings
+    made at once in this process cannot both get it.
+    """
+
+    def __init__(self, bookings: Repository, calendar_events: Repository):
+        self._bookings = bookings
+        self._events = calendar_events
+        self._lock = threading.Lock()
+        self._freelancers: Dict[str, IntervalTree] = {}
+        # owner -> the freelancer it is counted under, and its interval there
+        self._held: Dict[Owner, Tuple[str, Interval]] = {}
+        bookings.watch(self._on_booking)
+        calendar_events.watch(self._on_event)
+
+    def conflicts(self, freelancer_id: str, start, end, ignore: Any = None) -> List[Owner]:
+        """The bookings and unavailable events of the freelancer that overlap [start, end)."""
+        with self._lock:
+            return self._conflicts(freelancer_id, micros(start), micros(end), ignore)
+
+    def reserve(self, freelancer_id: str, start, end, booking_id: Any) -> List[Owner]:
+        """
+        Holds [start, end) for the booking unless something else overlaps
+        it. Returns what does, and holds nothing then. The hold becomes the
+        booking's once it is written, or goes with `release`.
+        """
+        start, end = micros(start), micros(end)
+        with self._lock:
+            found = self._conflicts(freelancer_id, start, end, booking_id)
+            if not found:
+                # A booking moving to a new slot gives up its old one.
+                self._drop(("booking", booking_id))
+                self._hold(("booking", booking_id), freelancer_id, start, end)
+            return found
+
+    def release(self, booking_id: Any) -> None:
+        """Drops a hold `reserve` took for a booking that was not written after all."""
+        with self._lock:
+            self._drop(("booking", booking_id))
+
+    def _conflicts(self, freelancer_id: str, start: int, end: int, ignore: Any) -> List[Owner]:
+        return [owner for _, _, owner in self._freelancer(freelancer_id).overlapping(start, end)
+                if owner != ("booking", ignore)]
+
+    def _freelancer(self, freelancer_id: str) -> IntervalTree:
+        tree = self._freelancers.get(freelancer_id)
+        if tree is None:
+            intervals = [(micros(booking.start_time), micros(booking.end_time), ("booking", booking.id))
+                         for booking in self._bookings.find(freelancer_id=freelancer_id)
+                         if booking.status in ACTIVE_STATUSES]
+            intervals.extend((micros(event.start_time), micros(event.end_time), ("event", event.id))
+                             for event in self._events.find(freelancer_id=freelancer_id)
+                             if not event.is_available)
+            tree = self._freelancers[freelancer_id] = IntervalTree(intervals)
+            self._held.update((interval[2], (freelancer_id, interval)) for interval in intervals)
+        return tree
+
+    def _hold(self, owner: Owner, freelancer_id: str, start: int, end: int) -> None:
+        interval = (start, end, owner)
+        self._freelancer(freelancer_id).add(interval)
+        self._held[owner] = (freelancer_id, interval)
+
+    def _drop(self, owner: Owner) -> None:
+        held = self._held.pop(owner, None)
+        if held is not None:
+            freelancer_id, interval = held
+            self._freelancers[freelancer_id].remove(interval)
+
+    def _on_booking(self, key: Any) -> None:
+        if key is None:
+            self._clear()
+            return
+        with self._lock:
+            self._drop(("booking", key))
+            booking = self._bookings.get(key)
+            if booking is not None and booking.status in ACTIVE_STATUSES \
+                    and booking.freelancer_id in self._freelancers:
+                self._hold(("booking", key), booking.freelancer_id,
+                           micros(booking.start_time), micros(booking.end_time))
+
+    def _on_event(self, key: Any) -> None:
+        if key is None:
+            self._clear()
+            return
+        with self._lock:
+            self._drop(("event", key))
+            event = self._events.get(key)
+            if event is not None and not event.is_available and event.freelancer_id in self._freelancers:
+                self._hold(("event", key), event.freelancer_id, micros(event.start_time), micros(event.end_time))
+
+    def _clear(self) -> None:
+        # Rebuilt from storage as freelancers are next asked for.
+        with self._lock:
+            self._freelancers.clear()
+            self._held.clear()
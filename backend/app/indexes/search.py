@@ -0,0 +1,93 @@
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+GRAM_SIZE = 3
+
+
+def searchable_text(profile) -> Tuple[str, ...]:
+    """Returns the lowercased fields that directory search matches against."""
+    fields = [profile.laundr_id.lower()]
+    if profile.headline:
+        fields.append(profile.headline.lower())
+    fields.extend(skill.lower() for skill in profile.skill_tags)
+    return tuple(fields)
+
+
+def _grams(fields: Iterable[str]) -> set:
+    grams = set()
+    for text in fields:
+        for i in range(len(text) - GRAM_SIZE + 1):
+            grams.add(text[i:i + GRAM_SIZE])
+    return grams
+
+
+class SearchIndex:
+    """
+    Trigram index over laundr_id, headline and skill tags.
+
+    Postings are append-only arrays of user ids; removed or edited profiles
+    leave stale entries behind, which are filtered out when candidates are
+    verified against the stored text and dropped by periodic compaction.
+    Terms shorter than a trigram match most of the directory anyway and are
+    answered by scanning the cached lowercased text.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self._text: Dict[int, Tuple[str, ...]] = {}
+        self._stale = 0
+
+    def add(self, user_id: int, profile) -> None:
+        text = searchable_text(profile)
+        self._text[user_id] = text
+        self._post(user_id, text)
+
+    def remove(self, user_id: int) -> None:
+        if self._text.pop(user_id, None) is None:
+            return
+        self._stale += 1
+        if self._stale > max(len(self._text), 1024):
+            self._compact()
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._text.clear()
+        self._stale = 0
+
+    def search(self, term: str) -> List[int]:
+        """
+        Returns the ids of profiles whose laundr_id, headline or any skill tag
+        contains `term` (already lowercased), in ascending user id order.
+        """
+        if len(term) < GRAM_SIZE:
+            candidates = self._text.keys()
+        else:
+            postings = []
+            for gram in _grams((term,)):
+                posting = self._postings.get(gram)
+                if posting is None:
+                    return []
+                postings.append(posting)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            if len(postings) > 1 and len(candidates) > 64:
+                candidates.intersection_update(postings[1])
+
+        text = self._text
+        return sorted(
+            user_id for user_id in candidates
+            if user_id in text and any(term in field for field in text[user_id])
+        )
+
+    def _post(self, user_id: int, text: Tuple[str, ...]) -> None:
+        for gram in _grams(text):
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array("q")
+            posting.append(user_id)
+
+    def _compact(self) -> None:
+        self._postings = {}
+        self._stale = 0
+        for user_id, text in self._text.items():
+            self._post(user_id, text)
@@ -0,0 +1,104 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.storage.base import Repository
+from app.storage.ledger import micros
+
+# (start time in µs since the epoch, booking id)
+Entry = Tuple[int, Any]
+
+
+class BookingTimelines:
+    """
+    Each user's bookings, as client or freelancer, sorted by start time.
+
+    A user's timeline is read through the per-user booking indexes the
+    first time it is asked for, and from then on follows every booking
+    written, by this process or another. Bookings must be keyed by their id.
+    Report threads read timelines while the event loop writes bookings, so
+    both happen under a lock.
+    """
+
+    def __init__(self, bookings: Repository):
+        self._bookings = bookings
+        self._lock = threading.Lock()
+        self._users: Dict[str, List[Entry]] = {}
+        # booking id -> the timelines it is in, and its entry there
+        self._entries: Dict[Any, List[Tuple[str, Entry]]] = {}
+        bookings.watch(self._on_booking)
+
+    def newest_first(self, user_id: str, before: Optional[int] = None) -> Iterator[Any]:
+        """
+        Yields the user's bookings that start before `before` (µs since the
+        epoch), latest start first and, between equal starts, highest id first.
+        """
+        with self._lock:
+            timeline = self._user(user_id)
+            index = len(timeline) if before is None else bisect_left(timeline, (before,))
+        while index > 0:
+            index -= 1
+            with self._lock:
+                if index >= len(timeline):
+                    # Shrunk by a write while the caller was between bookings.
+                    continue
+                booking_id = timeline[index][1]
+            booking = self._bookings.get(booking_id)
+            if booking is not None:
+                yield booking
+
+    def oldest_first(self, user_id: str) -> Iterator[Any]:
+        """
+        Yields the user's bookings, earliest start first and, between equal
+        starts, lowest id first.
+        """
+        entry = None
+        while True:
+            with self._lock:
+                timeline = self._user(user_id)
+                # Carry on after the last entry yielded, wherever writes
+                # since have moved it.
+                index = 0 if entry is None else bisect_right(timeline, entry)
+                if index == len(timeline):
+                    return
+                entry = timeline[index]
+            booking = self._bookings.get(entry[1])
+            if booking is not None:
+                yield booking
+
+    def _user(self, user_id: str) -> List[Entry]:
+        timeline = self._users.get(user_id)
+        if timeline is None:
+            timeline = []
+            for booking in self._bookings.find_any(client_id=user_id, freelancer_id=user_id):
+                entry = (micros(booking.start_time), booking.id)
+                timeline.append(entry)
+                self._entries.setdefault(booking.id, []).append((user_id, entry))
+            timeline.sort()
+            self._users[user_id] = timeline
+        return timeline
+
+    def _on_booking(self, key: Any) -> None:
+        with self._lock:
+            self._apply(key)
+
+    def _apply(self, key: Any) -> None:
+        if key is None:
+            # Timelines are rebuilt from storage as users are next asked for.
+            self._users.clear()
+            self._entries.clear()
+            return
+        for user, entry in self._entries.pop(key, ()):
+            timeline = self._users[user]
+            del timeline[bisect_left(timeline, entry)]
+        booking = self._bookings.get(key)
+        if booking is None:
+            return
+        entry = (micros(booking.start_time), booking.id)
+        entries = []
+        for user in {booking.client_id, booking.freelancer_id}:
+            if user in self._users:
+                insort(self._users[user], entry)
+                entries.append((user, entry))
+        if entries:
+            self._entries[key] = entries
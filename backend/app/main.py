@@ -1,10 +1,42 @@
-from fastapi import FastAPI
+import math
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from app.api import profiles, settings, loads, bookings, calendar, directory, analytics
 from app.middleware.compliance import ComplianceMiddleware
+from app.middleware.storage_sync import StorageSyncMiddleware
+from app.services import astra
+from app.services import redis as redis_service
+from app.services.astra_client import AstraError, AstraUnavailable
+from app.services.audit import audit_outbox
+from app.services.report_jobs import report_jobs
+from app.storage.repositories import storage
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if astra.astra_client is not None:
+        await astra.astra_client.aclose()
+    await redis_service.slot_holds.aclose()
+    audit_outbox.close()
+    report_jobs.close()
+    storage.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(AstraError)
+async def astra_error_handler(request: Request, exc: AstraError):
+    if isinstance(exc, AstraUnavailable):
+        headers = {"Retry-After": str(math.ceil(exc.retry_after))} if exc.retry_after else None
+        return JSONResponse({"detail": "Astra is unavailable, try again later"}, status_code=503, headers=headers)
+    return JSONResponse({"detail": str(exc)}, status_code=502)
 
 app.add_middleware(ComplianceMiddleware)
+# Added last so it runs first: compliance checks read profiles too.
+app.add_middleware(StorageSyncMiddleware)
 
 app.include_router(profiles.router, prefix="/api/v1/profiles", tags=["profiles"])
 app.include_router(settings.router, prefix="/api/v1/settings", tags=["settings"])
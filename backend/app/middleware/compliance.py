@@ -2,6 +2,7 @@ from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
 import json
+from typing import Optional
 
 from agents.security.fraud_service import FraudService
 from agents.security.velocity_checker import VelocityChecker
@@ -13,11 +14,35 @@ FINANCIAL_PATHS = [
     "/api/v1/loads/swap-funds",
 ]
 
+# Both checkers are stateless; one instance serves every request.
+fraud_service = FraudService()
+velocity_checker = VelocityChecker()
+
+
+def compliance_denial(profile, transaction_details: dict) -> Optional[str]:
+    """
+    Runs the KYC, risk and velocity checks for a transaction sent by
+    `profile` and returns why it must be refused, or None when it may go
+    ahead.
+    """
+    if profile.kyc_status != "verified":
+        return "KYC not verified"
+
+    risk_score_result = fraud_service.get_risk_score(transaction_details)
+    if risk_score_result.get("risk_score", 0) > 0.75:
+        return "Transaction risk too high"
+
+    velocity_check_result = velocity_checker.check_transaction_velocity(profile.laundr_id, transaction_details)
+    if velocity_check_result.get("velocity_exceeded"):
+        return "Transaction velocity exceeded"
+    return None
+
+
 class ComplianceMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self.fraud_service = FraudService()
-        self.velocity_checker = VelocityChecker()
+    """
+    Refuses single-transfer requests whose sender fails compliance. Batch
+    endpoints run `compliance_denial` on every item themselves.
+    """
 
     async def dispatch(self, request: Request, call_next):
         if request.url.path in FINANCIAL_PATHS:
@@ -32,23 +57,14 @@ class ComplianceMiddleware(BaseHTTPMiddleware):
                 # For now, we will allow it to proceed and let the endpoint handle it.
                 return await call_next(request)
 
-            # 1. Check KYC status
             profile = await get_profile_by_laundr_id(sender_id)
             if not profile:
                 # Let the endpoint handle the "profile not found" error
                 return await call_next(request)
 
-            if profile.kyc_status != "verified":
-                return JSONResponse(status_code=403, content={"detail": "KYC not verified"})
-
-            # 2. Perform risk analysis
-            risk_score_result = self.fraud_service.get_risk_score(transaction_details)
-            if risk_score_result.get("risk_score", 0) > 0.75:
-                return JSONResponse(status_code=403, content={"detail": "Transaction risk too high"})
-
-            velocity_check_result = self.velocity_checker.check_transaction_velocity(profile.laundr_id, transaction_details)
-            if velocity_check_result.get("velocity_exceeded"):
-                return JSONResponse(status_code=403, content={"detail": "Transaction velocity exceeded"})
+            denial = compliance_denial(profile, transaction_details)
+            if denial:
+                return JSONResponse(status_code=403, content={"detail": denial})
 
         response = await call_next(request)
         return response
@@ -0,0 +1,23 @@
+import anyio
+
+from app.storage.repositories import storage
+
+
+class StorageSyncMiddleware:
+    """
+    Brings this worker up to date with the other workers' writes before each
+    request, so a client never reads older state than it has already seen
+    from another worker. A no-op unless the storage backend is SQLite.
+
+    The changes are read on a worker thread, so their queries and decoding
+    don't hold up the event loop, and applied back on the loop, which owns
+    the in-process indexes they update.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and storage.db is not None:
+            storage.replay(await anyio.to_thread.run_sync(storage.pending))
+        await self.app(scope, receive, send)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from datetime import datetime, date
-from typing import List
+from typing import List, Literal, Optional
 from enum import Enum
 
 
@@ -51,3 +51,54 @@ class IncomeTrendResponse(BaseModel):
 class ProjectionsResponse(BaseModel):
     projected_revenue: float
     from_booking_count: int
+
+
+# Schemas for background report jobs
+
+class ReportType(str, Enum):
+    FINANCIAL_REPORT = "financial_report"
+    INCOME_TREND = "income_trend"
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class ReportJobCreate(BaseModel):
+    user_id: str
+    report: ReportType
+    # financial_report
+    compression: Literal["none", "gzip"] = "none"
+    # income_trend
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    granularity: Literal["day", "week", "month"] = "day"
+
+    @model_validator(mode="after")
+    def _check_range(self):
+        if self.report == ReportType.INCOME_TREND and (self.start_date is None or self.end_date is None):
+            raise ValueError("income_trend reports need a start_date and an end_date")
+        return self
+
+
+class ReportJobResponse(BaseModel):
+    job_id: str
+    report: ReportType
+    user_id: str
+    status: JobStatus
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class ReportJobRecord(BaseModel):
+    """A report job as stored, so that any worker process can answer for it."""
+    id: str
+    request: ReportJobCreate
+    status: JobStatus = JobStatus.PENDING
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
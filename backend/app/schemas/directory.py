@@ -1,13 +1,33 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Dict, Tuple
 from app.schemas.profile import Profile
 
 
+def parse_location(value: str) -> Tuple[float, float]:
+    """Parses a "latitude,longitude" pair."""
+    try:
+        lat, lon = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError("location must be formatted as 'latitude,longitude'")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("location is out of range")
+    return lat, lon
+
+
+def _check_location(value: Optional[str]) -> Optional[str]:
+    if value is not None:
+        parse_location(value)
+    return value
+
+
 class FreelancerProfile(Profile):
     rating: Optional[float] = None
     reviews: Optional[int] = None
     is_verified_freelancer: bool = False
     availability: Optional[str] = "available"
+    # Inputs of the AI Directory Ranking Agent, in [0, 1]
+    sentiment_score: Optional[float] = None
+    activity_score: Optional[float] = None
 
 
 class SearchResult(BaseModel):
@@ -17,12 +37,48 @@ class SearchResult(BaseModel):
 
 class SearchQuery(BaseModel):
     term: str
+    # Also match terms within `max_distance` edits (shorter terms get less slack)
+    fuzzy: bool = False
+    max_distance: int = Field(2, ge=0, le=2)
+    # Paging over matches in user id order; the next cursor is returned in
+    # the X-Next-Cursor header
+    limit: Optional[int] = Field(None, ge=1)
+    cursor: Optional[str] = None
+
+
+class Suggestion(BaseModel):
+    text: str
+    kind: str  # "laundr_id" or "skill"
+    count: int
+
+
+class AutocompleteResponse(BaseModel):
+    suggestions: List[Suggestion]
 
 
 class FilterParams(BaseModel):
     category: Optional[str] = None
-    location: Optional[str] = None
+    location: Optional[str] = None  # "latitude,longitude"
+    radius_km: float = Field(25.0, gt=0)
     min_rating: Optional[float] = None
+    availability: Optional[str] = None
+    # Paging over matches in user id order; the next cursor is returned in
+    # the X-Next-Cursor header
+    limit: Optional[int] = Field(None, ge=1)
+    cursor: Optional[str] = None
+
+    _check_location = field_validator("location")(_check_location)
+
+
+class FacetCounts(BaseModel):
+    skill_tags: Dict[str, int]
+    rating: Dict[str, int]
+    availability: Dict[str, int]
+
+
+class FacetedFreelancers(BaseModel):
+    freelancers: List[FreelancerProfile]
+    facets: FacetCounts
 
 
 class SortParams(BaseModel):
@@ -33,3 +89,32 @@ class SortParams(BaseModel):
     activity_weight: float = 1.0
     proximity_weight: float = 1.0
     price_weight: float = 1.0
+    # Proximity is scored against this point; without it every freelancer
+    # gets a neutral proximity
+    location: Optional[str] = None  # "latitude,longitude"
+    proximity_radius_km: float = Field(50.0, gt=0)
+    # Paging over the ranked list; no limit returns every freelancer. The
+    # cursor from the X-Next-Cursor header resumes after the previous page.
+    offset: int = Field(0, ge=0)
+    limit: Optional[int] = Field(None, ge=1)
+    cursor: Optional[str] = None
+
+    _check_location = field_validator("location")(_check_location)
+
+
+class NearbyQuery(BaseModel):
+    location: str  # "latitude,longitude"
+    k: int = Field(10, ge=1, le=1000)
+
+    _check_location = field_validator("location")(_check_location)
+
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    ttl: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    hit_ratio: float
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Union
+from typing import List, Optional, Union
 
 # Schemas for Astra Routines
 class AstraRoutineCreate(BaseModel):
@@ -12,6 +12,9 @@ class AstraRoutine(BaseModel):
     id: str
     status: str
 
+class AstraRoutineBatchCreate(BaseModel):
+    routines: List[AstraRoutineCreate]
+
 # Schemas for Loads API
 class LoadCreate(BaseModel):
     amount: float = Field(..., gt=0, description="The amount to send or request.")
@@ -6,6 +6,8 @@ class ProfileBase(BaseModel):
     bio: Optional[str] = None
     headline: Optional[str] = None
     skill_tags: List[str] = []
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class ProfileCreate(ProfileBase):
     pass
@@ -14,6 +16,8 @@ class ProfileUpdate(BaseModel):
     bio: Optional[str] = None
     headline: Optional[str] = None
     skill_tags: Optional[List[str]] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class Profile(ProfileBase):
     user_id: int
@@ -1,234 +1,246 @@
 import io
 import csv
-from typing import List
+import heapq
+import zlib
+from itertools import groupby, islice, repeat
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, Optional
 from datetime import datetime, date, timedelta, timezone
-from app.schemas.analytics import ActivityItem, ActivityType
+from app.schemas.analytics import ActivityType
 from app.services.bookings import bookings_db
 from app.services.astra import transactions_db
+from app.indexes.rollups import IncomeRollups
+from app.indexes.revenue import RevenueIndex
+from app.indexes.timelines import BookingTimelines
+from app.storage.base import column_value
+from app.storage.ledger import micros
+from app.utils.pagination import Page, decode_cursor, encode_cursor
 
+# Kept up to date on every transaction logged and booking written.
+income_rollups = IncomeRollups(transactions_db, bookings_db)
+booking_timelines = BookingTimelines(bookings_db)
+revenue_index = RevenueIndex(bookings_db)
 
-async def get_activity_feed(user_id: str) -> List[ActivityItem]:
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+async def get_activity_feed(user_id: str, limit: Optional[int] = None, before: Optional[str] = None) -> Page:
     """
-    Constructs a user's activity feed from various sources.
+    Constructs a user's activity feed from various sources, newest first,
+    `limit` items at a time.
+
+    The user's bookings (by start time) and transactions (as logged) are
+    each read newest first and merged lazily, so a page costs its own size
+    rather than the user's whole history. Items are dicts shaped like
+    ActivityItem: they come from stored, already validated data.
     """
-    activities = []
-
-    # Process bookings from the in-memory db
-    for booking_id, booking in bookings_db.items():
-        if user_id in (booking.client_id, booking.freelancer_id):
-            is_client = booking.client_id == user_id
-            description = ""
-            if is_client:
-                description = f"Booking with {booking.freelancer_id}"
-            else:
-                description = f"Booking by {booking.client_id}"
-
-            activities.append(ActivityItem(
-                id=booking.id,
-                type=ActivityType.BOOKING,
-                timestamp=booking.start_time,
-                description=description,
-                amount=booking.price,
-                status=booking.status.value,
-            ))
-
-    # Process transactions from the in-memory db
-    for tx in transactions_db:
-        details = tx['details']
-        action = tx['action']
-        activity_type = None
-        description = ""
-        user_is_involved = False
-
-        if action == 'send_load':
-            activity_type = ActivityType.LOAD
-            if details.get('sender_id') == user_id:
-                user_is_involved = True
-                description = f"Sent load to {details.get('recipient_id')}"
-            elif details.get('recipient_id') == user_id:
-                user_is_involved = True
-                description = f"Received load from {details.get('sender_id')}"
-
-        elif action == 'request_load':
-            activity_type = ActivityType.REQUEST
-            if details.get('requester_id') == user_id:
-                 user_is_involved = True
-                 description = f"Requested load from {details.get('sender_id')}"
-            elif details.get('sender_id') == user_id:
-                 user_is_involved = True
-                 description = f"Load requested by {details.get('requester_id')}"
-
-        elif action == 'swap_funds':
-            activity_type = ActivityType.SWAP
-            if details.get('source_id') == user_id:
-                user_is_involved = True
-                description = f"Swapped funds to {details.get('destination_id')}"
-            elif details.get('destination_id') == user_id:
-                user_is_involved = True
-                description = f"Received swapped funds from {details.get('source_id')}"
-
-        if user_is_involved:
-            activities.append(ActivityItem(
-                id=details.get('transaction_id'),
-                type=activity_type,
-                timestamp=tx['timestamp'],
-                description=description,
-                amount=details.get('amount'),
-                status=tx.get('status'),
-            ))
-
-    # Sort activities by timestamp in reverse chronological order
-    activities.sort(key=lambda x: x.timestamp, reverse=True)
-
-    return activities
+    end = None
+    if before:
+        cursor_time, cursor_id = decode_cursor(before, "activity", int, str)
+        end = cursor_time + 1
+    bookings = (
+        _booking_activity(booking, user_id)
+        for booking in booking_timelines.newest_first(user_id, end)
+    )
+    transactions = transactions_db.iter_involving(
+        user_id, end=None if end is None else _EPOCH + timedelta(microseconds=end), newest_first=True
+    )
+    activities = (
+        activity for activity in map(_transaction_activity, transactions, repeat(user_id))
+        if activity is not None
+    )
+    feed = _by_time_and_id(heapq.merge(bookings, activities, key=_activity_time, reverse=True))
+    if before:
+        feed = _after_cursor(feed, cursor_time, cursor_id)
+
+    items = list(islice(feed, None if limit is None else limit + 1))
+    if limit is None or len(items) <= limit:
+        return Page(items)
+    items = items[:limit]
+    return Page(items, encode_cursor("activity", _activity_time(items[-1]), items[-1]["id"]))
+
+
+def _activity_time(activity: Dict[str, Any]) -> int:
+    return micros(activity["timestamp"])
+
+
+def _by_time_and_id(feed: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    # Items sharing a timestamp come highest id first, so that every item
+    # has a place relative to a cursor's (time, id).
+    for _, group in groupby(feed, key=_activity_time):
+        yield from sorted(group, key=itemgetter("id"), reverse=True)
+
+
+def _after_cursor(feed: Iterator[Dict[str, Any]], cursor_time: int, cursor_id: str) -> Iterator[Dict[str, Any]]:
+    # The feed starts at the timestamp the previous page ended on. Skip the
+    # items there that come up to and including the cursor's (time, id),
+    # whether or not the item it was taken from is still there: a booking
+    # may have moved since.
+    for activity in feed:
+        if _activity_time(activity) < cursor_time or activity["id"] < cursor_id:
+            yield activity
+            break
+    yield from feed
+
+
+def _booking_activity(booking, user_id: str) -> Dict[str, Any]:
+    if booking.client_id == user_id:
+        description = f"Booking with {booking.freelancer_id}"
+    else:
+        description = f"Booking by {booking.client_id}"
+    return {
+        "id": booking.id,
+        "type": ActivityType.BOOKING.value,
+        "timestamp": booking.start_time,
+        "description": description,
+        "amount": booking.price,
+        "status": booking.status.value,
+    }
+
+
+def _transaction_activity(tx: dict, user_id: str) -> Optional[Dict[str, Any]]:
+    details = tx['details']
+    action = tx['action']
+    activity_type = None
+    description = ""
+    user_is_involved = False
+
+    if action == 'send_load':
+        activity_type = ActivityType.LOAD
+        if details.get('sender_id') == user_id:
+            user_is_involved = True
+            description = f"Sent load to {details.get('recipient_id')}"
+        elif details.get('recipient_id') == user_id:
+            user_is_involved = True
+            description = f"Received load from {details.get('sender_id')}"
+
+    elif action == 'request_load':
+        activity_type = ActivityType.REQUEST
+        if details.get('requester_id') == user_id:
+             user_is_involved = True
+             description = f"Requested load from {details.get('sender_id')}"
+        elif details.get('sender_id') == user_id:
+             user_is_involved = True
+             description = f"Load requested by {details.get('requester_id')}"
+
+    elif action == 'swap_funds':
+        activity_type = ActivityType.SWAP
+        if details.get('source_id') == user_id:
+            user_is_involved = True
+            description = f"Swapped funds to {details.get('destination_id')}"
+        elif details.get('destination_id') == user_id:
+            user_is_involved = True
+            description = f"Received swapped funds from {details.get('source_id')}"
+
+    if not user_is_involved:
+        return None
+    return {
+        "id": details.get('transaction_id'),
+        "type": activity_type.value,
+        "timestamp": tx['timestamp'],
+        "description": description,
+        "amount": details.get('amount'),
+        "status": tx.get('status'),
+    }
 
 
 async def get_revenue_projections(user_id: str):
     """
     Calculates projected revenue from confirmed future bookings.
     """
-    projected_revenue = 0.0
-    booking_count = 0
-    now = datetime.now(timezone.utc)
-
-    for booking_id, booking in bookings_db.items():
-        # Projections are for freelancers receiving payment
-        if booking.freelancer_id == user_id:
-            # Convert booking start_time to offset-aware by assuming UTC
-            if booking.status == "confirmed" and booking.start_time.replace(tzinfo=timezone.utc) > now:
-                projected_revenue += booking.price
-                booking_count += 1
-
+    # Projections are for freelancers receiving payment
+    projected_revenue, booking_count = revenue_index.projection(user_id, micros(datetime.now(timezone.utc)))
     return {"projected_revenue": projected_revenue, "from_booking_count": booking_count}
 
 
-async def get_income_trend(user_id: str, start_date: date, end_date: date):
+async def get_income_trend(user_id: str, start_date: date, end_date: date, granularity: str = "day"):
     """
-    Calculates income, expenses, and net income over a date range.
+    Calculates income, expenses, and net income over a date range, per day,
+    week or month, from the user's daily rollups.
     """
-    trend_data = {}
-
-    # Initialize data points for the date range
-    current_date = start_date
-    while current_date <= end_date:
-        trend_data[current_date] = {"income": 0.0, "expenses": 0.0}
-        current_date += timedelta(days=1)
-
-    # Process bookings
-    for booking_id, booking in bookings_db.items():
-        booking_date = booking.start_time.date()
-        if start_date <= booking_date <= end_date and booking.status == "confirmed":
-            if booking.freelancer_id == user_id:
-                trend_data[booking_date]["income"] += booking.price
-            elif booking.client_id == user_id:
-                trend_data[booking_date]["expenses"] += booking.price
-
-    # Process transactions
-    for tx in transactions_db:
-        tx_date = tx['timestamp'].date()
-        if start_date <= tx_date <= end_date and tx['status'] == "completed":
-            details = tx['details']
-            action = tx['action']
-            amount = details.get('amount', 0.0)
+    return income_rollups.trend(user_id, start_date, end_date, granularity)
 
-            if action == 'send_load' and details.get('sender_id') == user_id:
-                trend_data[tx_date]["expenses"] += amount
-            elif action == 'send_load' and details.get('recipient_id') == user_id:
-                 trend_data[tx_date]["income"] += amount
 
-            # For swaps, we assume the user's perspective
-            elif action == 'swap_funds' and details.get('source_id') == user_id:
-                trend_data[tx_date]["expenses"] += amount
-            elif action == 'swap_funds' and details.get('destination_id') == user_id:
-                trend_data[tx_date]["income"] += amount
+async def get_revenue_report(user_id: str, breakdown_by: str):
+    """
+    Generates a revenue report, broken down by client or service.
+    """
+    # Only freelancers receive revenue from bookings, once they have started
+    revenue_data = revenue_index.breakdown(user_id, micros(datetime.now(timezone.utc)), breakdown_by)
+    return [
+        {"category": category, "total_revenue": total_revenue, "transaction_count": transaction_count}
+        for category, (total_revenue, transaction_count) in revenue_data.items()
+    ]
 
-    # Format for response
-    response_trend = []
-    for day, data in trend_data.items():
-        net_income = data['income'] - data['expenses']
-        response_trend.append({
-            "date": day,
-            "income": data['income'],
-            "expenses": data['expenses'],
-            "net_income": net_income
-        })
 
-    return sorted(response_trend, key=lambda x: x['date'])
+REPORT_HEADER = ['Date', 'Description', 'Income', 'Expense', 'Category']
 
 
-async def get_revenue_report(user_id: str, breakdown_by: str):
+def financial_report_rows(user_id: str) -> Iterator[list]:
     """
-    Generates a revenue report, broken down by client or service.
+    Yields the rows of a user's financial report in date order, merging
+    their bookings with their transactions as the latter are read.
     """
-    revenue_data = {}
-    now = datetime.now(timezone.utc)
-
-    # Only freelancers receive revenue from bookings
-    if breakdown_by == 'service':
-        for booking_id, booking in bookings_db.items():
-            if booking.freelancer_id == user_id and booking.status == "confirmed" and booking.start_time.replace(tzinfo=timezone.utc) < now:
-                service = booking.service
-                if service not in revenue_data:
-                    revenue_data[service] = {"total_revenue": 0.0, "transaction_count": 0}
-                revenue_data[service]["total_revenue"] += booking.price
-                revenue_data[service]["transaction_count"] += 1
-
-    elif breakdown_by == 'client':
-        for booking_id, booking in bookings_db.items():
-            if booking.freelancer_id == user_id and booking.status == "confirmed" and booking.start_time.replace(tzinfo=timezone.utc) < now:
-                client = booking.client_id
-                if client not in revenue_data:
-                    revenue_data[client] = {"total_revenue": 0.0, "transaction_count": 0}
-                revenue_data[client]["total_revenue"] += booking.price
-                revenue_data[client]["transaction_count"] += 1
-
-    # Format for response
-    response_report = []
-    for category, data in revenue_data.items():
-        response_report.append({
-            "category": category,
-            "total_revenue": data['total_revenue'],
-            "transaction_count": data['transaction_count']
-        })
-
-    return response_report
-
-
-async def generate_financial_report_csv(user_id: str):
+    merged = heapq.merge(_booking_report_rows(user_id), _transaction_report_rows(user_id), key=lambda item: item[0])
+    for _, row in merged:
+        yield row
+
+
+def stream_financial_report_csv(user_id: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
     """
-    Generates a CSV financial report for a user.
+    Generates a CSV financial report for a user, yielding it in encoded
+    chunks of about `chunk_size` bytes as the rows are produced.
     """
     output = io.StringIO()
     writer = csv.writer(output)
-
-    # Write header
-    writer.writerow(['Date', 'Description', 'Income', 'Expense', 'Category'])
-
-    # Process bookings
-    for booking_id, booking in bookings_db.items():
-        if booking.status == "confirmed":
-            row = None
-            if booking.freelancer_id == user_id:
-                row = [
-                    booking.start_time.strftime('%Y-%m-%d'),
-                    f"Payment for '{booking.service}' from {booking.client_id}",
-                    booking.price,
-                    "",
-                    "Booking Revenue"
-                ]
-            elif booking.client_id == user_id:
-                row = [
-                    booking.start_time.strftime('%Y-%m-%d'),
-                    f"Payment for '{booking.service}' to {booking.freelancer_id}",
-                    "",
-                    booking.price,
-                    "Service Expense"
-                ]
-            if row:
-                writer.writerow(row)
-
-    # Process transactions
-    for tx in transactions_db:
+    writer.writerow(REPORT_HEADER)
+    for row in financial_report_rows(user_id):
+        writer.writerow(row)
+        if output.tell() >= chunk_size:
+            yield output.getvalue().encode()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue().encode()
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip-compresses a stream of chunks as it goes."""
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _booking_report_rows(user_id: str) -> Iterator[tuple]:
+    for booking in booking_timelines.oldest_first(user_id):
+        if booking.status != "confirmed":
+            continue
+        row = None
+        if booking.freelancer_id == user_id:
+            row = [
+                booking.start_time.strftime('%Y-%m-%d'),
+                f"Payment for '{booking.service}' from {booking.client_id}",
+                booking.price,
+                "",
+                "Booking Revenue"
+            ]
+        elif booking.client_id == user_id:
+            row = [
+                booking.start_time.strftime('%Y-%m-%d'),
+                f"Payment for '{booking.service}' to {booking.freelancer_id}",
+                "",
+                booking.price,
+                "Service Expense"
+            ]
+        if row:
+            yield column_value(booking.start_time), row
+
+
+def _transaction_report_rows(user_id: str) -> Iterator[tuple]:
+    # Transactions come back in the order they were logged, i.e. by time.
+    for tx in transactions_db.iter_involving(user_id):
         if tx['status'] == "completed":
             details = tx['details']
             action = tx['action']
@@ -272,7 +284,4 @@ async def generate_financial_report_csv(user_id: str):
                     ]
 
             if row:
-                writer.writerow(row)
-
-    output.seek(0)
-    return output
+                yield column_value(tx['timestamp']), row
@@ -1,19 +1,173 @@
+import asyncio
+import copy
+import os
+import time
 import uuid
 from datetime import datetime, timezone
-from typing import List, Dict, Any
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 from app.schemas.astra import AstraUserIntentCreate, AstraUserIntent
-from app.schemas.loads import AstraRoutineCreate, AstraRoutine
+from app.schemas.loads import AstraRoutineBatchCreate, AstraRoutineCreate, AstraRoutine
+from app.services.astra_client import AstraError, client_from_env
+from app.services.audit import audit_log
+from app.storage.repositories import storage
 from app.utils.astra_contract import validate_astra_contract
 
-ASTRA_API_URL = "https://api.astra.financial/v1"
+# None when ASTRA_API_URL is unset: calls are then mocked, e.g. for tests
+# and local development. Point it at the stub (app.services.astra_stub)
+# to exercise the HTTP path without the real API.
+astra_client = client_from_env()
 
-# In-memory database for demonstration purposes
-transactions_db: List[Dict[str, Any]] = []
+transactions_db = storage.transactions
+
+
+class RoutineBatcher:
+    """
+    Coalesces concurrent routine creations into batch calls.
+
+    Requests are queued until `max_batch_size` of them are waiting or the
+    oldest has waited `max_wait` seconds, then sent together through `send`,
+    which returns one routine (or exception) per request, in order. Each
+    caller gets its own result back.
+
+    `stats()` reports how full batches are and the queueing delay the
+    batching adds, to tune both limits from production traffic.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[List[AstraRoutineCreate]], Awaitable[List[Union[AstraRoutine, Exception]]]],
+        max_batch_size: int = 50,
+        max_wait: float = 0.005,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._send = send
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_flight: set = set()
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def submit(self, routine: AstraRoutineCreate) -> AstraRoutine:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Anything queued belongs to a loop that has gone away.
+            self._pending = []
+            self._timer = None
+            self._loop = loop
+        future = loop.create_future()
+        self._pending.append((routine, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        """Sends whatever is queued now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Callers that gave up while queued are dropped.
+        batch = [request for request in self._pending if not request[1].done()]
+        self._pending = []
+        if not batch:
+            return
+
+        now = time.perf_counter()
+        self.batches += 1
+        self.items += len(batch)
+        if len(batch) >= self.max_batch_size:
+            self.full_batches += 1
+        for _, _, queued_at in batch:
+            self._wait_total += now - queued_at
+            self._wait_max = max(self._wait_max, now - queued_at)
+
+        task = self._loop.create_task(self._dispatch(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch: List[tuple]) -> None:
+        futures = [future for _, future, _ in batch]
+        failure = "The routine batch was cancelled"
+        try:
+            try:
+                results = await self._send([routine for routine, _, _ in batch])
+            except Exception as exc:
+                results = [_own_copy(exc) for _ in batch]
+            if len(results) != len(batch):
+                # Results pair up with requests by position only, so none
+                # of them can be trusted to be the caller's own.
+                failure = f"Astra answered {len(results)} routines for a batch of {len(batch)}"
+                return
+            for future, result in zip(futures, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            # No caller is left waiting, whatever ended the dispatch.
+            for future in futures:
+                if not future.done():
+                    future.set_exception(AstraError(failure))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "full_batches": self.full_batches,
+            "fill_ratio": self.items / (self.batches * self.max_batch_size) if self.batches else 0.0,
+            "mean_wait_ms": self._wait_total / self.items * 1000 if self.items else 0.0,
+            "max_wait_ms": self._wait_max * 1000,
+        }
+
+
+def _own_copy(exc: Exception) -> Exception:
+    """
+    A copy of `exc` for one of the callers it fails: each raises it from a
+    different task, which would otherwise keep adding to a shared traceback.
+    """
+    try:
+        copied = copy.copy(exc)
+    except Exception:
+        return exc
+    copied.__cause__ = exc.__cause__
+    return copied.with_traceback(exc.__traceback__)
+
+
+async def _create_routines(routines: List[AstraRoutineCreate]) -> List[Union[AstraRoutine, Exception]]:
+    """Creates several routines with one call to Astra's batch endpoint."""
+    body = await astra_client.post("/routines/batch", AstraRoutineBatchCreate(routines=routines).model_dump())
+    return [
+        AstraError(item["error"], item.get("status_code")) if "error" in item else AstraRoutine(**item)
+        for item in body["routines"]
+    ]
+
+
+def _batcher_from_env() -> Optional[RoutineBatcher]:
+    """
+    Builds the routine batcher ASTRA_BATCH_SIZE (default: 1, i.e. no
+    batching) and ASTRA_BATCH_WAIT_MS (default: 5) configure. Batching needs
+    ASTRA_API_URL to serve POST /routines/batch.
+    """
+    max_batch_size = int(os.getenv("ASTRA_BATCH_SIZE", "1"))
+    if astra_client is None or max_batch_size <= 1:
+        return None
+    return RoutineBatcher(_create_routines, max_batch_size, float(os.getenv("ASTRA_BATCH_WAIT_MS", "5")) / 1000)
+
+
+routine_batcher = _batcher_from_env()
 
 
 def log_transaction(action: str, details: dict):
-    """Stores a transaction event for the activity feed."""
-    print(f"AUDIT: {action} - {details}")
+    """Stores a transaction event for the activity feed and audits it."""
+    audit_log(action, details)
     log_entry = {
         "action": action,
         "details": details,
@@ -25,13 +179,15 @@ def log_transaction(action: str, details: dict):
 
 async def create_user_intent(user_data: AstraUserIntentCreate) -> AstraUserIntent:
     """
-    Creates a user intent with the Astra API.
-    In a real implementation, this would make a POST request to the Astra API.
-    For now, we'll mock the response.
+    Creates a user intent with the Astra API, or mocks the response when no
+    ASTRA_API_URL is configured.
     """
     if not validate_astra_contract(user_data.model_dump(), AstraUserIntentCreate):
         raise ValueError("Invalid user intent data for Astra contract")
 
+    if astra_client is not None:
+        return AstraUserIntent(**await astra_client.post("/user_intent", user_data.model_dump()))
+
     print(f"Calling Astra API to create user intent for {user_data.laundr_id}")
 
     # Mocked response
@@ -40,12 +196,16 @@ async def create_user_intent(user_data: AstraUserIntentCreate) -> AstraUserInten
 
 async def create_routine(routine_data: AstraRoutineCreate) -> AstraRoutine:
     """
-    Creates a routine with the Astra API.
-    In a real implementation, this would make a POST request to the Astra API.
-    For now, we'll mock the response.
+    Creates a routine with the Astra API, batched with concurrent calls when
+    ASTRA_BATCH_SIZE allows it, or mocks the response when no ASTRA_API_URL
+    is configured.
     """
-    if not validate_astra_contract(routine_data.model_dump(), AstraRoutineCreate):
-        raise ValueError("Invalid routine data for Astra contract")
+    # Routines are built from loads and swaps the API has validated; checking
+    # them against the contract again only dumped and re-validated them.
+    if routine_batcher is not None:
+        return await routine_batcher.submit(routine_data)
+    if astra_client is not None:
+        return AstraRoutine(**await astra_client.post("/routines", routine_data.model_dump()))
 
     print(f"Calling Astra API to create {routine_data.type} routine for {routine_data.amount}")
 
@@ -0,0 +1,261 @@
+"""
+Shared async HTTP client for the Astra API.
+
+One pooled `httpx.AsyncClient` per event loop keeps connections (and their
+TLS sessions) alive between calls, so a profile creation or load does not
+pay for a handshake. Every call runs under a deadline that covers all of
+its attempts. Failed attempts are retried with full-jitter backoff while a
+retry budget allows it, and a circuit breaker fails calls fast while Astra
+keeps failing.
+
+    ASTRA_API_URL           Astra base URL; unset keeps the offline mocks
+    ASTRA_API_KEY           Bearer token sent with every call
+    ASTRA_TIMEOUT           Deadline per call in seconds, retries included (default: 5)
+    ASTRA_MAX_CONNECTIONS   Pooled connections (default: 100)
+    ASTRA_MAX_RETRIES       Retries per call on top of the first attempt (default: 3)
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+# Transient statuses: the request may succeed if sent again.
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class AstraError(Exception):
+    """Astra rejected a call or kept failing it."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AstraUnavailable(AstraError):
+    """The call was not attempted (or given up on) because Astra is degraded."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of calls so they cannot multiply load on an
+    Astra that is already struggling.
+
+    Every call deposits `ratio` of a token and every retry withdraws a whole
+    one; `min_per_second` tokens trickle in regardless so low traffic can
+    still retry. The balance never exceeds `capacity`.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, capacity: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._clock = clock
+        self._balance = capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._balance = min(self.capacity, self._balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self) -> None:
+        self._refill()
+        self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self._balance < 1.0:
+            return False
+        self._balance -= 1.0
+        return True
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds. Then it lets one probe through (half-open):
+    its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.state = self.CLOSED
+
+    def retry_after(self) -> float:
+        """Seconds until an open circuit lets a probe through."""
+        return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and self.retry_after() == 0.0:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probing = False
+        self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = self._clock()
+
+
+class AstraClient:
+    """
+    Calls the Astra API over a connection pool with deadlines, budgeted
+    retries and a circuit breaker.
+
+    POSTs are retried under the same Idempotency-Key so Astra can drop a
+    duplicate when an attempt timed out after it had been processed.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str] = None,
+        timeout: float = 5.0,
+        max_connections: int = 100,
+        max_retries: int = 3,
+        backoff_base: float = 0.05,
+        backoff_cap: float = 1.0,
+        retry_budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self._headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=30.0,
+        )
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        # Pooled connections belong to the loop that opened them, so a new
+        # loop (e.g. one per TestClient request) gets a pool of its own.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None and not self._loop.is_closed():
+                # The old pool's connections can only be closed on their own
+                # loop. Those of a closed loop are closed as they are dropped.
+                asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop)
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self._headers,
+                limits=self._limits,
+                timeout=None,
+                transport=self._transport,
+            )
+            self._loop = loop
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POSTs `payload` as JSON and returns the decoded response body."""
+        if not self.breaker.allow():
+            raise AstraUnavailable("Astra circuit is open", retry_after=self.breaker.retry_after())
+
+        client = self._http()
+        headers = {"Idempotency-Key": str(uuid.uuid4())}
+        deadline = time.monotonic() + self.timeout
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                # Covers waiting for a pooled connection as well as the exchange.
+                async with asyncio.timeout(deadline - time.monotonic()):
+                    response = await client.post(path, json=payload, headers=headers)
+            except TimeoutError:
+                failure = AstraUnavailable("Astra did not respond before the deadline")
+            except httpx.TransportError as exc:
+                failure = AstraUnavailable(f"Astra request failed: {exc!r}")
+            except BaseException as exc:
+                # Failed in a way the cases above don't account for, or was
+                # cancelled. Either way the attempt has no outcome, and a
+                # half-open circuit must not wait forever for its probe.
+                if not isinstance(exc, asyncio.CancelledError) or self.breaker.state == CircuitBreaker.HALF_OPEN:
+                    self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code < 400:
+                    try:
+                        body = response.json()
+                    except ValueError:
+                        self.breaker.record_failure()
+                        raise AstraError("Astra responded with a body that is not JSON", response.status_code)
+                    self.breaker.record_success()
+                    return body
+                if response.status_code not in RETRYABLE_STATUSES:
+                    # The call was at fault, not Astra.
+                    self.breaker.record_success()
+                    raise AstraError(f"Astra rejected the request: {response.text}", response.status_code)
+                failure = AstraUnavailable(f"Astra responded {response.status_code}")
+
+            self.breaker.record_failure()
+            delay = self._backoff(attempt)
+            attempt += 1
+            if (
+                attempt > self.max_retries
+                or time.monotonic() + delay >= deadline
+                or not self.breaker.allow()
+                or not self.retry_budget.try_withdraw()
+            ):
+                raise failure
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+
+def client_from_env() -> Optional[AstraClient]:
+    """Builds the client ASTRA_* configure, or None when ASTRA_API_URL is unset."""
+    base_url = os.getenv("ASTRA_API_URL")
+    if not base_url:
+        return None
+    return AstraClient(
+        base_url,
+        api_key=os.getenv("ASTRA_API_KEY"),
+        timeout=float(os.getenv("ASTRA_TIMEOUT", "5")),
+        max_connections=int(os.getenv("ASTRA_MAX_CONNECTIONS", "100")),
+        max_retries=int(os.getenv("ASTRA_MAX_RETRIES", "3")),
+    )
@@ -0,0 +1,86 @@
+"""
+Local stand-in for the Astra API, for tests and latency benchmarks.
+
+    ASTRA_STUB_LATENCY      Seconds each response is delayed (default: 0)
+    ASTRA_STUB_ERROR_RATE   Fraction of calls answered 503 (default: 0)
+
+    uvicorn app.services.astra_stub:app --port 9000
+    ASTRA_API_URL=http://127.0.0.1:9000 uvicorn app.main:app
+"""
+import asyncio
+import os
+import random
+import uuid
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Header, Response
+
+from app.schemas.astra import AstraUserIntent, AstraUserIntentCreate
+from app.schemas.loads import (AstraRoutine, AstraRoutineBatchCreate,
+                               AstraRoutineCreate)
+
+
+def create_app(latency: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None) -> FastAPI:
+    """
+    Builds a stub whose latency and failure rate can be changed on
+    `app.state` while it runs. `app.state.calls` counts requests received.
+    """
+    stub = FastAPI()
+    stub.state.latency = latency
+    stub.state.error_rate = error_rate
+    stub.state.calls = 0
+    # Idempotency-Key -> response, so retried calls are not applied twice.
+    replies: Dict[str, dict] = {}
+    rng = random.Random(seed)
+
+    async def answer(key: Optional[str], build) -> Optional[dict]:
+        stub.state.calls += 1
+        if stub.state.latency:
+            await asyncio.sleep(stub.state.latency)
+        if rng.random() < stub.state.error_rate:
+            return None
+        if key is None:
+            return build()
+        if key not in replies:
+            replies[key] = build()
+        return replies[key]
+
+    @stub.post("/user_intent", response_model=AstraUserIntent)
+    async def create_user_intent(
+        user_data: AstraUserIntentCreate,
+        idempotency_key: Optional[str] = Header(None),
+    ):
+        reply = await answer(idempotency_key, lambda: {"id": f"ui_{uuid.uuid4()}", "status": "pending"})
+        if reply is None:
+            return Response(status_code=503)
+        return reply
+
+    @stub.post("/routines", response_model=AstraRoutine)
+    async def create_routine(
+        routine_data: AstraRoutineCreate,
+        idempotency_key: Optional[str] = Header(None),
+    ):
+        reply = await answer(idempotency_key, lambda: {"id": f"rt_{uuid.uuid4()}", "status": "completed"})
+        if reply is None:
+            return Response(status_code=503)
+        return reply
+
+    @stub.post("/routines/batch")
+    async def create_routines(
+        batch: AstraRoutineBatchCreate,
+        idempotency_key: Optional[str] = Header(None),
+    ):
+        reply = await answer(idempotency_key, lambda: {
+            "routines": [{"id": f"rt_{uuid.uuid4()}", "status": "completed"} for _ in batch.routines]
+        })
+        if reply is None:
+            return Response(status_code=503)
+        return reply
+
+    return stub
+
+
+app = create_app(
+    float(os.getenv("ASTRA_STUB_LATENCY", "0")),
+    float(os.getenv("ASTRA_STUB_ERROR_RATE", "0")),
+)
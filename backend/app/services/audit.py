@@ -0,0 +1,242 @@
+"""
+The audit trail, written off the request path.
+
+`audit_log` puts a record on a bounded in-process queue and returns; a
+writer thread drains the queue in batches and appends them as JSON lines.
+When the writer falls behind and the queue fills up, callers on other
+threads block until there is room again. Callers on the event loop queue
+their record past the bound instead, since waiting there would stall every
+request, not just those that audit. Either way records are never dropped.
+
+    AUDIT_LOG_PATH          JSON-lines file (default: unset, lines go to stdout)
+    AUDIT_QUEUE_SIZE        Records queued before callers wait for room (default: 10000)
+    AUDIT_BATCH_SIZE        Most records written per batch (default: 512)
+    AUDIT_LINGER_MS         Wait for more records after a partial batch (default: 10)
+    AUDIT_FSYNC_INTERVAL    Seconds between fsyncs of the file; 0 syncs every batch (default: 1)
+    AUDIT_MAX_BYTES         Size at which the file is rotated (default: 64 MiB)
+    AUDIT_BACKUP_COUNT      Rotated files kept as <path>.1 ... <path>.N (default: 5)
+"""
+import asyncio
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from agents.utils.logging import set_audit_sink
+from pydantic_core import to_json
+
+_STOP = object()
+
+
+class AuditOutbox:
+    """
+    Queue of audit records with a background writer thread.
+
+    The writer starts with the first record. After a partial batch it waits
+    `linger` seconds for more to arrive. Each batch is one write call;
+    the file is fsynced at most every `fsync_interval` seconds and rotated
+    once it reaches `max_bytes`. A record that cannot be serialized leaves
+    a line with its repr in its place, and the rest of its batch is written.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_queue: int = 10_000,
+        batch_size: int = 512,
+        linger: float = 0.01,
+        fsync_interval: float = 1.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        backup_count: int = 5,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.linger = linger
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_queue = max_queue
+        # Unbounded itself: `submit` holds callers back at `max_queue`.
+        self._queue: "queue.Queue" = queue.Queue()
+        self._room = threading.Condition()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._size = 0
+        self._synced_at = 0.0
+        self.written = 0
+        self.batches = 0
+        self.blocked = 0
+        self.spilled = 0
+        self.rejected = 0
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        """Queues `record`, waiting for room while the queue is full unless called on an event loop."""
+        if self._thread is None:
+            self._start()
+        if self._queue.qsize() >= self.max_queue:
+            if _on_event_loop():
+                self.spilled += 1
+            else:
+                self.blocked += 1
+                with self._room:
+                    self._room.wait_for(lambda: self._queue.qsize() < self.max_queue)
+        self._queue.put(record)
+
+    def flush(self) -> None:
+        """Waits until every record queued so far has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """Writes what is queued, then stops the writer."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "mean_batch": self.written / self.batches if self.batches else 0.0,
+            "blocked": self.blocked,
+            "spilled": self.spilled,
+            "rejected": self.rejected,
+        }
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._room:
+                self._room.notify_all()
+            records = [record for record in batch if record is not _STOP]
+            stopping = len(records) < len(batch)
+            try:
+                if records:
+                    self._write(records)
+            except Exception as exc:
+                # Losing the file must not take the writer (and every caller
+                # blocked on a full queue) down with it.
+                print(f"Audit writer failed, {len(records)} records lost: {exc!r}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if not stopping and len(batch) < self.batch_size:
+                # Let records pile up rather than waking for every one.
+                time.sleep(self.linger)
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        data = b"".join(map(self._line, records))
+        if self.path is None:
+            stdout = getattr(sys.stdout, "buffer", None)
+            if stdout is None:
+                sys.stdout.write(data.decode())
+            else:
+                stdout.write(data)
+            sys.stdout.flush()
+        else:
+            if self._file is None:
+                self._open()
+            elif self._size + len(data) > self.max_bytes and self._size:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            if time.monotonic() - self._synced_at >= self.fsync_interval:
+                self._sync()
+        self.written += len(records)
+        self.batches += 1
+
+    def _line(self, record: Dict[str, Any]) -> bytes:
+        try:
+            return to_json(record, fallback=str) + b"\n"
+        except Exception as exc:
+            # E.g. a circular reference: only this record is lost.
+            self.rejected += 1
+            print(f"Audit record could not be serialized: {exc!r}", file=sys.stderr)
+            return to_json({
+                "timestamp": datetime.now(timezone.utc),
+                "unserializable": repr(record),
+                "error": repr(exc),
+            }) + b"\n"
+
+    def _open(self) -> None:
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._synced_at = time.monotonic()
+
+    def _rotate(self) -> None:
+        self._sync()
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _outbox_from_env() -> AuditOutbox:
+    return AuditOutbox(
+        path=os.getenv("AUDIT_LOG_PATH") or None,
+        max_queue=int(os.getenv("AUDIT_QUEUE_SIZE", "10000")),
+        batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "512")),
+        linger=float(os.getenv("AUDIT_LINGER_MS", "10")) / 1000,
+        fsync_interval=float(os.getenv("AUDIT_FSYNC_INTERVAL", "1")),
+        max_bytes=int(os.getenv("AUDIT_MAX_BYTES", str(64 * 1024 * 1024))),
+        backup_count=int(os.getenv("AUDIT_BACKUP_COUNT", "5")),
+    )
+
+
+audit_outbox = _outbox_from_env()
+atexit.register(audit_outbox.close)
+
+
+def audit_log(action: str, details: dict) -> None:
+    """Records an audited action without waiting for it to be written."""
+    audit_outbox.submit({"timestamp": datetime.now(timezone.utc), "action": action, "details": details})
+
+
+def _agent_audit(message: str) -> None:
+    audit_outbox.submit({"timestamp": datetime.now(timezone.utc), "source": "agents", "message": message})
+
+
+# The security agents the API calls log through the same outbox.
+set_audit_sink(_agent_audit)
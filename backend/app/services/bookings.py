@@ -1,26 +1,41 @@
+from fastapi import HTTPException
 from app.schemas.bookings import BookingCreate, BookingResponse, BookingUpdate, BookingStatus
 from app.api.loads import send_load
 from app.schemas.loads import LoadCreate
+from app.indexes.schedules import FreelancerSchedules
+from app.services.audit import audit_log
+from app.storage.repositories import storage
+from app.utils.pagination import Page, decode_cursor, encode_cursor
+from typing import Optional
 import uuid
 
-# In-memory database for demonstration purposes
-bookings_db = {}
+bookings_db = storage.bookings
+schedules = FreelancerSchedules(bookings_db, storage.calendar_events)
 
 
-def audit_log(action: str, details: dict):
-    """Placeholder for audit logging."""
-    print(f"AUDIT: {action} - {details}")
+def _reserve(freelancer_id: str, start_time, end_time, booking_id: str) -> None:
+    if schedules.reserve(freelancer_id, start_time, end_time, booking_id):
+        raise HTTPException(
+            status_code=409, detail="Time slot overlaps another booking or unavailable time."
+        )
 
 
 async def create_booking(booking: BookingCreate) -> BookingResponse:
     """Creates a new booking and reserves the time slot."""
     booking_id = str(uuid.uuid4())
+    _reserve(booking.freelancer_id, booking.start_time, booking.end_time, booking_id)
+    # Pass the already validated fields straight through: dumping them
+    # first costs more than the validation itself.
     new_booking = BookingResponse(
         id=booking_id,
         status=BookingStatus.PENDING,
-        **booking.model_dump()
+        **vars(booking)
     )
-    bookings_db[booking_id] = new_booking
+    try:
+        bookings_db[booking_id] = new_booking
+    except Exception:
+        schedules.release(booking_id)
+        raise
     audit_log("booking_created", {"booking_id": booking_id})
     return new_booking
 
@@ -37,9 +52,10 @@ async def approve_booking(booking_id: str) -> BookingResponse:
         recipient_id=booking.freelancer_id,
         amount=booking.price * 0.2  # 20% deposit
     )
-    await send_load(deposit_load)
+    await send_load(deposit_load, idempotency_key=None)
 
     booking.status = BookingStatus.APPROVED
+    bookings_db[booking_id] = booking
     audit_log("booking_approved", {"booking_id": booking_id})
     return booking
 
@@ -50,6 +66,7 @@ async def decline_booking(booking_id: str) -> BookingResponse:
     if not booking:
         return None
     booking.status = BookingStatus.DECLINED
+    bookings_db[booking_id] = booking
     audit_log("booking_declined", {"booking_id": booking_id})
     return booking
 
@@ -60,6 +77,14 @@ async def counter_booking(booking_id: str, booking_update: BookingUpdate) -> Boo
     if not booking:
         return None
 
+    if booking_update.start_time or booking_update.end_time:
+        _reserve(
+            booking.freelancer_id,
+            booking_update.start_time or booking.start_time,
+            booking_update.end_time or booking.end_time,
+            booking_id,
+        )
+
     # Update booking with new terms
     if booking_update.start_time:
         booking.start_time = booking_update.start_time
@@ -69,10 +94,28 @@ async def counter_booking(booking_id: str, booking_update: BookingUpdate) -> Boo
         booking.price = booking_update.price
 
     booking.status = BookingStatus.COUNTERED
+    bookings_db[booking_id] = booking
     audit_log("booking_countered", {"booking_id": booking_id, "update": booking_update.model_dump()})
     return booking
 
 
-async def get_all_bookings():
-    """Returns all bookings."""
-    return list(bookings_db.values())
+async def get_all_bookings(limit: Optional[int] = None, cursor: Optional[str] = None) -> Page:
+    """
+    Returns bookings in creation order, `limit` at a time.
+
+    Bookings are only ever appended, so resuming after the last booking id
+    seen is stable while new bookings keep arriving. Each page seeks to
+    that id, so it costs its own size whatever page it is.
+    """
+    last = None
+    if cursor:
+        (last,) = decode_cursor(cursor, "bookings", str)
+    try:
+        # One extra booking tells whether another page follows.
+        items = bookings_db.items_after(last, None if limit is None else limit + 1)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if limit is None or len(items) <= limit:
+        return Page([booking for _, booking in items])
+    items = items[:limit]
+    return Page([booking for _, booking in items], encode_cursor("bookings", items[-1][0]))
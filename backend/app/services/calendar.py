@@ -1,10 +1,10 @@
 from app.schemas.bookings import CalendarEvent, Availability
+from app.storage.repositories import storage
 from typing import List
 import uuid
 from datetime import datetime
 
-# In-memory database for demonstration purposes
-calendar_db = {}
+calendar_db = storage.calendar_events
 
 
 def get_availability(freelancer_id: str) -> List[Availability]:
@@ -36,6 +36,7 @@ def update_event(event_id: str, event_update: CalendarEvent) -> CalendarEvent:
     update_data = event_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(event, key, value)
+    calendar_db[event_id] = event
 
     return event
 
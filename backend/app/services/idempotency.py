@@ -0,0 +1,214 @@
+"""
+Idempotency-Key handling for endpoints with side effects.
+
+A request that carries an `Idempotency-Key` runs once per key: a duplicate
+that arrives while the first is still running waits for its outcome, and a
+later one gets the stored response replayed. Outcomes live in a bounded
+in-process LRU and, when IDEMPOTENCY_REDIS_URL is set, in Redis as well so
+every worker process can replay them. There a running request also marks
+its key, and a duplicate that reaches another worker meanwhile is answered
+409 rather than run a second time. Without Redis, or while it is
+unreachable, duplicates are only caught within a process.
+
+    IDEMPOTENCY_CACHE_SIZE  Outcomes kept in process (default: 10000)
+    IDEMPOTENCY_TTL         Seconds an outcome can be replayed (default: 86400)
+    IDEMPOTENCY_REDIS_URL   Redis shared by the workers (default: unset, in-process only)
+    IDEMPOTENCY_LEASE       Seconds a running request keeps its key marked, at most (default: 60)
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.utils.cache import TTLCache
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class Outcome(NamedTuple):
+    fingerprint: str
+    status_code: int
+    body: Any
+
+
+class RedisOutcomes:
+    """Outcomes shared through Redis; unreachable Redis only costs the sharing."""
+
+    def __init__(self, url: str, prefix: str = "idempotency:"):
+        import redis.asyncio
+
+        self._redis = redis.asyncio.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[Outcome]:
+        from redis.exceptions import RedisError
+
+        try:
+            data = await self._redis.get(self._prefix + key)
+        except (RedisError, OSError):
+            return None
+        return None if data is None else Outcome(*json.loads(data))
+
+    async def put(self, key: str, outcome: Outcome, ttl: float) -> None:
+        from redis.exceptions import RedisError
+
+        try:
+            await self._redis.set(self._prefix + key, json.dumps(outcome), ex=max(1, int(ttl)))
+        except (RedisError, OSError):
+            pass
+
+    async def claim(self, key: str, lease: float) -> bool:
+        """Marks `key` running, unless another worker has; True as well when Redis can't be reached."""
+        from redis.exceptions import RedisError
+
+        try:
+            return bool(await self._redis.set(self._prefix + "running:" + key, 1, nx=True, ex=max(1, int(lease))))
+        except (RedisError, OSError):
+            return True
+
+    async def release(self, key: str) -> None:
+        from redis.exceptions import RedisError
+
+        try:
+            await self._redis.delete(self._prefix + "running:" + key)
+        except (RedisError, OSError):
+            pass
+
+
+class IdempotencyStore:
+    """
+    Runs each (scope, key) once and replays its outcome.
+
+    Successes and 4xx errors are stored; 5xx errors and unexpected
+    exceptions are not, so a retry after a transient failure runs again.
+    Reusing a key for a different request is refused with 422, and one
+    that runs in another process (as the remote store tells) with 409.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 86_400.0, remote: Optional[Any] = None,
+                 lease: float = 60.0):
+        self.ttl = ttl
+        self.remote = remote
+        self.lease = lease
+        self._outcomes = TTLCache(maxsize=maxsize, ttl=ttl)
+        # key -> (fingerprint, future of the first request's Outcome)
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.replays = 0
+        self.joined = 0
+
+    async def run(self, scope: str, key: Optional[str], request: BaseModel, compute: Callable[[], Awaitable[Any]]):
+        """
+        Returns `await compute()`, or the response the first request with
+        the same key got (marked with an Idempotent-Replayed header).
+        """
+        if key is None:
+            return await compute()
+
+        cache_key = f"{scope}:{key}"
+        fingerprint = hashlib.blake2b(request.model_dump_json().encode(), digest_size=16).hexdigest()
+
+        outcome = self._outcomes.get(cache_key)
+        if outcome is None and self.remote is not None and cache_key not in self._in_flight:
+            outcome = await self.remote.get(cache_key)
+            if outcome is not None:
+                self._outcomes.put(cache_key, outcome)
+            else:
+                # The first request may have finished, or started, meanwhile.
+                outcome = self._outcomes.get(cache_key)
+        if outcome is not None:
+            self._check(outcome.fingerprint, fingerprint)
+            self.replays += 1
+            return self._replay(outcome)
+
+        pending = self._in_flight.get(cache_key)
+        if pending is not None:
+            self._check(pending[0], fingerprint)
+            self.joined += 1
+            # Shielded so a waiter that disconnects can't cancel the first request.
+            return self._replay(await asyncio.shield(pending[1]))
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[cache_key] = (fingerprint, future)
+        try:
+            if self.remote is None:
+                return await self._first(cache_key, fingerprint, future, compute)
+            if not await self.remote.claim(cache_key, self.lease):
+                busy = HTTPException(
+                    status_code=409, detail=f"A request with this {IDEMPOTENCY_HEADER} is still in progress"
+                )
+                future.set_result(Outcome(fingerprint, busy.status_code, {"detail": busy.detail}))
+                raise busy
+            try:
+                return await self._first(cache_key, fingerprint, future, compute)
+            finally:
+                # Released once the outcome is stored, so a later duplicate finds it.
+                await self.remote.release(cache_key)
+        finally:
+            del self._in_flight[cache_key]
+            if not future.done():
+                future.cancel()
+
+    async def _first(self, cache_key: str, fingerprint: str, future: asyncio.Future,
+                     compute: Callable[[], Awaitable[Any]]):
+        """Runs the first request with a key, storing its outcome and handing it to duplicates."""
+        try:
+            result = await compute()
+        except HTTPException as exc:
+            outcome = Outcome(fingerprint, exc.status_code, {"detail": exc.detail})
+            if exc.status_code < 500:
+                await self._store(cache_key, outcome)
+            future.set_result(outcome)
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Retrieved here so an exception nobody waited for isn't reported.
+            future.exception()
+            raise
+        else:
+            body = result.model_dump(mode="json") if isinstance(result, BaseModel) else result
+            outcome = Outcome(fingerprint, 200, body)
+            await self._store(cache_key, outcome)
+            future.set_result(outcome)
+            return result
+
+    async def _store(self, cache_key: str, outcome: Outcome) -> None:
+        self._outcomes.put(cache_key, outcome)
+        if self.remote is not None:
+            await self.remote.put(cache_key, outcome, self.ttl)
+
+    @staticmethod
+    def _check(stored: str, fingerprint: str) -> None:
+        if stored != fingerprint:
+            raise HTTPException(
+                status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used for a different request"
+            )
+
+    @staticmethod
+    def _replay(outcome: Outcome) -> JSONResponse:
+        return JSONResponse(outcome.body, status_code=outcome.status_code, headers={REPLAYED_HEADER: "true"})
+
+    def clear(self) -> None:
+        self._outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._outcomes.stats(), "in_flight": len(self._in_flight), "replays": self.replays,
+                "joined": self.joined}
+
+
+def _store_from_env() -> IdempotencyStore:
+    redis_url = os.getenv("IDEMPOTENCY_REDIS_URL")
+    return IdempotencyStore(
+        maxsize=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000")),
+        ttl=float(os.getenv("IDEMPOTENCY_TTL", "86400")),
+        remote=RedisOutcomes(redis_url) if redis_url else None,
+        lease=float(os.getenv("IDEMPOTENCY_LEASE", "60")),
+    )
+
+
+idempotency_store = _store_from_env()
@@ -1,21 +1,230 @@
-import redis
-from datetime import timedelta
+"""
+Holds on freelancers' time slots in Redis, shared by every worker process.
 
-# Connect to Redis
-# In a real app, connection details should come from config
-r = redis.Redis(host='localhost', port=6379, db=0)
+A booking holds the slots it covers, on a grid of REDIS_SLOT_MINUTES, for
+the few minutes it takes to go through, so two workers can't both take
+overlapping time before either has written its booking. The slots of a
+booking are held all or none by a Lua script, and holds made by
+concurrent requests in the same loop iteration are pipelined to Redis in
+one round trip.
 
+One async client per event loop talks to Redis over a connection pool. It
+connects with the first hold and is closed with the app. Holds fail open:
+while Redis is unreachable bookings go through, checked against this
+process's schedules only.
 
-def reserve_slot(slot_key: str, freelancer_id: str, duration: timedelta = timedelta(minutes=10)):
+    REDIS_URL               Redis server (default: redis://localhost:6379/0)
+    REDIS_MAX_CONNECTIONS   Pooled connections (default: 50)
+    REDIS_TIMEOUT           Seconds to wait for a connection or a reply (default: 0.25)
+    REDIS_SLOT_MINUTES      Length of a slot (default: 15)
+    REDIS_MAX_SLOTS         Slots one booking may hold; longer ones are refused (default: 672, a week of 15 minutes)
+"""
+import asyncio
+import functools
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, List, Optional
+
+import redis.asyncio
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Holds every key or none: KEYS are the slots, ARGV the holder and the hold in ms.
+_RESERVE_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        return 0
+    end
+end
+for _, key in ipairs(KEYS) do
+    redis.call('SET', key, ARGV[1], 'PX', ARGV[2])
+end
+return 1
+"""
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class SlotHolds:
+    """
+    Holds on slots through a pooled async Redis client, pipelining the
+    commands that concurrent callers queue in the same loop iteration.
+
+    A freelancer's keys share a hash tag, so a booking's slots are on one
+    node of a Redis Cluster and the script can take them together.
+    """
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        max_connections: int = 50,
+        timeout: float = 0.25,
+        slot_minutes: int = 15,
+        max_slots: int = 672,
+        client_factory: Optional[Callable[[], Any]] = None,
+    ):
+        self.url = url
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.slot = timedelta(minutes=slot_minutes)
+        self.max_slots = max_slots
+        self._client_factory = client_factory or self._connect
+        self._client = None
+        self._script = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[tuple] = []
+        self._in_flight: set = set()
+        self.round_trips = 0
+        self.commands = 0
+
+    def slots(self, start: datetime, end: datetime) -> List[str]:
+        """
+        The slots [start, end) covers, as keys for `reserve`. Naive times
+        are taken as UTC. Raises ValueError past `max_slots`: all of a
+        booking's slots go to Redis in one script, which holds up the
+        server for as long as it runs.
+        """
+        first = (_utc(start) - _EPOCH) // self.slot
+        last = max(first + 1, -((_EPOCH - _utc(end)) // self.slot))
+        if last - first > self.max_slots:
+            raise ValueError(f"Bookings can span at most {self.max_slots * self.slot.total_seconds() / 3600:g} hours")
+        return [(_EPOCH + i * self.slot).strftime("%Y-%m-%dT%H:%M") for i in range(first, last)]
+
+    async def reserve(self, freelancer_id: str, slot_keys: List[str], duration: timedelta) -> bool:
+        """
+        Holds all of the freelancer's slots for `duration`, or none if any is
+        held already. True as well when Redis could not be reached: holds
+        fail open, leaving the check to this process's schedules.
+        """
+        keys = [self._key(freelancer_id, slot_key) for slot_key in slot_keys]
+        hold = int(duration.total_seconds() * 1000)
+        result = await self._queue(lambda pipe: self._script(keys, ["reserved", hold], client=pipe))
+        return result is None or bool(result)
+
+    async def release(self, freelancer_id: str, slot_keys: List[str]) -> None:
+        """Gives up holds taken by `reserve`."""
+        keys = [self._key(freelancer_id, slot_key) for slot_key in slot_keys]
+        await self._queue(lambda pipe: pipe.delete(*keys))
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            client, self._client = self._client, None
+            self._loop = None
+            await client.aclose()
+
+    @staticmethod
+    def _key(freelancer_id: str, slot_key: str) -> str:
+        return f"slot:{{{freelancer_id}}}:{slot_key}"
+
+    def _connect(self):
+        pool = redis.asyncio.BlockingConnectionPool.from_url(
+            self.url,
+            max_connections=self.max_connections,
+            timeout=self.timeout,
+            socket_timeout=self.timeout,
+            socket_connect_timeout=self.timeout,
+        )
+        return redis.asyncio.Redis(connection_pool=pool)
+
+    def _redis(self):
+        # Pooled connections belong to the loop that opened them, so a new
+        # loop (e.g. one per TestClient request) gets a client of its own.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None and self._loop.is_running():
+                # The old pool's connections can only be closed on their own
+                # loop. Those of a loop that has stopped are closed as they
+                # are dropped: a close scheduled there would never run.
+                asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop)
+            self._client = self._client_factory()
+            self._script = self._client.register_script(_RESERVE_SCRIPT)
+            self._loop = loop
+            # Commands queued on the old loop stay with the flush scheduled there.
+            self._pending = []
+        return self._client
+
+    async def _queue(self, command: Callable[[Any], Awaitable]) -> Any:
+        """Queues `command` on the next pipeline and returns its reply; None if Redis could not be reached."""
+        client = self._redis()
+        future = self._loop.create_future()
+        pending = self._pending
+        pending.append((command, future))
+        if len(pending) == 1:
+            self._loop.call_soon(self._flush, client, pending)
+        return await future
+
+    def _flush(self, client, batch: List[tuple]) -> None:
+        if batch is self._pending:
+            self._pending = []
+        task = asyncio.create_task(self._dispatch(client, batch))
+        self._in_flight.add(task)
+        task.add_done_callback(functools.partial(self._dispatched, batch))
+
+    def _dispatched(self, batch: List[tuple], task: asyncio.Task) -> None:
+        self._in_flight.discard(task)
+        # A task cancelled before it started never reached _dispatch's finally.
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def _dispatch(self, client, batch: List[tuple]) -> None:
+        self.round_trips += 1
+        self.commands += len(batch)
+        results = [None] * len(batch)
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for command, _ in batch:
+                    await command(pipe)
+                results = await pipe.execute(raise_on_error=False)
+        except (RedisError, OSError) as exc:
+            logger.warning("Redis is unreachable, slot holds are skipped: %r", exc)
+        except Exception:
+            logger.exception("Slot hold pipeline failed, holds are skipped")
+        finally:
+            # Every caller hears back, failing open, however the pipeline
+            # ended: cancelled, failed, or answered for the wrong commands.
+            if len(results) != len(batch):
+                logger.warning("Redis answered %d commands for a pipeline of %d, slot holds are skipped",
+                               len(results), len(batch))
+                results = [None] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    logger.warning("Redis slot hold failed, skipped: %r", result)
+                    result = None
+                future.set_result(result)
+
+
+def _holds_from_env() -> SlotHolds:
+    return SlotHolds(
+        url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+        max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+        timeout=float(os.getenv("REDIS_TIMEOUT", "0.25")),
+        slot_minutes=int(os.getenv("REDIS_SLOT_MINUTES", "15")),
+        max_slots=int(os.getenv("REDIS_MAX_SLOTS", "672")),
+    )
+
+
+slot_holds = _holds_from_env()
+
+
+async def reserve_slots(freelancer_id: str, start: datetime, end: datetime,
+                        duration: timedelta = timedelta(minutes=10)) -> bool:
     """
-    Reserves a time slot for a freelancer for a given duration.
-    Returns True if the slot was successfully reserved, False otherwise.
+    Holds a freelancer's slots covering [start, end) for a given duration.
+    Returns True if every slot was held (or Redis could not be reached),
+    False if any already was. Raises ValueError past REDIS_MAX_SLOTS.
     """
-    # The value can be anything, we're just using SET with NX option
-    # which means "set only if the key does not already exist".
-    return r.set(f"slot:{freelancer_id}:{slot_key}", "reserved", ex=duration, nx=True)
+    return await slot_holds.reserve(freelancer_id, slot_holds.slots(start, end), duration)
 
 
-def release_slot(slot_key: str, freelancer_id: str):
-    """Releases a reserved time slot."""
-    r.delete(f"slot:{freelancer_id}:{slot_key}")
+async def release_slots(freelancer_id: str, start: datetime, end: datetime) -> None:
+    """Releases the slots `reserve_slots` held."""
+    await slot_holds.release(freelancer_id, slot_holds.slots(start, end))
@@ -0,0 +1,377 @@
+"""
+Heavy analytics reports, run as background jobs.
+
+A report is submitted, gets a job id straight away and is built by a pool
+of workers into a file, which is streamed back once it is done. The event
+loop never builds a report itself, and worker processes run at a lower
+priority than the one serving requests. Once REPORT_QUEUE_SIZE jobs are
+waiting or running, more are turned away until some finish.
+
+Finished reports are reused for the same (user, report, parameters, data
+version), where the version counts the transactions and bookings written
+for the user: an unchanged history gets the finished job back, a new
+transfer or booking makes the next submission build a fresh one. Jobs are
+stored with the rest of the data and their files kept in REPORT_DIR, so
+with shared storage any worker process can answer for a job another one
+accepted; the process that accepted a job reuses, evicts and, when it
+stops, removes it.
+
+Worker processes open the storage themselves, so they are only used when
+it can be shared (the SQLite backend without a ledger directory); on other
+storage reports are built in threads, which still keeps them off the loop.
+
+    REPORT_WORKERS      Workers building reports (default: 2)
+    REPORT_EXECUTOR     "process", "thread" or "auto" (default: auto, as above)
+    REPORT_JOBS_KEPT    Finished jobs, and their results, each process keeps for reuse (default: 64)
+    REPORT_QUEUE_SIZE   Jobs each process lets wait or run at once (default: 32)
+    REPORT_DIR          Directory of the results (default: beside the database when storage
+                        is shared, otherwise a temporary directory)
+"""
+import asyncio
+import atexit
+import functools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+import anyio
+from pydantic_core import to_json
+
+from app.schemas.analytics import (JobStatus, ReportJobCreate, ReportJobRecord,
+                                   ReportJobResponse, ReportType)
+from app.services import analytics
+from app.services.astra import transactions_db
+from app.services.bookings import bookings_db
+from app.storage.base import EventLog, Repository, parties
+from app.storage.repositories import storage
+
+# The request fields each report is built from
+_PARAMS = {
+    ReportType.FINANCIAL_REPORT: ("compression",),
+    ReportType.INCOME_TREND: ("start_date", "end_date", "granularity"),
+}
+_READ_SIZE = 64 * 1024
+
+
+def run_report(report: str, user_id: str, params: Dict[str, Any], path: str, own_process: bool = True) -> None:
+    """
+    Builds a report into the file at `path`, in a worker process of its own
+    or on a thread. A worker process catches up with storage and keeps its
+    caches between reports; a thread leaves both to the event loop.
+    """
+    if own_process:
+        storage.sync()
+    if report == ReportType.FINANCIAL_REPORT:
+        chunks = analytics.stream_financial_report_csv(user_id)
+        if params["compression"] == "gzip":
+            chunks = analytics.gzip_chunks(chunks)
+    else:
+        trend = analytics.income_rollups.trend(
+            user_id, params["start_date"], params["end_date"], params["granularity"], keep=own_process
+        )
+        chunks = [to_json({"trend": trend})]
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def build_report(record: ReportJobRecord, path: str, own_process: bool) -> None:
+    """Marks a job running and builds its report. Runs in a worker process or thread."""
+    storage.report_jobs[record.id] = record.model_copy(update={"status": JobStatus.RUNNING})
+    request = record.request
+    params = {name: getattr(request, name) for name in _PARAMS[request.report]}
+    run_report(request.report.value, request.user_id, params, path, own_process)
+
+
+class DataVersions:
+    """
+    Counts the transactions and bookings written for each user since it was
+    created, so that cached reports can tell whether they are still current.
+    """
+
+    def __init__(self, transactions: EventLog, bookings: Repository):
+        self._bookings = bookings
+        # Moves on when anything may have changed, e.g. a clear()
+        self._epoch = 0
+        self._users: Dict[str, int] = {}
+        # booking id -> its (client, freelancer), as last written
+        self._parties: Dict[Any, Tuple[str, str]] = {}
+        transactions.listen(self._on_transactions)
+        bookings.watch(self._on_booking)
+
+    def __getitem__(self, user_id: str) -> Tuple[int, int]:
+        return self._epoch, self._users.get(user_id, 0)
+
+    def _bump(self, user_id: str) -> None:
+        self._users[user_id] = self._users.get(user_id, 0) + 1
+
+    def _on_transactions(self, entries) -> None:
+        if entries is None:
+            self._epoch += 1
+            return
+        for entry in entries:
+            for user_id in parties(entry):
+                self._bump(user_id)
+
+    def _on_booking(self, key: Any) -> None:
+        if key is None:
+            self._epoch += 1
+            return
+        users = set(self._parties.pop(key, ()))
+        booking = self._bookings.get(key)
+        if booking is not None:
+            self._parties[key] = (booking.client_id, booking.freelancer_id)
+            users.update(self._parties[key])
+        elif not users:
+            # Deleted before we learnt whose it was.
+            self._epoch += 1
+        for user_id in users:
+            self._bump(user_id)
+
+
+class ReportJob:
+    """A stored report job, and where its result file goes."""
+
+    def __init__(self, record: ReportJobRecord, directory: str):
+        self.record = record
+        self.id = record.id
+        self.request = record.request
+        self.path = os.path.join(directory, record.id)
+
+    @property
+    def status(self) -> JobStatus:
+        return self.record.status
+
+    @property
+    def error(self) -> Optional[str]:
+        return self.record.error
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+
+    @property
+    def media_type(self) -> str:
+        if self.request.report == ReportType.INCOME_TREND:
+            return "application/json"
+        return "application/gzip" if self.request.compression == "gzip" else "text/csv"
+
+    @property
+    def filename(self) -> str:
+        if self.request.report == ReportType.INCOME_TREND:
+            return "income_trend.json"
+        return "financial_report.csv.gz" if self.request.compression == "gzip" else "financial_report.csv"
+
+    def describe(self) -> ReportJobResponse:
+        return ReportJobResponse(
+            job_id=self.id,
+            report=self.request.report,
+            user_id=self.request.user_id,
+            status=self.status,
+            created_at=self.record.created_at,
+            finished_at=self.record.finished_at,
+            error=self.error,
+        )
+
+
+class ReportQueueFull(Exception):
+    """As many report jobs as the queue holds are waiting or running already."""
+
+
+class ReportJobs:
+    """
+    The report jobs this process accepted, and the pool building them.
+
+    The pool is made with the first job, and the directory holding results
+    with the first job or lookup. Data versions are counted from creation,
+    so writes made before the first job still tell its report is stale. At most `queue_size` jobs wait or run at a
+    time. Finished jobs are kept, most recently used last, until more than
+    `kept` of them are; then the oldest go, with their records and files.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        executor: str = "auto",
+        kept: int = 64,
+        queue_size: int = 32,
+        directory: Optional[str] = None,
+    ):
+        if executor not in ("auto", "process", "thread"):
+            raise ValueError(f"Unknown report executor: {executor!r}")
+        self.workers = workers
+        self.executor = executor
+        self.kept = kept
+        self.queue_size = queue_size
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pool: Optional[Executor] = None
+        self._processes = False
+        self._directory: Optional[str] = None
+        # Whether the directory was made for this process, to be removed with it
+        self._temporary = False
+        self._versions = DataVersions(transactions_db, bookings_db)
+        # job id -> (its reuse key, its future)
+        self._jobs: "OrderedDict[str, Tuple[tuple, Future]]" = OrderedDict()
+        self._by_key: Dict[tuple, str] = {}
+
+    def submit(self, request: ReportJobCreate) -> ReportJob:
+        """
+        Starts building a report, or returns the job that built or is building
+        the same one. Raises ReportQueueFull rather than queue more than
+        `queue_size` jobs. Counts what other workers wrote as of the last
+        storage sync, which StorageSyncMiddleware runs before every request.
+        Writes the job's record to storage, so call it off the event loop.
+        """
+        with self._lock:
+            self._start()
+            params = {name: getattr(request, name) for name in _PARAMS[request.report]}
+            key = (request.user_id, request.report.value, tuple(params.values()), self._versions[request.user_id])
+            job_id = self._by_key.get(key)
+            if job_id is not None:
+                record = storage.report_jobs.get(job_id)
+                if record is not None and record.status != JobStatus.FAILED:
+                    self._jobs.move_to_end(job_id)
+                    return ReportJob(record, self._directory)
+            if sum(not future.done() for _, future in self._jobs.values()) >= self.queue_size:
+                raise ReportQueueFull(f"{self.queue_size} report jobs are waiting or running already")
+            record = ReportJobRecord(id=uuid.uuid4().hex, request=request, created_at=datetime.now(timezone.utc))
+            storage.report_jobs[record.id] = record
+            job = ReportJob(record, self._directory)
+            future = self._pool.submit(build_report, record, job.path, self._processes)
+            future.add_done_callback(functools.partial(_finished, record))
+            self._jobs[job.id] = (key, future)
+            self._by_key[key] = job.id
+            self._evict()
+        return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        """The job stored under `job_id`, whichever worker process accepted it."""
+        record = storage.report_jobs.get(job_id)
+        if record is None:
+            return None
+        with self._lock:
+            return ReportJob(record, self._results())
+
+    async def wait(self, job: ReportJob, interval: float = 0.1) -> Optional[ReportJob]:
+        """Waits for a job to finish and returns it as it finished, or None if it is gone since."""
+        with self._lock:
+            accepted = self._jobs.get(job.id)
+        if accepted is not None:
+            # Its record is written before the future's waiters hear of it.
+            await asyncio.wait([asyncio.wrap_future(accepted[1])])
+            return self.get(job.id)
+        # Accepted by another worker process: only its record tells.
+        while job is not None and not job.done:
+            await asyncio.sleep(interval)
+            storage.replay(await anyio.to_thread.run_sync(storage.pending))
+            job = self.get(job.id)
+        return job
+
+    def close(self) -> None:
+        """Stops the workers, dropping queued jobs, and removes the jobs this process accepted and their results."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            jobs = list(self._jobs)
+            self._jobs.clear()
+            self._by_key.clear()
+            directory, temporary = self._directory, self._temporary
+            if temporary:
+                self._directory, self._temporary = None, False
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        for job_id in jobs:
+            _remove(job_id, directory)
+        if temporary:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _results(self) -> str:
+        if self._directory is None:
+            directory = self.directory
+            if directory is None and storage.shared:
+                # Where every worker process opening the same database finds it
+                directory = f"{storage.db.path}.reports"
+            if directory is None:
+                self._directory, self._temporary = tempfile.mkdtemp(prefix="laundr-reports-"), True
+            else:
+                os.makedirs(directory, exist_ok=True)
+                self._directory = directory
+        return self._directory
+
+    def _start(self) -> None:
+        self._results()
+        if self._pool is None:
+            kind = self.executor
+            if kind == "auto":
+                kind = "process" if storage.shared else "thread"
+            self._processes = kind == "process"
+            if self._processes:
+                # Spawned, not forked: this process has threads and open connections.
+                # The initializer is a builtin so that workers are niced before they import the app.
+                self._pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=functools.partial(os.nice, 10),
+                )
+            else:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="report")
+
+    def _evict(self) -> None:
+        finished = [job_id for job_id, (_, future) in self._jobs.items() if future.done()]
+        for job_id in finished[:max(0, len(self._jobs) - self.kept)]:
+            key, _ = self._jobs.pop(job_id)
+            if self._by_key.get(key) == job_id:
+                del self._by_key[key]
+            _remove(job_id, self._directory)
+
+
+def _finished(record: ReportJobRecord, future: Future) -> None:
+    if future.cancelled():
+        error = "Cancelled: the report workers were shut down"
+    else:
+        exc = future.exception()
+        error = None if exc is None else f"{type(exc).__name__}: {exc}"
+    storage.report_jobs[record.id] = record.model_copy(update={
+        "status": JobStatus.COMPLETED if error is None else JobStatus.FAILED,
+        "finished_at": datetime.now(timezone.utc),
+        "error": error,
+    })
+
+
+def _remove(job_id: str, directory: str) -> None:
+    storage.report_jobs.pop(job_id, None)
+    try:
+        os.remove(os.path.join(directory, job_id))
+    except FileNotFoundError:
+        pass
+
+
+def read_chunks(f, size: int = _READ_SIZE):
+    """Streams an open result file, closing it at the end."""
+    with f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _jobs_from_env() -> ReportJobs:
+    return ReportJobs(
+        workers=int(os.getenv("REPORT_WORKERS", "2")),
+        executor=os.getenv("REPORT_EXECUTOR", "auto"),
+        kept=int(os.getenv("REPORT_JOBS_KEPT", "64")),
+        queue_size=int(os.getenv("REPORT_QUEUE_SIZE", "32")),
+        directory=os.getenv("REPORT_DIR") or None,
+    )
+
+
+report_jobs = _jobs_from_env()
+atexit.register(report_jobs.close)
@@ -0,0 +1,205 @@
+import itertools
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from datetime import datetime, timezone
+from enum import Enum
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Mapping,
+                    Optional, Tuple)
+
+# Which detail keys of a transaction hold the user paying and the user
+# paid, per action. These are the users a transaction is indexed under.
+PARTY_KEYS = {
+    "send_load": ("sender_id", "recipient_id"),
+    "request_load": ("sender_id", "requester_id"),
+    "swap_funds": ("source_id", "destination_id"),
+}
+
+
+def column_value(value: Any) -> Any:
+    """
+    Normalizes an attribute for comparison and storage in an indexed column.
+
+    Datetimes become epoch seconds (naive values are taken as UTC) so they
+    order correctly whatever their offset, and enums become their values.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+class Repository(MutableMapping):
+    """
+    Keyed table of Pydantic models.
+
+    Repositories behave like the dicts they replace, iterating in insertion
+    order (replacing a value keeps its position), and add equality lookups
+    on the attributes they index plus a batched write.
+
+    Models handed out may be shared with the repository. A caller that
+    mutates one must assign it back (`repo[key] = model`) for the change to
+    be persisted.
+    """
+
+    #: Attributes that `find` and `find_any` can filter on.
+    indexed: tuple = ()
+
+    def __init__(self):
+        self._watchers: List[Callable[[Any], None]] = []
+
+    @abstractmethod
+    def find(self, **criteria) -> List[Any]:
+        """Returns the models whose attributes equal every given value, in insertion order."""
+
+    @abstractmethod
+    def find_any(self, **criteria) -> List[Any]:
+        """Returns the models matching at least one given attribute value, in insertion order."""
+
+    @abstractmethod
+    def put_many(self, items: Mapping[Any, Any]) -> None:
+        """Writes several models in a single batch."""
+
+    def items_after(self, key: Any = None, limit: Optional[int] = None) -> List[Tuple[Any, Any]]:
+        """
+        Returns up to `limit` (key, model) pairs in insertion order, from the
+        one after `key` (or the first). Raises KeyError if `key` is not stored.
+        """
+        keys = iter(self)
+        if key is not None:
+            for stored in keys:
+                if stored == key:
+                    break
+            else:
+                raise KeyError(key)
+        return [(stored, self[stored]) for stored in itertools.islice(keys, limit)]
+
+    def get_many(self, keys: Iterable[Any]) -> Dict[Any, Any]:
+        """Returns the models stored under `keys`, skipping missing ones."""
+        found = {}
+        for key in keys:
+            model = self.get(key)
+            if model is not None:
+                found[key] = model
+        return found
+
+    def subscribe(self, callback: Callable[[Any], None]) -> None:
+        """
+        Calls `callback(key)` whenever another process changes `key`, or
+        `callback(None)` when it may have changed anything. A no-op for
+        backends that are not shared between processes.
+        """
+
+    def watch(self, callback: Callable[[Any], None]) -> None:
+        """
+        Calls `callback(key)` after `key` is written or deleted, whether by
+        this process or (see `subscribe`) another, and `callback(None)` when
+        anything may have changed, e.g. after `clear()`.
+        """
+        self._watchers.append(callback)
+        self.subscribe(callback)
+
+    def _changed(self, key: Any) -> None:
+        for callback in self._watchers:
+            callback(key)
+
+    def _check_criteria(self, criteria: Dict[str, Any]) -> None:
+        unknown = set(criteria) - set(self.indexed)
+        if unknown:
+            raise ValueError(f"Cannot filter on unindexed attributes: {', '.join(sorted(unknown))}")
+
+
+def parties(entry: Dict[str, Any]) -> Tuple[str, ...]:
+    """The distinct users a transaction entry involves, payer first."""
+    details = entry.get("details")
+    if not isinstance(details, dict):
+        return ()
+    users = []
+    for key in PARTY_KEYS.get(entry.get("action"), ()):
+        user = details.get(key)
+        if isinstance(user, str) and user not in users:
+            users.append(user)
+    return tuple(users)
+
+
+class EventLog(ABC):
+    """
+    Append-only log of event dicts with a datetime under "timestamp".
+
+    Iterates like the list it replaces, oldest first. Transactions are also
+    indexed by the users they involve (see PARTY_KEYS), so one user's
+    history can be read without scanning everyone's.
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[Optional[List[Dict[str, Any]]]], None]] = []
+
+    def listen(self, callback: Callable[[Optional[List[Dict[str, Any]]]], None]) -> None:
+        """
+        Calls `callback(entries)` with every batch of events logged from now
+        on, and `callback(None)` after `clear()`. Events other processes log
+        are passed on by `sync()`.
+        """
+        self._listeners.append(callback)
+
+    def sync(self) -> None:
+        """Passes the events other processes logged since the last call to the listeners."""
+        self.replay(self.pending())
+
+    def pending(self) -> Any:
+        """
+        Reads the events `sync` would pass on, without passing them on. Only
+        I/O, so it can run on another thread than the listeners; None if
+        there is nothing to read.
+        """
+        return None
+
+    def replay(self, pending: Any) -> None:
+        """Passes on the events `pending` read, except those a sync since passed on already."""
+
+    def _logged(self, entries: Optional[List[Dict[str, Any]]]) -> None:
+        for callback in self._listeners:
+            callback(entries)
+
+    @abstractmethod
+    def append(self, entry: Dict[str, Any]) -> None:
+        """Records one event."""
+
+    @abstractmethod
+    def extend(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """Records several events in a single batch."""
+
+    @abstractmethod
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Returns the events with start <= timestamp < end, oldest first."""
+
+    @abstractmethod
+    def involving(
+        self, user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Returns the events `user_id` is a party to with start <= timestamp < end, oldest first."""
+
+    def iter_involving(
+        self, user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+        newest_first: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Like `involving`, but reads the events a batch at a time as they are
+        consumed, optionally from the newest back.
+        """
+        entries = self.involving(user_id, start, end)
+        return reversed(entries) if newest_first else iter(entries)
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drops every event."""
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
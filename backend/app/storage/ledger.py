@@ -0,0 +1,570 @@
+import fcntl
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import uuid
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import (Any, Dict, Iterable, Iterator, List, Optional, Sequence,
+                    Tuple)
+
+import numpy as np
+from numpy.lib.recfunctions import repack_fields
+from pydantic_core import to_json
+
+from app.storage.base import PARTY_KEYS, EventLog
+
+#: One transaction on disk. Money is in integer cents, the timestamp in
+#: microseconds since the epoch (UTC), and every string (actions, statuses,
+#: user ids, transaction id prefixes) is an id into the ledger's string
+#: table, 0 meaning absent. `extra` is where the rest of the entry starts in
+#: the ledger's extras, plus one (0: nothing else).
+RECORD = np.dtype([
+    ("timestamp", "<i8"),
+    ("amount", "<i8"),
+    ("fee", "<i8"),
+    ("action", "<u4"),
+    ("status", "<u4"),
+    ("source", "<u4"),
+    ("destination", "<u4"),
+    ("reference", "<u4"),
+    ("extra", "<u8"),
+    ("flags", "<u4"),
+    ("reference_uuid", "V16"),
+])
+
+# flags
+_DETAILS = 1
+_AMOUNT = 2
+_FEE = 4
+_NAIVE = 8
+_REFERENCE_UUID = 16
+
+_FOOTER = struct.Struct("<8sQqq")  # magic, record count, min and max timestamp
+_MAGIC = b"LDGR\x01" + struct.pack("<H", RECORD.itemsize) + b"\x00"
+_EMPTY_MIN = 2 ** 63 - 1
+_EMPTY_MAX = -2 ** 63
+_SEGMENT_NAME = re.compile(r"^segment-(\d{8})\.ledger$")
+_LENGTH = struct.Struct("<I")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_UUID_LENGTH = 36
+_DECODE_CHUNK = 4096
+
+
+def micros(value: datetime) -> int:
+    """Microseconds since the epoch, taking naive datetimes as UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+class _Segment:
+    """A fixed-size run of records followed by a footer, mapped into memory."""
+
+    def __init__(self, buffer: mmap.mmap, capacity: int, path: Optional[str] = None):
+        self.buffer = buffer
+        self.capacity = capacity
+        self.path = path
+        magic, self.count, self.min_ts, self.max_ts = _FOOTER.unpack_from(buffer, capacity * RECORD.itemsize)
+        if magic != _MAGIC:
+            raise ValueError(f"Not a ledger segment (or written with another record format): {path}")
+
+    @classmethod
+    def create(cls, capacity: int, path: Optional[str] = None) -> "_Segment":
+        size = capacity * RECORD.itemsize + _FOOTER.size
+        if path is None:
+            buffer = mmap.mmap(-1, size)
+        else:
+            with open(path, "xb+") as f:
+                f.truncate(size)
+                buffer = mmap.mmap(f.fileno(), size)
+        _FOOTER.pack_into(buffer, capacity * RECORD.itemsize, _MAGIC, 0, _EMPTY_MIN, _EMPTY_MAX)
+        return cls(buffer, capacity, path)
+
+    @classmethod
+    def open(cls, path: str) -> "_Segment":
+        with open(path, "rb+") as f:
+            buffer = mmap.mmap(f.fileno(), 0)
+        return cls(buffer, (len(buffer) - _FOOTER.size) // RECORD.itemsize, path)
+
+    def records(self, count: Optional[int] = None) -> np.ndarray:
+        """The first `count` records (default: all), viewing the mapping without a copy."""
+        return np.frombuffer(self.buffer, RECORD, self.count if count is None else count)
+
+    def write(self, records: np.ndarray) -> None:
+        offset = self.count * RECORD.itemsize
+        self.buffer[offset:offset + records.nbytes] = records.tobytes()
+        # The footer is rewritten last: a record only counts once it is in.
+        self.count += len(records)
+        self.min_ts = min(self.min_ts, int(records["timestamp"].min()))
+        self.max_ts = max(self.max_ts, int(records["timestamp"].max()))
+        _FOOTER.pack_into(self.buffer, self.capacity * RECORD.itemsize, _MAGIC, self.count, self.min_ts, self.max_ts)
+
+    def close(self) -> None:
+        try:
+            self.buffer.close()
+        except BufferError:
+            # A caller still holds a view from records(); the mapping goes
+            # when that is collected.
+            pass
+
+
+class _Strings:
+    """
+    Interned strings, ids counting from 1. A file-backed table appends each
+    new string, length-prefixed, before any record refers to it.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.values: List[Optional[str]] = [None]
+        self.ids: Dict[str, int] = {}
+        self._file = None
+        if path is not None:
+            self._load()
+            self._file = open(path, "ab")
+
+    def intern(self, value: str) -> int:
+        string_id = self.ids.get(value)
+        if string_id is None:
+            if self._file is not None:
+                data = value.encode()
+                self._file.write(_LENGTH.pack(len(data)) + data)
+                self._file.flush()
+            string_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return string_id
+
+    def clear(self) -> None:
+        self.values[1:] = []
+        self.ids.clear()
+        if self._file is not None:
+            self._file.truncate(0)
+
+    def sync(self) -> None:
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            offset = 0
+            while offset + _LENGTH.size <= len(data):
+                (length,) = _LENGTH.unpack_from(data, offset)
+                end = offset + _LENGTH.size + length
+                if end > len(data):
+                    break
+                value = data[offset + _LENGTH.size:end].decode()
+                self.ids[value] = len(self.values)
+                self.values.append(value)
+                offset = end
+            # Drop a string cut short by a crash mid-write.
+            f.truncate(offset)
+
+
+class _Extras:
+    """
+    The parts of entries with no column of their own, as JSON, each
+    length-prefixed and appended in turn, never shared between records.
+    A file-backed store appends to its file before any record refers to it
+    and reads back from the file; otherwise it is held in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._data = bytearray()
+        self._file = None
+        self._size = 0
+        if path is not None:
+            self._file = open(path, "ab+")
+            self._size = self._file.seek(0, os.SEEK_END)
+
+    def append(self, value: bytes) -> int:
+        """Stores `value`, returning what a record refers to it by."""
+        data = _LENGTH.pack(len(value)) + value
+        offset = self._size
+        if self._file is None:
+            self._data += data
+        else:
+            self._file.write(data)
+            self._file.flush()
+        self._size += len(data)
+        return offset + 1
+
+    def get(self, ref: int) -> bytes:
+        offset = ref - 1
+        if self._file is None:
+            (length,) = _LENGTH.unpack_from(self._data, offset)
+            start = offset + _LENGTH.size
+            return bytes(self._data[start:start + length])
+        fd = self._file.fileno()
+        (length,) = _LENGTH.unpack(os.pread(fd, _LENGTH.size, offset))
+        return os.pread(fd, length, offset + _LENGTH.size)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._size = 0
+        if self._file is not None:
+            self._file.truncate(0)
+
+    def sync(self) -> None:
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LedgerEventLog(EventLog):
+    """
+    Append-only transaction log in fixed-size binary segments.
+
+    Each entry becomes one compact record (see RECORD) instead of a dict of
+    dicts, about 70 bytes whatever it holds. Detail keys with no column of
+    their own, amounts that are not whole cents and the like are kept as
+    JSON beside the record (not interned, so unique details don't grow the
+    string table), and entries come back as they went in, except that aware
+    timestamps come back in UTC.
+
+    Records go into segments of `segment_records` each, memory-mapped and
+    read through numpy views. Every segment's footer holds its record count
+    and its earliest and latest timestamps, so `between` skips segments
+    outside the window. `scan` hands out the raw records for vectorised
+    queries. An in-memory index lists the records each payer and payee is
+    party to, rebuilt from the segments on open, for `involving`.
+
+    With a `path`, segments, the string table and the extras are files in that
+    directory, written through the page cache (so they survive the process
+    dying) and synced to disk by `flush()`/`close()`. Only one process may
+    have a directory open. Without a path the segments are anonymous
+    mappings and nothing persists.
+    """
+
+    def __init__(self, path: Optional[str] = None, segment_records: int = 65_536):
+        super().__init__()
+        self.path = path
+        self.segment_records = segment_records
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        # user string id -> positions (segment number << 32 | row) of the
+        # records they are a party to, in the order they were logged
+        self._by_party: Dict[int, array] = {}
+        self._lock_file = None
+        if path is None:
+            self._strings = _Strings()
+            self._extras = _Extras()
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._lock_file = open(os.path.join(path, "LOCK"), "w")
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock_file.close()
+                raise RuntimeError(f"Ledger {path} is open in another process") from None
+            self._strings = _Strings(os.path.join(path, "strings"))
+            self._extras = _Extras(os.path.join(path, "extras"))
+            names = sorted(name for name in os.listdir(path) if _SEGMENT_NAME.match(name))
+            self._segments = [_Segment.open(os.path.join(path, name)) for name in names]
+            for number, segment in enumerate(self._segments):
+                self._index(number, 0, segment.records())
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self.extend((entry,))
+
+    def extend(self, entries: Iterable[Dict[str, Any]]) -> None:
+        entries = list(entries)
+        with self._lock:
+            records = np.array([self._encode(entry) for entry in entries], dtype=RECORD)
+            while len(records):
+                segment = self._writable_segment()
+                taken = records[:segment.capacity - segment.count]
+                self._index(len(self._segments) - 1, segment.count, taken)
+                segment.write(taken)
+                records = records[len(taken):]
+        self._logged(entries)
+
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        return [self._decode(row) for row in self.scan(start, end).tolist()]
+
+    def scan(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> np.ndarray:
+        """
+        Returns a copy of the records with start <= timestamp < end, oldest
+        first, as a structured array of RECORD, or of just `fields` of it.
+        Segments whose footer puts them outside the window are not read.
+        """
+        low = _EMPTY_MAX if start is None else micros(start)
+        high = _EMPTY_MIN if end is None else micros(end)
+        parts = []
+        for segment, count in self._snapshot():
+            if segment.max_ts < low or segment.min_ts >= high:
+                continue
+            records = segment.records(count)
+            if not (low <= segment.min_ts and segment.max_ts < high):
+                timestamps = records["timestamp"]
+                records = records[(timestamps >= low) & (timestamps < high)]
+            if fields is not None:
+                records = repack_fields(records[list(fields)])
+            parts.append(records)
+        if parts:
+            # Copies out of the mappings, even with a single part
+            return np.concatenate(parts)
+        return np.empty(0, RECORD if fields is None else repack_fields(RECORD[list(fields)]))
+
+    def involving(
+        self, user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        return list(self.iter_involving(user_id, start, end))
+
+    def iter_involving(
+        self, user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+        newest_first: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        string_id = self._strings.ids.get(user_id)
+        if string_id is None:
+            return
+        with self._lock:
+            positions = np.array(self._by_party.get(string_id, ()), dtype=np.int64)
+            segments = list(self._segments)
+        low = _EMPTY_MAX if start is None else micros(start)
+        high = _EMPTY_MIN if end is None else micros(end)
+        offsets = range(0, len(positions), _DECODE_CHUNK)
+        for offset in reversed(offsets) if newest_first else offsets:
+            chunk = positions[offset:offset + _DECODE_CHUNK]
+            numbers, rows = chunk >> 32, chunk & 0xFFFFFFFF
+            decoded = []
+            for number in np.unique(numbers).tolist():
+                segment = segments[number]
+                if segment.max_ts < low or segment.min_ts >= high:
+                    continue
+                records = segment.records()[rows[numbers == number]]
+                timestamps = records["timestamp"]
+                decoded.extend(records[(timestamps >= low) & (timestamps < high)].tolist())
+            for row in reversed(decoded) if newest_first else decoded:
+                yield self._decode(row)
+
+    def string_id(self, value: str) -> Optional[int]:
+        """The id `value` is stored under in records, or None if no record holds it."""
+        return self._strings.ids.get(value)
+
+    def string(self, string_id: int) -> Optional[str]:
+        return self._strings.values[string_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+                if segment.path is not None:
+                    os.remove(segment.path)
+            self._segments = []
+            self._by_party.clear()
+            self._strings.clear()
+            self._extras.clear()
+        self._logged(None)
+
+    def flush(self) -> None:
+        """Syncs a file-backed ledger to disk."""
+        with self._lock:
+            self._strings.sync()
+            self._extras.sync()
+            for segment in self._segments:
+                if segment.path is not None:
+                    segment.buffer.flush()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+            self._strings.close()
+            self._extras.close()
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def stats(self) -> Dict[str, Any]:
+        segments = self._snapshot()
+        return {
+            "records": sum(count for _, count in segments),
+            "segments": len(segments),
+            "strings": len(self._strings.values) - 1,
+            "extra_bytes": self._extras.size,
+            "bytes": sum(len(segment.buffer) for segment, _ in segments),
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for segment, count in self._snapshot():
+            for offset in range(0, count, _DECODE_CHUNK):
+                # Decode a chunk at a time, holding no view of the mapping
+                # while suspended.
+                rows = segment.records(min(count, offset + _DECODE_CHUNK))[offset:].tolist()
+                for row in rows:
+                    yield self._decode(row)
+
+    def __len__(self) -> int:
+        return sum(count for _, count in self._snapshot())
+
+    def _snapshot(self) -> List[Tuple[_Segment, int]]:
+        # Records past a segment's count may still be being written.
+        with self._lock:
+            return [(segment, segment.count) for segment in self._segments]
+
+    def _index(self, number: int, first_row: int, records: np.ndarray) -> None:
+        by_party = self._by_party
+        position = (number << 32) + first_row
+        for source, destination in zip(records["source"].tolist(), records["destination"].tolist()):
+            if source:
+                by_party.setdefault(source, array("q")).append(position)
+            if destination and destination != source:
+                by_party.setdefault(destination, array("q")).append(position)
+            position += 1
+
+    def _writable_segment(self) -> _Segment:
+        if self._segments and self._segments[-1].count < self._segments[-1].capacity:
+            return self._segments[-1]
+        path = None
+        if self.path is not None:
+            number = len(self._segments)
+            if self._segments and self._segments[-1].path is not None:
+                number = int(_SEGMENT_NAME.match(os.path.basename(self._segments[-1].path)).group(1)) + 1
+            path = os.path.join(self.path, f"segment-{number:08d}.ledger")
+        segment = _Segment.create(self.segment_records, path)
+        self._segments.append(segment)
+        return segment
+
+    def _encode(self, entry: Dict[str, Any]) -> tuple:
+        intern = self._strings.intern
+        extra_entry: Dict[str, Any] = {}
+        extra_details: Dict[str, Any] = {}
+        flags = 0
+        amount = fee = action = status = source = destination = reference = 0
+        reference_uuid = bytes(16)
+
+        timestamp = entry["timestamp"]
+        if timestamp.tzinfo is None:
+            flags |= _NAIVE
+
+        for key, value in entry.items():
+            if key == "timestamp":
+                continue
+            if key == "action" and isinstance(value, str):
+                action = intern(value)
+            elif key == "status" and isinstance(value, str):
+                status = intern(value)
+            elif key == "details" and isinstance(value, dict):
+                flags |= _DETAILS
+            else:
+                extra_entry[key] = value
+
+        if flags & _DETAILS:
+            parties = PARTY_KEYS.get(entry.get("action"), ())
+            for key, value in entry["details"].items():
+                if key == "amount" and _is_cents(value):
+                    amount = round(value * 100)
+                    flags |= _AMOUNT
+                elif key == "fee" and _is_cents(value):
+                    fee = round(value * 100)
+                    flags |= _FEE
+                elif key == "transaction_id" and isinstance(value, str):
+                    prefix, reference_uuid = _split_uuid(value)
+                    reference = intern(prefix)
+                    if reference_uuid is None:
+                        reference_uuid = bytes(16)
+                    else:
+                        flags |= _REFERENCE_UUID
+                elif parties and key == parties[0] and isinstance(value, str):
+                    source = intern(value)
+                elif parties and key == parties[1] and isinstance(value, str):
+                    destination = intern(value)
+                else:
+                    extra_details[key] = value
+
+        extra = 0
+        if extra_entry or extra_details:
+            extra = self._extras.append(to_json({"e": extra_entry, "d": extra_details}))
+        return (
+            micros(timestamp), amount, fee, action, status, source, destination, reference, extra, flags,
+            reference_uuid,
+        )
+
+    def _decode(self, row: tuple) -> Dict[str, Any]:
+        timestamp, amount, fee, action, status, source, destination, reference, extra, flags, reference_uuid = row
+        strings = self._strings.values
+        entry: Dict[str, Any] = {}
+        if action:
+            entry["action"] = strings[action]
+        if flags & _DETAILS:
+            details = entry["details"] = {}
+            if reference:
+                if flags & _REFERENCE_UUID:
+                    # str(uuid.UUID(bytes=...)), minus the validation
+                    h = reference_uuid.hex()
+                    details["transaction_id"] = f"{strings[reference]}{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+                else:
+                    details["transaction_id"] = strings[reference]
+            if source or destination:
+                sender_key, recipient_key = PARTY_KEYS[strings[action]]
+                if source:
+                    details[sender_key] = strings[source]
+                if destination:
+                    details[recipient_key] = strings[destination]
+            if flags & _AMOUNT:
+                details["amount"] = amount / 100
+            if flags & _FEE:
+                details["fee"] = fee / 100
+        entry["timestamp"] = (_NAIVE_EPOCH if flags & _NAIVE else _EPOCH) + timedelta(microseconds=timestamp)
+        if status:
+            entry["status"] = strings[status]
+        if extra:
+            kept = json.loads(self._extras.get(extra))
+            entry.update(kept["e"])
+            if kept["d"]:
+                entry["details"].update(kept["d"])
+        return entry
+
+
+def _is_cents(value: Any) -> bool:
+    """Whether `value` is a float that survives a round trip through whole cents."""
+    return (
+        type(value) is float and math.isfinite(value) and abs(value) < 2 ** 53 / 100
+        and round(value * 100) / 100 == value
+    )
+
+
+def _split_uuid(value: str) -> Tuple[str, Optional[bytes]]:
+    """
+    Splits ids like "rt_<uuid4>" into the prefix, which is interned, and the
+    UUID's 16 bytes, so unique ids don't each take a string table entry.
+    """
+    if len(value) >= _UUID_LENGTH:
+        tail = value[-_UUID_LENGTH:]
+        try:
+            parsed = uuid.UUID(tail)
+        except ValueError:
+            return value, None
+        if str(parsed) == tail:
+            return value[:-_UUID_LENGTH], parsed.bytes
+    return value, None
@@ -0,0 +1,150 @@
+import itertools
+import threading
+from bisect import bisect_right
+from operator import itemgetter
+from typing import (Any, Dict, Iterable, Iterator, List, Mapping, Optional,
+                    Tuple)
+
+from app.storage.base import Repository, column_value
+
+
+class MemoryRepository(Repository):
+    """
+    Process-local repository backed by a dict, with a hash index per
+    indexed attribute so lookups cost the number of matches.
+
+    Keys are also listed by insertion position, so `items_after` seeks to
+    its key rather than walking the dict. Deleted keys stay in that list
+    until they make up half of it.
+
+    Writes and the lookups that walk the indexes take a lock, so reports
+    built on worker threads can read while the event loop writes. Watchers
+    are called outside it.
+    """
+
+    def __init__(self, indexed: tuple = ()):
+        super().__init__()
+        self.indexed = indexed
+        self._data: Dict[Any, Any] = {}
+        # attribute -> column value -> keys holding it
+        self._index: Dict[str, Dict[Any, Dict[Any, None]]] = {name: {} for name in indexed}
+        # key -> (insertion position, indexed column values)
+        self._entries: Dict[Any, Tuple[int, tuple]] = {}
+        self._inserted = itertools.count()
+        # (insertion position, key), ascending; includes deleted keys
+        self._order: List[Tuple[int, Any]] = []
+        self._deleted = 0
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._reindex(key, value)
+        self._changed(key)
+
+    def __delitem__(self, key) -> None:
+        with self._lock:
+            del self._data[key]
+            self._unindex(key, self._entries.pop(key)[1])
+            self._deleted += 1
+            if self._deleted * 2 > len(self._order):
+                self._order = [(position, key) for position, key in self._order if self._live(position, key)]
+                self._deleted = 0
+        self._changed(key)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._entries.clear()
+            self._order.clear()
+            self._deleted = 0
+            for buckets in self._index.values():
+                buckets.clear()
+        self._changed(None)
+
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
+
+    def items(self):
+        return self._data.items()
+
+    def find(self, **criteria) -> List[Any]:
+        self._check_criteria(criteria)
+        with self._lock:
+            if not criteria:
+                return list(self._data.values())
+            buckets = [self._index[name].get(column_value(value), {}) for name, value in criteria.items()]
+            smallest = min(buckets, key=len)
+            return self._in_order(key for key in smallest if all(key in bucket for bucket in buckets))
+
+    def find_any(self, **criteria) -> List[Any]:
+        self._check_criteria(criteria)
+        keys: Dict[Any, None] = {}
+        with self._lock:
+            for name, value in criteria.items():
+                keys.update(self._index[name].get(column_value(value), {}))
+            return self._in_order(keys)
+
+    def put_many(self, items: Mapping[Any, Any]) -> None:
+        for key, value in items.items():
+            self[key] = value
+
+    def items_after(self, key: Any = None, limit: Optional[int] = None) -> List[Tuple[Any, Any]]:
+        with self._lock:
+            start = 0
+            if key is not None:
+                entry = self._entries.get(key)
+                if entry is None:
+                    raise KeyError(key)
+                start = bisect_right(self._order, entry[0], key=itemgetter(0))
+            order = self._order
+            live = (order[i][1] for i in range(start, len(order)) if self._live(*order[i]))
+            return [(key, self._data[key]) for key in itertools.islice(live, limit)]
+
+    def _live(self, position: int, key: Any) -> bool:
+        # A key deleted and written again is listed anew, at its new position.
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] == position
+
+    def _in_order(self, keys: Iterable[Any]) -> List[Any]:
+        entries = self._entries
+        return [self._data[key] for key in sorted(keys, key=lambda key: entries[key][0])]
+
+    def _reindex(self, key, value) -> None:
+        # The previous values are remembered rather than read off the old
+        # model, which the caller may have mutated in place.
+        values = tuple(column_value(getattr(value, name)) for name in self.indexed)
+        entry = self._entries.get(key)
+        if entry is None:
+            position = next(self._inserted)
+            self._order.append((position, key))
+        else:
+            position, previous = entry
+            if previous == values:
+                return
+            self._unindex(key, previous)
+        self._entries[key] = (position, values)
+        for name, column in zip(self.indexed, values):
+            self._index[name].setdefault(column, {})[key] = None
+
+    def _unindex(self, key, values: tuple) -> None:
+        for name, column in zip(self.indexed, values):
+            bucket = self._index[name][column]
+            del bucket[key]
+            if not bucket:
+                del self._index[name][column]
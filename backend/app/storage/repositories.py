@@ -0,0 +1,118 @@
+"""
+The application's repositories, on the backend picked by STORAGE_BACKEND.
+
+    STORAGE_BACKEND     "memory" (default, nothing persists) or "sqlite"
+    STORAGE_PATH        SQLite database file (default: laundr.db)
+    STORAGE_POOL_SIZE   SQLite connections in the pool (default: 4)
+    STORAGE_ID_BLOCK    IDs a process reserves per sequence write (default: 32)
+    STORAGE_LEDGER_PATH Directory of transaction ledger segments (default: unset)
+
+Transactions go to a binary ledger (app.storage.ledger). On the memory
+backend it lives in anonymous memory unless STORAGE_LEDGER_PATH is set; on
+the SQLite backend it is used only when that is set, since a ledger
+directory cannot be shared between processes.
+
+Only the SQLite backend may be shared by several worker processes, e.g.
+`uvicorn --workers N`: every worker opens the same file.
+"""
+import itertools
+import os
+from typing import Dict, Iterator, Optional
+
+from app.schemas.analytics import ReportJobRecord
+from app.schemas.bookings import BookingResponse, CalendarEvent
+from app.schemas.directory import FreelancerProfile
+from app.schemas.profile import Profile
+from app.schemas.settings import Settings
+from app.storage.ledger import LedgerEventLog
+from app.storage.memory import MemoryRepository
+from app.storage.sqlite import SQLiteDatabase, SQLiteEventLog, SQLiteRepository
+
+# table -> (models stored in it, attributes indexed for lookups)
+TABLES = {
+    "profiles": ((Profile, FreelancerProfile), ("laundr_id",)),
+    "settings": ((Settings,), ()),
+    "bookings": ((BookingResponse,), ("client_id", "freelancer_id", "start_time")),
+    "calendar_events": ((CalendarEvent,), ("freelancer_id", "start_time")),
+    "report_jobs": ((ReportJobRecord,), ()),
+}
+
+
+class Storage:
+    """Every repository of one backend."""
+
+    def __init__(
+        self,
+        backend: str = "memory",
+        path: str = "laundr.db",
+        pool_size: int = 4,
+        id_block_size: int = 32,
+        ledger_path: Optional[str] = None,
+    ):
+        self.backend = backend
+        self.db: Optional[SQLiteDatabase] = None
+        self._counters: Dict[str, Iterator[int]] = {}
+        if backend == "memory":
+            for table, (_, indexed) in TABLES.items():
+                setattr(self, table, MemoryRepository(indexed))
+            self.transactions = LedgerEventLog(ledger_path)
+        elif backend == "sqlite":
+            self.db = SQLiteDatabase(path, pool_size, id_block_size=id_block_size)
+            for table, (models, indexed) in TABLES.items():
+                setattr(self, table, SQLiteRepository(self.db, table, models, indexed))
+            if ledger_path is None:
+                self.transactions = SQLiteEventLog(self.db, "transactions")
+            else:
+                self.transactions = LedgerEventLog(ledger_path)
+        else:
+            raise ValueError(f"Unknown storage backend: {backend!r}")
+
+    def next_id(self, table: str) -> int:
+        """Allocates a new integer key for `table`, unique across worker processes."""
+        if table not in TABLES:
+            raise ValueError(f"Unknown table: {table!r}")
+        if self.db is not None:
+            return self.db.next_id(table)
+        counter = self._counters.get(table)
+        if counter is None:
+            counter = self._counters[table] = itertools.count(max(getattr(self, table), default=0) + 1)
+        return next(counter)
+
+    @property
+    def shared(self) -> bool:
+        """Whether other processes can open the same data: every table is in the SQLite file."""
+        return self.db is not None and not isinstance(self.transactions, LedgerEventLog)
+
+    def sync(self) -> None:
+        """Catches up with writes other worker processes made."""
+        self.replay(self.pending())
+
+    def pending(self) -> tuple:
+        """
+        Reads the writes `sync` would catch up with, without applying them:
+        blocking queries, but nothing that touches the in-process indexes,
+        so it can run off the event loop.
+        """
+        return (None if self.db is None else self.db.pending(), self.transactions.pending())
+
+    def replay(self, pending: tuple) -> None:
+        """Applies the writes `pending` read to the repositories and their indexes."""
+        changes, entries = pending
+        if self.db is not None:
+            self.db.replay(changes)
+        self.transactions.replay(entries)
+
+    def close(self) -> None:
+        if isinstance(self.transactions, LedgerEventLog):
+            self.transactions.close()
+        if self.db is not None:
+            self.db.close()
+
+
+storage = Storage(
+    os.getenv("STORAGE_BACKEND", "memory"),
+    os.getenv("STORAGE_PATH", "laundr.db"),
+    int(os.getenv("STORAGE_POOL_SIZE", "4")),
+    int(os.getenv("STORAGE_ID_BLOCK", "32")),
+    os.getenv("STORAGE_LEDGER_PATH") or None,
+)
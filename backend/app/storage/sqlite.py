@@ -0,0 +1,558 @@
+import json
+import queue
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Mapping,
+                    Optional, Sequence, Set, Type)
+
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from app.storage.base import EventLog, Repository, column_value, parties
+
+# Changes older than this many writes are pruned from the change feed; a
+# process that falls further behind reloads everything instead.
+CHANGE_RETENTION = 100_000
+_PRUNE_EVERY = 1_000
+# Bound variables per statement, under SQLite's historical default of 999.
+_MAX_PARAMS = 500
+# Rows per query when streaming a result.
+_PAGE_SIZE = 1_000
+_MAX_SEQ = 2 ** 63 - 1
+
+
+class SQLiteDatabase:
+    """
+    Pool of connections to one SQLite database in WAL mode.
+
+    WAL lets readers proceed while a writer commits, so the pool hands out
+    up to `pool_size` connections shared across threads. Every statement
+    is a fixed SQL string, so each connection's statement cache keeps them
+    prepared after first use.
+
+    Several processes (e.g. uvicorn workers) can share one database file.
+    Repository writes are recorded in a change feed tagged with the writing
+    process, and `sync()` replays the other processes' changes to the
+    subscribed repositories so their in-process state catches up. IDs come
+    from a sequence table, handed out in blocks so most allocations don't
+    need a write transaction.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, timeout: float = 5.0, id_block_size: int = 32):
+        self.path = path
+        # Every connection to ":memory:" would open its own empty database.
+        self.pool_size = 1 if path == ":memory:" else pool_size
+        self.timeout = timeout
+        self.id_block_size = id_block_size
+        self.origin = uuid.uuid4().hex
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._id_lock = threading.Lock()
+        self._listeners: Dict[str, List[Callable[[Any], None]]] = {}
+        # sequence name -> [next id, last id] of the block this process holds
+        self._id_blocks: Dict[str, List[int]] = {}
+        self._writes = 0
+
+        with self.connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS changes ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, tbl TEXT NOT NULL, key, origin TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            # State loaded from here on is current, so only later changes matter.
+            self._last_change = connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def subscribe(self, table: str, callback: Callable[[Any], None]) -> None:
+        """Calls `callback(key)` for each change another process makes to `table` (None: the whole table)."""
+        self._listeners.setdefault(table, []).append(callback)
+
+    def record_changes(self, connection: sqlite3.Connection, table: str, keys: Iterable) -> None:
+        """Adds writes to the change feed; call inside the transaction making them."""
+        connection.executemany(
+            "INSERT INTO changes (tbl, key, origin) VALUES (?, ?, ?)",
+            ((table, key, self.origin) for key in keys),
+        )
+        self._writes += 1
+        if self._writes % _PRUNE_EVERY == 0:
+            connection.execute(
+                "DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (CHANGE_RETENTION,)
+            )
+
+    def sync(self) -> None:
+        """Replays changes made by other processes since the last sync."""
+        self.replay(self.pending())
+
+    def pending(self) -> Optional[tuple]:
+        """
+        Reads the changes `sync` would replay, without replaying them, so
+        the queries can run on another thread than the subscribers.
+        """
+        with self.connection() as connection:
+            oldest = connection.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            rows = connection.execute(
+                "SELECT seq, tbl, key, origin FROM changes WHERE seq > ? ORDER BY seq", (self._last_change,)
+            ).fetchall()
+        return (oldest, rows) if rows else None
+
+    def replay(self, pending: Optional[tuple]) -> None:
+        """Replays the changes `pending` read, except those a sync since replayed already."""
+        if pending is None:
+            return
+        oldest, rows = pending
+        with self._sync_lock:
+            last_change = self._last_change
+            if rows[-1][0] <= last_change:
+                return
+            if oldest is not None and oldest > last_change + 1:
+                # Part of what this process missed has been pruned.
+                changes = [(table, None) for table in self._listeners]
+            else:
+                changes = [(table, key) for seq, table, key, origin in rows
+                           if seq > last_change and origin != self.origin]
+            self._last_change = rows[-1][0]
+            for table, key in changes:
+                for callback in self._listeners.get(table, ()):
+                    callback(key)
+
+    def next_id(self, table: str) -> int:
+        """
+        Allocates an integer key for `table`, unique across every process.
+
+        The sequence starts after the table's largest existing key.
+        """
+        with self._id_lock:
+            block = self._id_blocks.get(table)
+            if block is None or block[0] > block[1]:
+                with self.transaction() as connection:
+                    connection.execute(
+                        f"INSERT OR IGNORE INTO sequences (name, value) SELECT ?, COALESCE(MAX(key), 0) FROM {table}",
+                        (table,),
+                    )
+                    (last,) = connection.execute(
+                        "UPDATE sequences SET value = value + ? WHERE name = ? RETURNING value",
+                        (self.id_block_size, table),
+                    ).fetchone()
+                block = self._id_blocks[table] = [last - self.id_block_size + 1, last]
+            block[0] += 1
+            return block[0] - 1
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrows a connection in autocommit mode."""
+        connection = self._acquire()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Borrows a connection inside a write transaction, committed on success."""
+        with self.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            while True:
+                try:
+                    self._pool.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.pool_size:
+                self._opened += 1
+                return self._connect()
+        try:
+            return self._pool.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No SQLite connection free after {self.timeout}s") from None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Durable across application crashes; only an OS crash can lose the
+        # last commits, which is the usual trade-off with WAL.
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+
+class SQLiteRepository(Repository):
+    """
+    Repository persisted to a SQLite table.
+
+    Each row holds the key, the model class, the model as JSON and one
+    indexed column per attribute in `indexed`. Models read or written
+    through the repository are kept in an identity map, so repeated reads
+    of a key return the same object without touching the database, just as
+    with the in-memory backend. Changes other processes make are evicted
+    from the identity map when the database syncs.
+    """
+
+    def __init__(
+        self,
+        db: SQLiteDatabase,
+        table: str,
+        models: Sequence[Type[BaseModel]],
+        indexed: tuple = (),
+    ):
+        super().__init__()
+        self.db = db
+        self.table = table
+        self.indexed = indexed
+        self._models = {model.__name__: model for model in models}
+        self._cache: Dict[Any, BaseModel] = {}
+        self._listeners: List[Callable[[Any], None]] = []
+        db.subscribe(table, self._on_change)
+
+        columns = "".join(f", {name}" for name in indexed)
+        with db.connection() as connection:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, key NOT NULL UNIQUE,"
+                f" kind TEXT NOT NULL, data TEXT NOT NULL{columns})"
+            )
+            for name in indexed:
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_{name} ON {table} ({name})")
+
+        placeholders = ", ?" * len(indexed)
+        updates = "".join(f", {name} = excluded.{name}" for name in indexed)
+        # Upserting keeps the row's seq, so a replaced model keeps its place
+        # in iteration order like a dict entry does.
+        self._upsert_sql = (
+            f"INSERT INTO {table} (key, kind, data{columns}) VALUES (?, ?, ?{placeholders})"
+            f" ON CONFLICT (key) DO UPDATE SET kind = excluded.kind, data = excluded.data{updates}"
+        )
+        self._select_sql = f"SELECT kind, data FROM {table} WHERE key = ?"
+        self._exists_sql = f"SELECT 1 FROM {table} WHERE key = ?"
+        self._delete_sql = f"DELETE FROM {table} WHERE key = ?"
+        self._keys_sql = f"SELECT key FROM {table} ORDER BY seq"
+        self._seq_sql = f"SELECT seq FROM {table} WHERE key = ?"
+        self._after_sql = f"SELECT key, kind, data FROM {table} WHERE seq > ? ORDER BY seq LIMIT ?"
+        self._rows_sql = f"SELECT key, kind, data FROM {table}"
+        self._count_sql = f"SELECT COUNT(*) FROM {table}"
+        self._clear_sql = f"DELETE FROM {table}"
+
+    def __getitem__(self, key):
+        model = self._cache.get(key)
+        if model is not None:
+            return model
+        with self.db.connection() as connection:
+            row = connection.execute(self._select_sql, (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self._load(key, *row)
+
+    def __setitem__(self, key, model) -> None:
+        with self.db.transaction() as connection:
+            connection.execute(self._upsert_sql, self._row(key, model))
+            self.db.record_changes(connection, self.table, (key,))
+        self._cache[key] = model
+        self._changed(key)
+
+    def __delitem__(self, key) -> None:
+        with self.db.transaction() as connection:
+            deleted = connection.execute(self._delete_sql, (key,)).rowcount
+            if deleted:
+                self.db.record_changes(connection, self.table, (key,))
+        self._cache.pop(key, None)
+        if not deleted:
+            raise KeyError(key)
+        self._changed(key)
+
+    def __iter__(self) -> Iterator:
+        with self.db.connection() as connection:
+            keys = [key for (key,) in connection.execute(self._keys_sql)]
+        return iter(keys)
+
+    def __len__(self) -> int:
+        with self.db.connection() as connection:
+            return connection.execute(self._count_sql).fetchone()[0]
+
+    def __contains__(self, key) -> bool:
+        if key in self._cache:
+            return True
+        with self.db.connection() as connection:
+            return connection.execute(self._exists_sql, (key,)).fetchone() is not None
+
+    def clear(self) -> None:
+        with self.db.transaction() as connection:
+            connection.execute(self._clear_sql)
+            self.db.record_changes(connection, self.table, (None,))
+        self._cache.clear()
+        self._changed(None)
+
+    def subscribe(self, callback: Callable[[Any], None]) -> None:
+        self._listeners.append(callback)
+
+    def values(self) -> List[BaseModel]:
+        return [model for _, model in self.items()]
+
+    def items(self) -> List[tuple]:
+        return self._query("")
+
+    def find(self, **criteria) -> List[BaseModel]:
+        return [model for _, model in self._filter(criteria, " AND ")]
+
+    def find_any(self, **criteria) -> List[BaseModel]:
+        return [model for _, model in self._filter(criteria, " OR ")]
+
+    def put_many(self, items: Mapping[Any, BaseModel]) -> None:
+        rows = [self._row(key, model) for key, model in items.items()]
+        with self.db.transaction() as connection:
+            connection.executemany(self._upsert_sql, rows)
+            self.db.record_changes(connection, self.table, items)
+        self._cache.update(items)
+        for key in items:
+            self._changed(key)
+
+    def items_after(self, key: Any = None, limit: Optional[int] = None) -> List[tuple]:
+        with self.db.connection() as connection:
+            seq = 0
+            if key is not None:
+                row = connection.execute(self._seq_sql, (key,)).fetchone()
+                if row is None:
+                    raise KeyError(key)
+                seq = row[0]
+            # A negative LIMIT is no limit.
+            rows = connection.execute(self._after_sql, (seq, -1 if limit is None else limit)).fetchall()
+        return [(key, self._load(key, kind, data)) for key, kind, data in rows]
+
+    def get_many(self, keys: Iterable[Any]) -> Dict[Any, BaseModel]:
+        found, missing = {}, []
+        for key in keys:
+            model = self._cache.get(key)
+            if model is None:
+                missing.append(key)
+            else:
+                found[key] = model
+        with self.db.connection() as connection:
+            for start in range(0, len(missing), _MAX_PARAMS):
+                chunk = missing[start:start + _MAX_PARAMS]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = connection.execute(f"{self._rows_sql} WHERE key IN ({placeholders})", chunk).fetchall()
+                for key, kind, data in rows:
+                    found[key] = self._load(key, kind, data)
+        return found
+
+    def _on_change(self, key) -> None:
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+        for callback in self._listeners:
+            callback(key)
+
+    def _filter(self, criteria: Dict[str, Any], joiner: str) -> List[tuple]:
+        self._check_criteria(criteria)
+        if not criteria:
+            return self.items()
+        where = joiner.join(f"{name} = ?" for name in criteria)
+        return self._query(f" WHERE {where}", [column_value(value) for value in criteria.values()])
+
+    def _query(self, where: str, params: Sequence = ()) -> List[tuple]:
+        with self.db.connection() as connection:
+            rows = connection.execute(f"{self._rows_sql}{where} ORDER BY seq", params).fetchall()
+        return [(key, self._load(key, kind, data)) for key, kind, data in rows]
+
+    def _load(self, key, kind: str, data: str) -> BaseModel:
+        model = self._cache.get(key)
+        if model is None:
+            model = self._cache[key] = self._models[kind].model_validate_json(data)
+        return model
+
+    def _row(self, key, model: BaseModel) -> tuple:
+        return (
+            key,
+            type(model).__name__,
+            model.model_dump_json(),
+            *(column_value(getattr(model, name)) for name in self.indexed),
+        )
+
+
+class SQLiteEventLog(EventLog):
+    """
+    Event log persisted to a SQLite table indexed by timestamp and action.
+    A second table, clustered by user, lists the events each party is in.
+
+    Listeners hear about this process's events as they are logged; `sync()`
+    reads the ones other processes logged since, by sequence number.
+    """
+
+    def __init__(self, db: SQLiteDatabase, table: str):
+        super().__init__()
+        self.db = db
+        self.table = table
+        # Highest seq passed to the listeners, and this process's own events
+        # above it, which they have already heard about.
+        self._seen = 0
+        self._own: Set[int] = set()
+        with db.transaction() as connection:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, action TEXT, timestamp REAL NOT NULL, data TEXT NOT NULL)"
+            )
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_timestamp ON {table} (timestamp)")
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_action ON {table} (action)")
+            indexed = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f"{table}_parties",)
+            ).fetchone()
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table}_parties ("
+                "party TEXT NOT NULL, seq INTEGER NOT NULL, PRIMARY KEY (party, seq)) WITHOUT ROWID"
+            )
+            if not indexed:
+                # Index the events logged before the table existed.
+                for seq, data in connection.execute(f"SELECT seq, data FROM {table}").fetchall():
+                    connection.executemany(
+                        f"INSERT OR IGNORE INTO {table}_parties (party, seq) VALUES (?, ?)",
+                        [(user_id, seq) for user_id in parties(json.loads(data))],
+                    )
+        self._insert_sql = f"INSERT INTO {table} (action, timestamp, data) VALUES (?, ?, ?)"
+        self._insert_party_sql = f"INSERT INTO {table}_parties (party, seq) VALUES (?, ?)"
+        self._rows_sql = f"SELECT data FROM {table}"
+        self._party_rows_sql = (
+            f"SELECT e.data FROM {table}_parties p JOIN {table} e ON e.seq = p.seq "
+            "WHERE p.party = ? AND e.timestamp >= ? AND e.timestamp < ? ORDER BY p.seq"
+        )
+        self._party_page_sql = (
+            f"SELECT p.seq, e.data FROM {table}_parties p JOIN {table} e ON e.seq = p.seq "
+            "WHERE p.party = ? AND p.seq > ? AND e.timestamp >= ? AND e.timestamp < ? ORDER BY p.seq LIMIT ?"
+        )
+        self._party_page_desc_sql = (
+            f"SELECT p.seq, e.data FROM {table}_parties p JOIN {table} e ON e.seq = p.seq "
+            "WHERE p.party = ? AND p.seq < ? AND e.timestamp >= ? AND e.timestamp < ? ORDER BY p.seq DESC LIMIT ?"
+        )
+        self._count_sql = f"SELECT COUNT(*) FROM {table}"
+        self._last_seq_sql = f"SELECT COALESCE(MAX(seq), 0) FROM {table}"
+        self._since_sql = f"SELECT seq, data FROM {table} WHERE seq > ? ORDER BY seq"
+        self._clear_sqls = (f"DELETE FROM {table}", f"DELETE FROM {table}_parties")
+
+    def listen(self, callback: Callable[[Optional[List[Dict[str, Any]]]], None]) -> None:
+        if not self._listeners:
+            with self.db.connection() as connection:
+                self._seen = connection.execute(self._last_seq_sql).fetchone()[0]
+        super().listen(callback)
+
+    def pending(self) -> Optional[List[tuple]]:
+        if not self._listeners:
+            return None
+        with self.db.connection() as connection:
+            rows = connection.execute(self._since_sql, (self._seen,)).fetchall()
+        # Decoded here too, off the listeners' thread; this process's own
+        # events are only told apart on replay.
+        return [(seq, self._load(data)) for seq, data in rows] or None
+
+    def replay(self, pending: Optional[List[tuple]]) -> None:
+        if pending is None:
+            return
+        seen = self._seen
+        if pending[-1][0] <= seen:
+            return
+        self._seen = pending[-1][0]
+        entries = [entry for seq, entry in pending if seq > seen and seq not in self._own]
+        self._own = {seq for seq in self._own if seq > self._seen}
+        if entries:
+            self._logged(entries)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self.extend((entry,))
+
+    def extend(self, entries: Iterable[Dict[str, Any]]) -> None:
+        entries = list(entries)
+        rows = [(self._row(entry), parties(entry)) for entry in entries]
+        seqs = []
+        with self.db.transaction() as connection:
+            for row, users in rows:
+                seq = connection.execute(self._insert_sql, row).lastrowid
+                seqs.append(seq)
+                if users:
+                    connection.executemany(self._insert_party_sql, [(user_id, seq) for user_id in users])
+        if self._listeners:
+            self._own.update(seqs)
+            self._logged(entries)
+
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        low = float("-inf") if start is None else column_value(start)
+        high = float("inf") if end is None else column_value(end)
+        return self._query(" WHERE timestamp >= ? AND timestamp < ?", (low, high))
+
+    def involving(
+        self, user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        low = float("-inf") if start is None else column_value(start)
+        high = float("inf") if end is None else column_value(end)
+        with self.db.connection() as connection:
+            rows = connection.execute(self._party_rows_sql, (user_id, low, high)).fetchall()
+        return [self._load(data) for (data,) in rows]
+
+    def iter_involving(
+        self, user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+        newest_first: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        low = float("-inf") if start is None else column_value(start)
+        high = float("inf") if end is None else column_value(end)
+        sql, after = (self._party_page_desc_sql, _MAX_SEQ) if newest_first else (self._party_page_sql, 0)
+        while True:
+            # Paged by seq, so no connection is held between pages.
+            with self.db.connection() as connection:
+                rows = connection.execute(sql, (user_id, after, low, high, _PAGE_SIZE)).fetchall()
+            for _, data in rows:
+                yield self._load(data)
+            if len(rows) < _PAGE_SIZE:
+                return
+            after = rows[-1][0]
+
+    def clear(self) -> None:
+        with self.db.transaction() as connection:
+            for sql in self._clear_sqls:
+                connection.execute(sql)
+        self._own.clear()
+        self._logged(None)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._query(""))
+
+    def __len__(self) -> int:
+        with self.db.connection() as connection:
+            return connection.execute(self._count_sql).fetchone()[0]
+
+    def _query(self, where: str, params: Sequence = ()) -> List[Dict[str, Any]]:
+        with self.db.connection() as connection:
+            rows = connection.execute(f"{self._rows_sql}{where} ORDER BY seq", params).fetchall()
+        return [self._load(data) for (data,) in rows]
+
+    @staticmethod
+    def _row(entry: Dict[str, Any]) -> tuple:
+        return entry.get("action"), column_value(entry["timestamp"]), to_json(entry)
+
+    @staticmethod
+    def _load(data: str) -> Dict[str, Any]:
+        entry = json.loads(data)
+        entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+        return entry
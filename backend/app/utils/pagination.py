@@ -0,0 +1,141 @@
+import base64
+import binascii
+import json
+from bisect import bisect_right
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Type
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+# Response header carrying the cursor of the next page, if there is one.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page(NamedTuple):
+    items: Any
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(kind: str, *key) -> str:
+    """
+    Opaque cursor for the page after `key`.
+
+    Cursors are keyset positions (the sort key of the last item returned),
+    not offsets, so rows inserted while a client pages never shift or
+    repeat the rows it has yet to see.
+    """
+    payload = json.dumps([kind, *key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str, *types) -> list:
+    """
+    Returns the key encoded in `cursor`, or raises a 400 if it is not a
+    `kind` cursor. Given `types`, the key must also have one value of each
+    type, in order: cursors come from clients, so a crafted one must not
+    get as far as the comparisons it is used in.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        payload = None
+    if not isinstance(payload, list) or not payload or payload[0] != kind:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    key = payload[1:]
+    if types and (len(key) != len(types) or not all(map(isinstance, key, types))):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def page_by_id(
+    kind: str, ids: List, cursor: Optional[str], limit: Optional[int], id_type: type = int
+) -> Tuple[List, Optional[str]]:
+    """Pages through `ids`, which must be sorted ascending and of `id_type`."""
+    if cursor:
+        (last,) = decode_cursor(cursor, kind, id_type)
+        ids = ids[bisect_right(ids, last):]
+    if limit is None or len(ids) <= limit:
+        return ids, None
+    ids = ids[:limit]
+    return ids, encode_cursor(kind, ids[-1])
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Dict[str, str]]:
+    """
+    Resolves a comma-separated `fields=` projection against `model`.
+
+    Both field names and their aliases (e.g. "laundr_id" or "@laundrID") are
+    accepted. Returns field name -> JSON key, in the model's field order.
+    """
+    if not fields:
+        return None
+    names = {}
+    for name, info in model.model_fields.items():
+        names[name] = name
+        if info.alias:
+            names[info.alias] = name
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = sorted(field for field in requested if field not in names)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(unknown)}")
+    selected = {names[field] for field in requested}
+    return {
+        name: info.alias or name
+        for name, info in model.model_fields.items()
+        if name in selected
+    }
+
+
+def project(items: List[BaseModel], fields: Dict[str, str]) -> List[dict]:
+    """
+    Reduces models to dicts of the projected fields, keyed like the JSON output.
+
+    Reading the attributes directly is cheaper than a filtered model dump,
+    which still visits every field of every model. Fields a model does not
+    have (e.g. `rating` on a plain Profile) are left out of its dict.
+    """
+    getters: Dict[type, Callable[[BaseModel], dict]] = {}
+    rows = []
+    for item in items:
+        getter = getters.get(type(item))
+        if getter is None:
+            getter = getters[type(item)] = _row_getter(type(item), fields)
+        rows.append(getter(item))
+    return rows
+
+
+def _row_getter(model: Type[BaseModel], fields: Dict[str, str]) -> Callable[[BaseModel], dict]:
+    present = [name for name in fields if name in model.model_fields]
+    keys = tuple(fields[name] for name in present)
+    if not present:
+        return lambda item: {}
+    if len(present) == 1:
+        get_one = attrgetter(present[0])
+        return lambda item: {keys[0]: get_one(item)}
+    get = attrgetter(*present)
+    return lambda item: dict(zip(keys, get(item)))
+
+
+def paged_response(response: Response, page: Page, fields: Optional[Dict[str, str]] = None):
+    """
+    Returns `page.items` with the next cursor in a response header.
+
+    `page.items` is a list of models or a dict of such lists. Without a
+    projection it goes through the route's response model as usual; with
+    one it is projected and serialized directly, skipping the response
+    model's validation of fields that would only be dropped.
+    """
+    if fields is None:
+        if page.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+        return page.items
+    if isinstance(page.items, dict):
+        content = {key: project(value, fields) for key, value in page.items.items()}
+    else:
+        content = project(page.items, fields)
+    projected = Response(to_json(content), media_type="application/json")
+    if page.next_cursor:
+        projected.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return projected
@@ -0,0 +1,95 @@
+"""
+First page of the activity feed, merged lazily vs built and sorted whole.
+
+"sort all" is how the feed was built before the merge: an ActivityItem
+for every booking and transaction of the user, then one sort. "page" is
+the first 20 items; "deep page" the 20 after a cursor half-way back.
+
+    python -m benchmarks.bench_activity [user transactions...]   # default: 1000 10000 100000
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+from itertools import repeat
+
+from benchmarks.common import measure, parse_sizes, report
+
+USER = "@target"
+PAGE = 20
+
+
+def sort_all(user_id, transactions, bookings):
+    from app.schemas.analytics import ActivityItem
+    from app.services import analytics
+
+    activities = [ActivityItem(**analytics._booking_activity(booking, user_id))
+                  for booking in bookings.find_any(client_id=user_id, freelancer_id=user_id)]
+    activities.extend(ActivityItem(**activity) for activity in map(analytics._transaction_activity,
+                                                                   transactions.involving(user_id), repeat(user_id))
+                      if activity is not None)
+    activities.sort(key=lambda x: x.timestamp, reverse=True)
+    return activities[:PAGE]
+
+
+def main():
+    from app.schemas.bookings import BookingResponse, BookingStatus
+    from app.services import analytics
+    from app.services.astra import transactions_db
+    from app.services.bookings import bookings_db
+    from app.utils.pagination import encode_cursor
+
+    start = datetime(2023, 1, 1)
+    actions = [("send_load", "sender_id", "recipient_id"), ("request_load", "requester_id", "sender_id"),
+               ("swap_funds", "source_id", "destination_id")]
+    rows = []
+    for size in parse_sizes([1_000, 10_000, 100_000]):
+        rng = random.Random(5)
+        transactions_db.clear()
+        bookings_db.clear()
+        span = timedelta(days=3 * 365)
+        entries = []
+        for i in range(size):
+            action, mine, theirs = actions[i % 3]
+            entries.append({
+                "action": action,
+                "details": {"transaction_id": f"tx{i}", mine: USER, theirs: f"@user{i}",
+                            "amount": rng.randrange(500, 50_000) / 100},
+                "timestamp": start + span * i / size,
+                "status": "completed",
+            })
+        transactions_db.extend(entries)
+        bookings = {}
+        for i in range(size // 10):
+            begin = start + span * rng.random()
+            bookings[f"b{i}"] = BookingResponse.model_construct(
+                id=f"b{i}", client_id=f"@client{i}", freelancer_id=USER, start_time=begin,
+                end_time=begin + timedelta(hours=1), service="Cleaning", price=float(rng.randrange(20, 500)),
+                status=BookingStatus.CONFIRMED,
+            )
+        bookings_db.put_many(bookings)
+
+        def page(before=None):
+            return asyncio.run(analytics.get_activity_feed(USER, PAGE, before))
+
+        middle = entries[size // 2]
+        cursor = encode_cursor("activity", analytics._activity_time(
+            analytics._transaction_activity(middle, USER)), middle["details"]["transaction_id"])
+        assert [item["id"] for item in page().items] == [item.id for item in sort_all(USER, transactions_db, bookings_db)]
+        rows.append([
+            size,
+            measure(page, repeat=50)["p50"],
+            measure(lambda: page(cursor), repeat=50)["p50"],
+            measure(lambda: sort_all(USER, transactions_db, bookings_db), repeat=5)["p50"],
+        ])
+
+    transactions_db.clear()
+    bookings_db.clear()
+    report(
+        f"Activity feed, {PAGE} items, p50 in ms",
+        rows,
+        ["user transactions", "page", "deep page", "sort all"],
+    )
+
+
+if __name__ == "__main__":
+    main()
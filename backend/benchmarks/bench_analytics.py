@@ -0,0 +1,104 @@
+"""
+Analytics latency for one user as the platform's volume grows.
+
+The measured user always has the same history (100 transactions and 20
+bookings); the rest of the platform grows around them. With the per-user
+indexes each call reads only that history, so latency should stay flat.
+
+    python -m benchmarks.bench_analytics [transactions...]   # default: 10000 100000 1000000
+
+Bookings are a tenth of the transactions.
+"""
+import asyncio
+import random
+import uuid
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import measure, parse_sizes, report
+
+USER = "@target"
+HISTORY = 100
+BOOKINGS = 20
+CHUNK = 100_000
+
+
+def transactions(count: int, start: datetime, rng: random.Random):
+    users = max(count // 100, 10)
+    step = timedelta(days=365) / count
+    mine = set(rng.sample(range(count), HISTORY))
+    for i in range(count):
+        sender, recipient = f"@user{rng.randrange(users)}", f"@user{rng.randrange(users)}"
+        if i in mine:
+            sender, recipient = (USER, recipient) if i % 2 else (sender, USER)
+        yield {
+            "action": "send_load",
+            "details": {
+                "transaction_id": f"rt_{uuid.UUID(int=rng.getrandbits(128), version=4)}",
+                "sender_id": sender,
+                "recipient_id": recipient,
+                "amount": rng.randrange(500, 50_000) / 100,
+                "fee": 1.5,
+            },
+            "timestamp": start + step * i,
+            "status": "completed",
+        }
+
+
+def bookings(count: int, start: datetime, rng: random.Random) -> dict:
+    from app.schemas.bookings import BookingResponse, BookingStatus
+
+    users = max(count // 10, 10)
+    mine = set(rng.sample(range(count), BOOKINGS))
+    made = {}
+    for i in range(count):
+        client, freelancer = f"@user{rng.randrange(users)}", f"@user{rng.randrange(users)}"
+        if i in mine:
+            freelancer = USER
+        begin = start + timedelta(minutes=rng.randrange(525_600))
+        made[f"b{i}"] = BookingResponse.model_construct(
+            id=f"b{i}", client_id=client, freelancer_id=freelancer, start_time=begin,
+            end_time=begin + timedelta(hours=1), service=rng.choice(["Cleaning", "Tutoring"]),
+            price=float(rng.randrange(20, 500)), status=BookingStatus.CONFIRMED,
+        )
+    return made
+
+
+def main():
+    from app.services import analytics
+    from app.services.astra import transactions_db
+    from app.services.bookings import bookings_db
+
+    start = datetime(2025, 1, 1)
+    calls = {
+        "activity feed": lambda: analytics.get_activity_feed(USER),
+        "projections": lambda: analytics.get_revenue_projections(USER),
+        "income trend": lambda: analytics.get_income_trend(USER, date(2025, 3, 1), date(2025, 3, 31)),
+        "revenue report": lambda: analytics.get_revenue_report(USER, "service"),
+        "csv export": lambda: analytics.generate_financial_report_csv(USER),
+    }
+    rows = []
+    for size in parse_sizes([10_000, 100_000, 1_000_000]):
+        rng = random.Random(5)
+        transactions_db.clear()
+        bookings_db.clear()
+        batch = []
+        for entry in transactions(size, start, rng):
+            batch.append(entry)
+            if len(batch) == CHUNK:
+                transactions_db.extend(batch)
+                batch = []
+        transactions_db.extend(batch)
+        bookings_db.put_many(bookings(size // 10, start, rng))
+
+        loop = asyncio.new_event_loop()
+        timings = [measure(lambda: loop.run_until_complete(call()), repeat=50)["p50"] for call in calls.values()]
+        loop.close()
+        rows.append([size, size // 10, *timings])
+
+    transactions_db.clear()
+    bookings_db.clear()
+    report("Analytics for one user, p50 in ms", rows, ["transactions", "bookings", *calls])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Routine creation throughput with and without the micro-batcher.
+
+Concurrent callers create routines for a fixed time against the Astra stub
+running under uvicorn with injected latency, first one call per routine,
+then coalesced by RoutineBatcher into /routines/batch calls.
+
+    python -m benchmarks.bench_astra_batching [callers...]   # default: 16 64
+"""
+import asyncio
+import time
+
+from benchmarks.bench_astra_client import astra_stub_server
+from benchmarks.common import parse_sizes, report
+
+ASTRA_LATENCY = 0.02
+DURATION = 5.0
+BATCH_SIZE = 50
+BATCH_WAIT = 0.005
+
+
+async def _run(create, callers: int) -> list:
+    from app.schemas.loads import AstraRoutineCreate
+    from app.services.astra_client import AstraError
+
+    routine = AstraRoutineCreate(type="send", amount=10.0, source_id="@a", destination_id="@b")
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + DURATION
+
+    async def caller():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                await create(routine)
+            except AstraError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(caller() for _ in range(callers)))
+    latencies.sort()
+    return [
+        len(latencies) / DURATION,
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.99)] * 1000,
+        errors,
+    ]
+
+
+async def _measure(base_url: str, callers: int) -> list:
+    from app.schemas.loads import AstraRoutine
+    from app.services import astra
+    from app.services.astra import RoutineBatcher
+    from app.services.astra_client import AstraClient
+
+    astra.astra_client = AstraClient(base_url, max_connections=callers)
+
+    async def direct(routine):
+        return AstraRoutine(**await astra.astra_client.post("/routines", routine.model_dump()))
+
+    batcher = RoutineBatcher(astra._create_routines, BATCH_SIZE, BATCH_WAIT)
+    row = [callers] + await _run(direct, callers) + await _run(batcher.submit, callers)
+    stats = batcher.stats()
+    row += [stats["fill_ratio"], stats["mean_wait_ms"]]
+    await astra.astra_client.aclose()
+    return row
+
+
+def main():
+    with astra_stub_server(ASTRA_LATENCY) as base_url:
+        rows = [asyncio.run(_measure(base_url, callers)) for callers in parse_sizes([16, 64])]
+
+    report(
+        f"Routines created per second, {ASTRA_LATENCY * 1000:.0f}ms stub latency, "
+        f"batches of up to {BATCH_SIZE} or {BATCH_WAIT * 1000:g}ms (latencies in ms)",
+        rows,
+        ["callers", "direct/s", "direct p50", "direct p99", "errors", "batched/s", "batched p50", "batched p99",
+         "errors", "fill ratio", "added wait"],
+    )
+
+
+if __name__ == "__main__":
+    main()
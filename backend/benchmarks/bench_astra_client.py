@@ -0,0 +1,97 @@
+"""
+Astra call latency through the pooled client against the local stub.
+
+Compares a fresh connection per call (what a client created per request
+pays) with the shared keep-alive pool, sequentially and with concurrent
+callers. Over plain HTTP on loopback this only shows the TCP handshake;
+against the real API each fresh connection also pays for TLS.
+
+    python -m benchmarks.bench_astra_client [concurrency...]   # default: 1 16 64
+"""
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import parse_sizes, report
+from benchmarks.load_workers import BACKEND_DIR, _free_port
+
+CALLS = 2_000
+PAYLOAD = {"type": "send", "amount": 10.0, "source_id": "@a", "destination_id": "@b"}
+
+
+async def _run(post, concurrency: int) -> list:
+    latencies = []
+    per_caller = CALLS // concurrency
+
+    async def caller():
+        for _ in range(per_caller):
+            start = time.perf_counter()
+            await post()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return sorted(latencies)
+
+
+async def _measure(base_url: str, concurrency: int) -> list:
+    import httpx
+
+    from app.services.astra_client import AstraClient
+
+    async def fresh():
+        async with httpx.AsyncClient(base_url=base_url) as http:
+            (await http.post("/routines", json=PAYLOAD)).raise_for_status()
+
+    pooled_client = AstraClient(base_url)
+
+    async def pooled():
+        await pooled_client.post("/routines", PAYLOAD)
+
+    row = [concurrency]
+    for post in (fresh, pooled):
+        latencies = await _run(post, concurrency)
+        row += [latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000]
+    await pooled_client.aclose()
+    return row
+
+
+@contextlib.contextmanager
+def astra_stub_server(latency: float = 0.0):
+    """Runs the Astra stub under uvicorn and yields its base URL."""
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.services.astra_stub:app", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env={**os.environ, "PYTHONPATH": BACKEND_DIR, "ASTRA_STUB_LATENCY": str(latency)},
+    )
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    with astra_stub_server() as base_url:
+        rows = [asyncio.run(_measure(base_url, c)) for c in parse_sizes([1, 16, 64])]
+
+    report(
+        f"Astra stub call latency over {CALLS} calls (ms)",
+        rows,
+        ["callers", "fresh p50", "fresh p99", "pooled p50", "pooled p99"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+/send-load latency with synchronous audit logging vs the audit outbox.
+
+Each send-load writes several audit records (the transfer plus the fraud
+and velocity agents' messages). The synchronous variants write them on the
+request path: `print` as the handlers used to (stdout sent to a file), and
+a durable file append with an fsync per record. The outbox queues them for
+its writer thread, which batches writes and fsyncs once a second.
+
+    python -m benchmarks.bench_audit [requests...]   # default: 2000
+"""
+import contextlib
+import os
+import tempfile
+
+from benchmarks.common import make_profiles, measure, parse_sizes, report
+
+
+class PrintAudit:
+    def submit(self, record):
+        print(f"AUDIT: {record.get('action')} - {record.get('details', record.get('message'))}")
+
+    def close(self):
+        pass
+
+
+class FsyncAudit:
+    def __init__(self, path):
+        from pydantic_core import to_json
+
+        self._to_json = to_json
+        self._file = open(path, "ab")
+
+    def submit(self, record):
+        self._file.write(self._to_json(record) + b"\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def main():
+    from fastapi.testclient import TestClient
+
+    from app import crud
+    from app.main import app
+    from app.services import audit
+
+    crud.db_profiles.clear()
+    crud.db_profiles.put_many({profile.user_id: profile for profile in make_profiles(1_000, freelancer_ratio=0.0)})
+    payload = {"sender_id": crud.db_profiles[1].laundr_id, "recipient_id": crud.db_profiles[2].laundr_id, "amount": 10.0}
+    client = TestClient(app)
+    directory = tempfile.mkdtemp()
+
+    variants = {
+        "print": lambda: PrintAudit(),
+        "fsync per record": lambda: FsyncAudit(os.path.join(directory, "sync.jsonl")),
+        "outbox": lambda: audit.AuditOutbox(os.path.join(directory, "outbox.jsonl")),
+    }
+    rows = []
+    for requests in parse_sizes([2_000]):
+        for name, make in variants.items():
+            sink = audit.audit_outbox = make()
+            # Stdout goes to a file, as it would under a process manager.
+            with open(os.path.join(directory, "stdout.log"), "w") as stdout, contextlib.redirect_stdout(stdout):
+                timings = measure(lambda: client.post("/api/v1/loads/send-load", json=payload), repeat=requests)
+            sink.close()
+            rows.append([requests, name, timings["p50"], timings["p99"], timings["mean"]])
+
+    report("send-load latency by audit sink (ms)", rows, ["requests", "audit", "p50", "p99", "mean"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Autocomplete and typo-tolerant search: a linear scan over every profile vs.
+the burst-trie PrefixIndex and the trigram-backed FuzzyIndex.
+
+    python -m benchmarks.bench_autocomplete [sizes...]   # default: 100000 1000000
+"""
+import random
+
+from benchmarks.common import (SKILLS, make_profiles, measure, parse_sizes,
+                               report)
+
+
+def main():
+    from app.indexes.autocomplete import PrefixIndex
+    from app.indexes.fuzzy import FuzzyIndex, bounded_levenshtein, fuzzy_terms
+
+    rng = random.Random(7)
+    rows = []
+    for size in parse_sizes([100_000, 1_000_000]):
+        profiles = make_profiles(size)
+        prefixes, fuzzy = PrefixIndex(), FuzzyIndex()
+        for profile in profiles:
+            prefixes.add(profile.user_id, profile)
+            fuzzy.add(profile.user_id, profile)
+        terms = [fuzzy_terms(profile) for profile in profiles]
+
+        samples = rng.sample(profiles, 50)
+        prefix_queries = [p.laundr_id[:rng.randint(3, 8)].lower() for p in samples]
+        # One transposed pair per query, i.e. two edits away from the original
+        typo_queries = []
+        for profile in samples:
+            word = rng.choice([profile.laundr_id.lower()] + [s.lower() for s in SKILLS])
+            i = rng.randrange(1, len(word) - 1)
+            typo_queries.append(word[:i] + word[i + 1] + word[i] + word[i + 2:])
+
+        def scan_prefix(prefix):
+            return sorted(t for p in profiles for t in (p.laundr_id.lower(),) if t.startswith(prefix))[:10]
+
+        def scan_fuzzy(term):
+            return {
+                p.user_id for p, words in zip(profiles, terms)
+                if any(bounded_levenshtein(term, w, 2) is not None for w in words)
+            }
+
+        queries = iter(prefix_queries * 100)
+        scan = measure(lambda: scan_prefix(next(queries)), repeat=5)
+        indexed = measure(lambda: prefixes.complete(next(queries), 10), repeat=200)
+        rows.append([size, "autocomplete", scan["p50"], indexed["p50"], indexed["p99"]])
+
+        queries = iter(typo_queries * 100)
+        scan = measure(lambda: scan_fuzzy(next(queries)), repeat=3)
+        indexed = measure(lambda: fuzzy.search(next(queries), 2), repeat=200)
+        rows.append([size, "fuzzy k=2", scan["p50"], indexed["p50"], indexed["p99"]])
+
+    report("autocomplete / fuzzy latency (ms)", rows, ["profiles", "query", "scan p50", "index p50", "index p99"])
+
+
+if __name__ == "__main__":
+    main()
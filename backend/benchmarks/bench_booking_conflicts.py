@@ -0,0 +1,94 @@
+"""
+Double-booking checks for one freelancer, from the interval index vs scanning.
+
+"scan" reads every booking and calendar event of the freelancer through
+the per-user indexes and compares times, the straightforward check. The
+index is built by its first check ("first call"); "conflict" and "free"
+are checks of a taken and a free slot, "reserve" takes a free slot and
+gives it back. A tenth of the busy time is unavailable calendar events.
+
+    python -m benchmarks.bench_booking_conflicts [freelancer bookings...]   # default: 1000 10000
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import measure, parse_sizes, report
+
+FREELANCER = "@target"
+
+
+def scan(freelancer_id, bookings, events, start, end):
+    from app.indexes.schedules import ACTIVE_STATUSES
+
+    start, end = start.replace(tzinfo=timezone.utc), end.replace(tzinfo=timezone.utc)
+    found = [booking.id for booking in bookings.find(freelancer_id=freelancer_id)
+             if booking.status in ACTIVE_STATUSES
+             and booking.start_time.replace(tzinfo=timezone.utc) < end
+             and booking.end_time.replace(tzinfo=timezone.utc) > start]
+    found.extend(event.id for event in events.find(freelancer_id=freelancer_id)
+                 if not event.is_available
+                 and event.start_time.replace(tzinfo=timezone.utc) < end
+                 and event.end_time.replace(tzinfo=timezone.utc) > start)
+    return found
+
+
+def main():
+    from app.schemas.bookings import (BookingResponse, BookingStatus,
+                                      CalendarEvent)
+    from app.services.bookings import bookings_db, schedules
+    from app.services.calendar import calendar_db
+
+    statuses = [BookingStatus.CONFIRMED] * 3 + [BookingStatus.PENDING, BookingStatus.DECLINED]
+    start = datetime(2025, 1, 1, 8, 0)
+    hour = timedelta(hours=1)
+    rows = []
+    for size in parse_sizes([1_000, 10_000]):
+        rng = random.Random(11)
+        bookings_db.clear()
+        calendar_db.clear()
+        bookings, events = {}, {}
+        # One slot of one or two hours every three hours, back to back across the year
+        for i in range(size + size // 10):
+            begin = start + 3 * i * hour
+            end = begin + rng.choice([1, 2]) * hour
+            if i % 11 == 10:
+                events[f"e{i}"] = CalendarEvent.model_construct(
+                    id=f"e{i}", freelancer_id=FREELANCER, start_time=begin, end_time=end, is_available=False)
+            else:
+                bookings[f"b{i}"] = BookingResponse.model_construct(
+                    id=f"b{i}", client_id=f"@client{i}", freelancer_id=FREELANCER, start_time=begin,
+                    end_time=end, service="Cleaning", price=80.0, status=rng.choice(statuses))
+        bookings_db.put_many(bookings)
+        calendar_db.put_many(events)
+
+        middle = start + 3 * (size // 2) * hour
+        taken = (middle + hour / 2, middle + 2 * hour)
+        free = (middle + 2 * hour, middle + 3 * hour)
+        first = measure(lambda: schedules.conflicts(FREELANCER, *taken), repeat=1)["p50"]
+        assert sorted(o[1] for o in schedules.conflicts(FREELANCER, *taken)) == sorted(
+            scan(FREELANCER, bookings_db, calendar_db, *taken))
+
+        def reserve():
+            assert not schedules.reserve(FREELANCER, *free, "new")
+            schedules.release("new")
+
+        rows.append([
+            size,
+            first,
+            measure(lambda: schedules.conflicts(FREELANCER, *taken), repeat=1000)["p50"],
+            measure(lambda: schedules.conflicts(FREELANCER, *free), repeat=1000)["p50"],
+            measure(reserve, repeat=1000)["p50"],
+            measure(lambda: scan(FREELANCER, bookings_db, calendar_db, *taken), repeat=5)["p50"],
+        ])
+
+    bookings_db.clear()
+    calendar_db.clear()
+    report(
+        "Conflict checks for one freelancer, p50 in ms",
+        rows,
+        ["bookings", "first call", "conflict", "free", "reserve", "scan"],
+    )
+
+
+if __name__ == "__main__":
+    main()
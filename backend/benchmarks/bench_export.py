@@ -0,0 +1,128 @@
+"""
+Peak memory of the financial report export, buffered vs streamed.
+
+A user with N completed transfers is written to a ledger on disk
+(STORAGE_LEDGER_PATH), then each variant runs in a fresh process that
+opens it and reads the whole report:
+
+    buffered    every row written to one StringIO, sent when done (the export before streaming)
+    stream      encoded CSV chunks as the rows are read
+    gzip        the same chunks, gzip-compressed
+
+"peak" is the growth in maximum resident set size while exporting, "first
+byte" the time until the first chunk is ready.
+
+    python -m benchmarks.bench_export [transactions...]   # default: 100000 1000000
+"""
+import csv
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import parse_sizes, report
+
+USER = "@target"
+CHUNK = 100_000
+VARIANTS = ("buffered", "stream", "gzip")
+
+
+def write_ledger(path: str, count: int) -> None:
+    from app.storage.ledger import LedgerEventLog
+
+    ledger = LedgerEventLog(path)
+    start = datetime(2023, 1, 1)
+    step = timedelta(days=3 * 365) / count
+    for offset in range(0, count, CHUNK):
+        ledger.extend(
+            {
+                "action": "send_load",
+                "details": {
+                    "transaction_id": f"rt_{i:032x}",
+                    "sender_id": USER if i % 2 else f"@user{i % 5000}",
+                    "recipient_id": f"@user{i % 5000}" if i % 2 else USER,
+                    "amount": (i % 50_000) / 100 + 5,
+                    "fee": 1.5,
+                },
+                "timestamp": start + step * i,
+                "status": "completed",
+            }
+            for i in range(offset, min(count, offset + CHUNK))
+        )
+    ledger.close()
+
+
+def buffered(user_id: str):
+    from app.services import analytics
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(analytics.REPORT_HEADER)
+    writer.writerows(analytics.financial_report_rows(user_id))
+    yield output.getvalue().encode()
+
+
+def peak_rss_kib(reset: bool = False) -> int:
+    """The process's peak resident set size; `reset` starts it over from the current size (Linux)."""
+    if reset:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_variant(variant: str) -> None:
+    """Child process: exports the report and prints peak KiB, first byte and total seconds."""
+    from app.services import analytics
+
+    if variant == "buffered":
+        chunks = buffered(USER)
+    else:
+        chunks = analytics.stream_financial_report_csv(USER)
+        if variant == "gzip":
+            chunks = analytics.gzip_chunks(chunks)
+    before = peak_rss_kib(reset=True)
+    began = time.perf_counter()
+    first_byte = None
+    size = 0
+    for chunk in chunks:
+        if first_byte is None:
+            first_byte = time.perf_counter() - began
+        size += len(chunk)
+    total = time.perf_counter() - began
+    peak = peak_rss_kib() - before
+    print(peak, first_byte, total, size)
+
+
+def main():
+    if sys.argv[1:2] == ["--variant"]:
+        run_variant(sys.argv[2])
+        return
+    rows = []
+    for size in parse_sizes([100_000, 1_000_000]):
+        with tempfile.TemporaryDirectory() as path:
+            write_ledger(path, size)
+            for variant in VARIANTS:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_export", "--variant", variant],
+                    env={**os.environ, "STORAGE_BACKEND": "memory", "STORAGE_LEDGER_PATH": path},
+                    capture_output=True, text=True, check=True,
+                ).stdout.split()
+                peak, first_byte, total, length = output[-4:]
+                rows.append([size, variant, int(peak) / 1024, float(first_byte), float(total), int(length) / 2 ** 20])
+    report(
+        "Financial report export for one user",
+        rows,
+        ["transactions", "variant", "peak MiB", "first byte (s)", "total (s)", "output MiB"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Geospatial queries: brute-force haversine over every freelancer vs. the
+bucketed GeoIndex, for radius ("within N km") and k-nearest queries.
+
+    python -m benchmarks.bench_geo [sizes...]   # default: 100000 1000000
+"""
+import random
+
+import numpy as np
+
+from benchmarks.common import make_profiles, measure, parse_sizes, report
+
+
+def main():
+    from app.indexes.geo import GeoIndex, haversine_km
+
+    rng = random.Random(7)
+    rows = []
+    for size in parse_sizes([100_000, 1_000_000]):
+        index = GeoIndex()
+        profiles = make_profiles(size, freelancer_ratio=1.0)
+        for profile in profiles:
+            index.add(profile.user_id, profile)
+        ids = np.array([p.user_id for p in profiles])
+        lats = np.array([p.latitude for p in profiles])
+        lons = np.array([p.longitude for p in profiles])
+        points = [(rng.uniform(30, 45), rng.uniform(-120, -75)) for _ in range(50)]
+
+        def brute_within(lat, lon, radius):
+            return ids[haversine_km(lat, lon, lats, lons) <= radius]
+
+        def brute_nearest(lat, lon, k):
+            distances = haversine_km(lat, lon, lats, lons)
+            return ids[np.argpartition(distances, k)[:k]]
+
+        for radius in (10, 50):
+            queries = iter(points * 100)
+            brute = measure(lambda: brute_within(*next(queries), radius), repeat=20)
+            indexed = measure(lambda: index.within(*next(queries), radius), repeat=200)
+            rows.append([size, f"within {radius}km", brute["p50"], indexed["p50"], indexed["p99"]])
+        for k in (10, 100):
+            queries = iter(points * 100)
+            brute = measure(lambda: brute_nearest(*next(queries), k), repeat=20)
+            indexed = measure(lambda: index.nearest(*next(queries), k), repeat=200)
+            rows.append([size, f"nearest k={k}", brute["p50"], indexed["p50"], indexed["p99"]])
+
+    report("geospatial query latency (ms)", rows, ["freelancers", "query", "brute p50", "index p50", "index p99"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Cost of Idempotency-Key handling on the loads endpoints.
+
+The store-level columns time IdempotencyStore.run around a no-op with a
+warm LRU holding `size` outcomes: a request without a key, a first request
+with a new key (lookup, fingerprint and store) and a replay. The request
+columns time /send-load over the in-process TestClient without a key, with
+a fresh key and replayed.
+
+    python -m benchmarks.bench_idempotency [stored outcomes...]   # default: 1000 100000
+"""
+import asyncio
+import contextlib
+import itertools
+import os
+import time
+
+from benchmarks.common import make_profiles, measure, parse_sizes, report
+
+REPEAT = 2_000
+
+
+def _store_costs(size: int) -> list:
+    from app.schemas.loads import LoadCreate
+    from app.services.idempotency import IdempotencyStore
+
+    store = IdempotencyStore(maxsize=size)
+    load = LoadCreate(sender_id="@a", recipient_id="@b", amount=10.0)
+    keys = itertools.count()
+
+    async def compute():
+        return {"transaction_id": "rt"}
+
+    async def timed(key_for) -> float:
+        samples = []
+        for _ in range(REPEAT):
+            key = key_for()
+            start = time.perf_counter()
+            await store.run("send-load", key, load, compute)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        return samples[len(samples) // 2] * 1e6
+
+    async def main():
+        for _ in range(size):
+            await store.run("send-load", str(next(keys)), load, compute)
+        baseline = await timed(lambda: None)
+        first = await timed(lambda: str(next(keys)))
+        replay = await timed(lambda: "0")
+        return [baseline, first - baseline, replay - baseline]
+
+    return asyncio.run(main())
+
+
+def main():
+    from fastapi.testclient import TestClient
+
+    from app import crud
+    from app.main import app
+
+    crud.db_profiles.clear()
+    crud.db_profiles.put_many({profile.user_id: profile for profile in make_profiles(1_000, freelancer_ratio=0.0)})
+    payload = {"sender_id": crud.db_profiles[1].laundr_id, "recipient_id": crud.db_profiles[2].laundr_id, "amount": 10.0}
+    client = TestClient(app)
+    keys = itertools.count()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        plain = measure(lambda: client.post("/api/v1/loads/send-load", json=payload), repeat=300)
+        keyed = measure(lambda: client.post(
+            "/api/v1/loads/send-load", json=payload, headers={"Idempotency-Key": f"bench-{next(keys)}"}
+        ), repeat=300)
+        replayed = measure(lambda: client.post(
+            "/api/v1/loads/send-load", json=payload, headers={"Idempotency-Key": "bench-0"}
+        ), repeat=300)
+
+    rows = [
+        [size, *_store_costs(size), plain["p50"] * 1000, keyed["p50"] * 1000, replayed["p50"] * 1000]
+        for size in parse_sizes([1_000, 100_000])
+    ]
+    report(
+        "Idempotency overhead, p50 in microseconds (store: added to a no-op; request: /send-load)",
+        rows,
+        ["stored", "store no key", "store +new key", "store +replay", "request no key", "request new key",
+         "request replay"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Year-long income trends from the daily rollups vs recomputing them.
+
+"recompute" is how the trend was built before the rollups: a dict entry
+per day, then a pass over the user's transactions and bookings (already
+read through the per-user indexes). "first call" builds the user's
+rollup; later calls slice it.
+
+    python -m benchmarks.bench_income_trend [user transactions...]   # default: 1000 10000 100000
+"""
+import random
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from benchmarks.common import measure, parse_sizes, report
+
+USER = "@target"
+
+
+def recompute(user_id, start_date, end_date, transactions, bookings):
+    trend = {}
+    day = start_date
+    while day <= end_date:
+        trend[day] = {"income": 0.0, "expenses": 0.0}
+        day += timedelta(days=1)
+    for booking in bookings.find_any(client_id=user_id, freelancer_id=user_id):
+        booking_date = booking.start_time.date()
+        if start_date <= booking_date <= end_date and booking.status == "confirmed":
+            if booking.freelancer_id == user_id:
+                trend[booking_date]["income"] += booking.price
+            elif booking.client_id == user_id:
+                trend[booking_date]["expenses"] += booking.price
+    window = (datetime.combine(start_date, time.min), datetime.combine(end_date + timedelta(days=1), time.min))
+    for tx in transactions.involving(user_id, *window):
+        tx_date = tx["timestamp"].date()
+        details = tx["details"]
+        if details.get("sender_id") == user_id:
+            trend[tx_date]["expenses"] += details["amount"]
+        elif details.get("recipient_id") == user_id:
+            trend[tx_date]["income"] += details["amount"]
+    return [{"date": day, **data, "net_income": data["income"] - data["expenses"]} for day, data in trend.items()]
+
+
+def main():
+    from app.schemas.bookings import BookingResponse, BookingStatus
+    from app.services import analytics
+    from app.services.astra import transactions_db
+    from app.services.bookings import bookings_db
+
+    start = datetime(2023, 1, 1)
+    year = (date(2025, 1, 1), date(2025, 12, 31))
+    rows = []
+    for size in parse_sizes([1_000, 10_000, 100_000]):
+        rng = random.Random(3)
+        transactions_db.clear()
+        bookings_db.clear()
+        span = timedelta(days=3 * 365)
+        transactions_db.extend(
+            {
+                "action": "send_load",
+                "details": {
+                    "transaction_id": f"rt_{uuid.UUID(int=rng.getrandbits(128), version=4)}",
+                    "sender_id": USER if i % 2 else f"@user{i}",
+                    "recipient_id": f"@user{i}" if i % 2 else USER,
+                    "amount": rng.randrange(500, 50_000) / 100,
+                    "fee": 1.5,
+                },
+                "timestamp": start + span * i / size,
+                "status": "completed",
+            }
+            for i in range(size)
+        )
+        bookings = {}
+        for i in range(size // 10):
+            begin = start + span * rng.random()
+            bookings[f"b{i}"] = BookingResponse.model_construct(
+                id=f"b{i}", client_id=f"@client{i}", freelancer_id=USER, start_time=begin,
+                end_time=begin + timedelta(hours=1), service="Cleaning", price=float(rng.randrange(20, 500)),
+                status=BookingStatus.CONFIRMED,
+            )
+        bookings_db.put_many(bookings)
+
+        first = measure(lambda: analytics.income_rollups.trend(USER, *year), repeat=1)["p50"]
+        row = [size, first]
+        for granularity in ("day", "week", "month"):
+            row.append(measure(lambda: analytics.income_rollups.trend(USER, *year, granularity), repeat=200)["p50"])
+        row.append(measure(lambda: recompute(USER, *year, transactions_db, bookings_db), repeat=5)["p50"])
+        rows.append(row)
+
+    transactions_db.clear()
+    bookings_db.clear()
+    report(
+        "Year-long income trend for one user, p50 in ms",
+        rows,
+        ["user transactions", "first call", "day", "week", "month", "recompute (day)"],
+    )
+
+
+if __name__ == "__main__":
+    main()
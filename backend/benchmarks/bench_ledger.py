@@ -0,0 +1,154 @@
+"""
+Memory and scan speed of the transaction ledger vs the list of dicts it replaced.
+
+Transactions look like the ones /send-load logs and arrive in time order,
+spread over a year, between 100k users. Memory is the growth in resident
+set size while they are loaded. The scans:
+
+    day window      between() for one day: pruned by segment footers on the ledger
+    user income     one user's income over 30 days (ledger: vectorised over scan() of the columns needed)
+    full pass       total fees of every completed send_load
+    iterate         every transaction as a dict (ledger: decoded from its record)
+
+A list of 10M transactions needs more memory than most machines running
+this have, so the list is only measured up to LIST_LIMIT; its cost per
+transaction is flat, so larger sizes scale linearly.
+
+    python -m benchmarks.bench_ledger [transactions...]   # default: 1000000 10000000
+"""
+import gc
+import itertools
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks.common import parse_sizes, report
+
+LIST_LIMIT = 2_000_000
+USERS = 100_000
+CHUNK = 100_000
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def transactions(count: int, start: datetime):
+    rng = random.Random(11)
+    step = timedelta(days=365) / count
+    for i in range(count):
+        amount = rng.randrange(500, 50_000) / 100
+        yield {
+            "action": "send_load",
+            "details": {
+                "transaction_id": f"rt_{uuid.UUID(int=rng.getrandbits(128), version=4)}",
+                "sender_id": f"@user{rng.randrange(USERS)}",
+                "recipient_id": f"@user{rng.randrange(USERS)}",
+                "amount": amount,
+                "fee": round(max(1.50, 0.03 * amount + 0.74), 2),
+            },
+            "timestamp": start + step * i,
+            "status": "completed",
+        }
+
+
+def timed(fn) -> float:
+    began = time.perf_counter()
+    fn()
+    return time.perf_counter() - began
+
+
+def list_scans(entries: list, day: datetime, user: str) -> list:
+    day_end = day + timedelta(days=1)
+    month_end = day + timedelta(days=30)
+
+    def user_income():
+        return sum(
+            tx["details"]["amount"] for tx in entries
+            if day <= tx["timestamp"] < month_end and tx["details"]["recipient_id"] == user
+        )
+
+    def full_pass():
+        return sum(
+            tx["details"]["fee"] for tx in entries if tx["action"] == "send_load" and tx["status"] == "completed"
+        )
+
+    return [
+        timed(lambda: [tx for tx in entries if day <= tx["timestamp"] < day_end]),
+        timed(user_income),
+        timed(full_pass),
+        timed(lambda: sum(1 for _ in entries)),
+    ]
+
+
+def ledger_scans(ledger, day: datetime, user: str, iterate: bool) -> list:
+    def user_income():
+        records = ledger.scan(day, day + timedelta(days=30), fields=("amount", "destination"))
+        return records["amount"][records["destination"] == ledger.string_id(user)].sum() / 100
+
+    def full_pass():
+        records = ledger.scan(fields=("action", "status", "fee"))
+        wanted = (records["action"] == ledger.string_id("send_load")) & (
+            records["status"] == ledger.string_id("completed"))
+        return records["fee"][wanted].sum() / 100
+
+    return [
+        timed(lambda: ledger.between(day, day + timedelta(days=1))),
+        timed(user_income),
+        timed(full_pass),
+        timed(lambda: sum(1 for _ in ledger)) if iterate else "-",
+    ]
+
+
+def main():
+    from app.storage.ledger import LedgerEventLog
+
+    start = datetime(2025, 1, 1)
+    day = start + timedelta(days=200)
+    user = "@user42"
+    rows = []
+    # Let the allocator grow to hold a chunk of entries, so loading the
+    # ledger doesn't count the arenas its input passes through.
+    warm = list(itertools.islice(transactions(CHUNK, start), CHUNK))
+    del warm
+    for size in parse_sizes([1_000_000, 10_000_000]):
+        gc.collect()
+        before = rss_bytes()
+        ledger = LedgerEventLog()
+        batch = []
+        for entry in transactions(size, start):
+            batch.append(entry)
+            if len(batch) == CHUNK:
+                ledger.extend(batch)
+                batch = []
+        ledger.extend(batch)
+        del batch
+        gc.collect()
+        used = rss_bytes() - before
+        scans = ledger_scans(ledger, day, user, iterate=size <= LIST_LIMIT)
+        rows.append([size, "ledger", used / 2 ** 20, used / size, *scans])
+        ledger.close()
+        del ledger
+        gc.collect()
+
+        if size > LIST_LIMIT:
+            continue
+        before = rss_bytes()
+        entries = list(transactions(size, start))
+        used = rss_bytes() - before
+        rows.append([size, "list", used / 2 ** 20, used / size, *list_scans(entries, day, user)])
+        del entries
+        gc.collect()
+
+    report(
+        "Transaction store: memory (MiB, bytes per transaction) and scan time (s)",
+        rows,
+        ["transactions", "store", "MiB", "B/tx", "day window", "user income", "full pass", "iterate"],
+    )
+
+
+if __name__ == "__main__":
+    main()
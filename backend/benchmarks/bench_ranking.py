@@ -0,0 +1,49 @@
+"""
+Freelancer ranking: per-profile scoring + full sort vs. the columnar
+FreelancerFeatureStore (vectorized scores + partitioned top-k).
+
+    python -m benchmarks.bench_ranking [sizes...]   # default: 100000 250000 1000000
+"""
+import asyncio
+
+from benchmarks.common import make_profiles, measure, parse_sizes, report
+
+
+def python_sort(profiles, params):
+    """The pre-columnar implementation of crud.sort_freelancers (score mode)."""
+    freelancers = [p for p in profiles if p.__class__.__name__ == "FreelancerProfile"]
+
+    def calculate_score(freelancer):
+        return (
+            (freelancer.rating or 0) * params.rating_weight
+            + 0.5 * params.sentiment_weight
+            + 0.5 * params.activity_weight
+            + 0.5 * params.proximity_weight
+            + 0.5 * params.price_weight
+        )
+
+    return sorted(freelancers, key=calculate_score, reverse=True)
+
+
+def main():
+    from app import crud
+    from app.schemas.directory import SortParams
+
+    rows = []
+    for size in parse_sizes([100_000, 250_000, 1_000_000]):
+        crud.db_profiles.clear()
+        profiles = make_profiles(size, freelancer_ratio=1.0)
+        for profile in profiles:
+            crud.db_profiles[profile.user_id] = profile
+
+        for limit in (20, None):
+            params = SortParams(sort_by="score", rating_weight=1.5, limit=limit)
+            old = measure(lambda: python_sort(profiles, params)[:limit], repeat=3)
+            new = measure(lambda: asyncio.run(crud.sort_freelancers(params)), repeat=10)
+            rows.append([size, limit or "all", old["p50"], new["p50"], old["p50"] / new["p50"]])
+
+    report("sort_freelancers latency (ms)", rows, ["freelancers", "limit", "python", "columnar", "speedup"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Revenue projections and reports from the per-freelancer index vs scanning.
+
+"scan" is how both were computed before the index: every booking of the
+freelancer (read through the per-user index), its start time made aware
+and compared with now, its status compared with "confirmed". "first call"
+builds the freelancer's index; later calls read it. A tenth of the
+bookings are in the future.
+
+    python -m benchmarks.bench_revenue [freelancer bookings...]   # default: 1000 10000 100000
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import measure, parse_sizes, report
+
+FREELANCER = "@target"
+
+
+def scan(freelancer_id, bookings, breakdown_by=None):
+    now = datetime.now(timezone.utc)
+    revenue, count, totals = 0.0, 0, {}
+    for booking in bookings.find(freelancer_id=freelancer_id):
+        if booking.status != "confirmed":
+            continue
+        start = booking.start_time.replace(tzinfo=timezone.utc)
+        if breakdown_by is None and start > now:
+            revenue += booking.price
+            count += 1
+        elif breakdown_by is not None and start < now:
+            category = booking.service if breakdown_by == "service" else booking.client_id
+            data = totals.setdefault(category, [0.0, 0])
+            data[0] += booking.price
+            data[1] += 1
+    return totals if breakdown_by else (revenue, count)
+
+
+def main():
+    from app.schemas.bookings import BookingResponse, BookingStatus
+    from app.services import analytics
+    from app.services.bookings import bookings_db
+
+    services = ["Cleaning", "Consulting", "Tutoring", "Photography", "Catering"]
+    statuses = [BookingStatus.CONFIRMED] * 3 + [BookingStatus.DECLINED, BookingStatus.PENDING]
+    now = datetime.now()
+    rows = []
+    for size in parse_sizes([1_000, 10_000, 100_000]):
+        rng = random.Random(9)
+        bookings_db.clear()
+        bookings = {}
+        for i in range(size):
+            begin = now + timedelta(days=rng.uniform(-3 * 365, 365 / 3))
+            bookings[f"b{i}"] = BookingResponse.model_construct(
+                id=f"b{i}", client_id=f"@client{rng.randrange(200)}", freelancer_id=FREELANCER, start_time=begin,
+                end_time=begin + timedelta(hours=1), service=rng.choice(services),
+                price=float(rng.randrange(20, 500)), status=rng.choice(statuses),
+            )
+        bookings_db.put_many(bookings)
+
+        def projections():
+            return asyncio.run(analytics.get_revenue_projections(FREELANCER))
+
+        def by_client():
+            return asyncio.run(analytics.get_revenue_report(FREELANCER, "client"))
+
+        first = measure(projections, repeat=1)["p50"]
+        rows.append([
+            size,
+            first,
+            measure(projections, repeat=200)["p50"],
+            measure(by_client, repeat=50)["p50"],
+            measure(lambda: scan(FREELANCER, bookings_db), repeat=5)["p50"],
+            measure(lambda: scan(FREELANCER, bookings_db, "client"), repeat=5)["p50"],
+        ])
+
+    bookings_db.clear()
+    report(
+        "Revenue for one freelancer, p50 in ms",
+        rows,
+        ["bookings", "first call", "projection", "by client", "scan projection", "scan by client"],
+    )
+
+
+if __name__ == "__main__":
+    main()
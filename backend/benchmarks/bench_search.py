@@ -0,0 +1,47 @@
+"""
+Directory search: linear substring scan vs. the trigram SearchIndex.
+
+    python -m benchmarks.bench_search [sizes...]   # default: 10000 100000 1000000
+"""
+import asyncio
+
+from benchmarks.common import make_profiles, measure, parse_sizes, report
+
+TERMS = ["python", "photographer", "user123", "dog walk", "xyz_nomatch"]
+
+
+def linear_search(profiles, term):
+    """The pre-index implementation of crud.search_profiles."""
+    matches = []
+    for profile in profiles:
+        if (
+            term in profile.laundr_id.lower()
+            or (profile.headline and term in profile.headline.lower())
+            or any(term in skill.lower() for skill in profile.skill_tags)
+        ):
+            matches.append(profile.user_id)
+    return matches
+
+
+def main():
+    from app import crud
+    from app.schemas.directory import SearchQuery
+
+    rows = []
+    for size in parse_sizes([10_000, 100_000, 1_000_000]):
+        crud.db_profiles.clear()
+        profiles = make_profiles(size)
+        for profile in profiles:
+            crud.db_profiles[profile.user_id] = profile
+
+        for term in TERMS:
+            assert linear_search(profiles, term) == crud.search_index.search(term), term
+            old = measure(lambda: linear_search(profiles, term), repeat=5)
+            new = measure(lambda: asyncio.run(crud.search_profiles(SearchQuery(term=term))), repeat=20)
+            rows.append([size, term, old["p50"], new["p50"], old["p50"] / new["p50"]])
+
+    report("search_profiles latency (ms)", rows, ["profiles", "term", "linear", "indexed", "speedup"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Payout throughput: one /send-load request per transfer vs /send-batch.
+
+Astra is the in-process stub with a fixed latency, so the sequential path
+pays it once per transfer while the batch overlaps up to
+SEND_BATCH_CONCURRENCY routine creations.
+
+    python -m benchmarks.bench_send_batch [batch sizes...]   # default: 100 1000 5000
+"""
+import contextlib
+import os
+import time
+
+from benchmarks.common import make_profiles, parse_sizes, report
+
+ASTRA_LATENCY = 0.02
+SEQUENTIAL_SAMPLE = 100
+
+
+def main():
+    import httpx
+    from fastapi.testclient import TestClient
+
+    from app import crud
+    from app.main import app
+    from app.services import astra
+    from app.services.astra_client import AstraClient
+    from app.services.astra_stub import create_app
+
+    stub = create_app(latency=ASTRA_LATENCY)
+    astra.astra_client = AstraClient("http://astra.stub", transport=httpx.ASGITransport(app=stub))
+    client = TestClient(app)
+
+    profiles = make_profiles(10_000, freelancer_ratio=0.0)
+    crud.db_profiles.clear()
+    crud.db_profiles.put_many({profile.user_id: profile for profile in profiles})
+
+    def item(i):
+        return {
+            "sender_id": profiles[i % len(profiles)].laundr_id,
+            "recipient_id": profiles[(i * 7 + 1) % len(profiles)].laundr_id,
+            "amount": float(10 + i % 90),
+        }
+
+    rows = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for i in range(SEQUENTIAL_SAMPLE):
+            client.post("/api/v1/loads/send-load", json=item(i)).raise_for_status()
+        sequential = SEQUENTIAL_SAMPLE / (time.perf_counter() - start)
+
+        for size in parse_sizes([100, 1_000, 5_000]):
+            body = [item(i) for i in range(size)]
+            start = time.perf_counter()
+            response = client.post("/api/v1/loads/send-batch", json=body)
+            elapsed = time.perf_counter() - start
+            assert response.text.count('"status_code":200') == size
+            rows.append([size, sequential, size / elapsed, elapsed * 1000])
+
+    report(
+        f"Transfers per second with {ASTRA_LATENCY * 1000:.0f}ms Astra latency",
+        rows,
+        ["batch size", "send-load/s", "send-batch/s", "batch ms"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Per-request cost of /loads/send-load as the profile table grows.
+
+Each send-load resolves @laundrIDs three times (compliance middleware,
+sender, recipient), so with a linear lookup the request cost tracks the
+directory size; with the laundr_id hash index it should stay flat.
+
+    python -m benchmarks.bench_send_load [sizes...]   # default: 1000 10000 100000 1000000
+"""
+import contextlib
+import os
+
+from benchmarks.common import make_profiles, measure, parse_sizes, report
+
+
+def linear_lookup(profiles, laundr_id):
+    """The pre-index implementation of crud.get_profile_by_laundr_id."""
+    for profile in profiles:
+        if profile.laundr_id == laundr_id:
+            return profile
+    return None
+
+
+def main():
+    from fastapi.testclient import TestClient
+
+    from app import crud
+    from app.main import app
+
+    client = TestClient(app)
+    rows = []
+    for size in parse_sizes([1_000, 10_000, 100_000, 1_000_000]):
+        crud.db_profiles.clear()
+        profiles = make_profiles(size, freelancer_ratio=0.0)
+        for profile in profiles:
+            crud.db_profiles[profile.user_id] = profile
+
+        # The last two profiles are the worst case for a linear scan.
+        payload = {
+            "sender_id": profiles[-1].laundr_id,
+            "recipient_id": profiles[-2].laundr_id,
+            "amount": 100.0,
+        }
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            request = measure(lambda: client.post("/api/v1/loads/send-load", json=payload), repeat=200)
+        scan = measure(lambda: linear_lookup(crud.db_profiles.values(), payload["sender_id"]), repeat=5)
+        indexed = measure(lambda: crud.db_profiles.get_by_laundr_id(payload["sender_id"]), repeat=200)
+        rows.append([size, request["p50"], request["p99"], scan["p50"] * 3, indexed["p50"] * 3])
+
+    report(
+        "send-load per request (ms); lookup columns are the three laundr_id resolutions",
+        rows,
+        ["profiles", "request p50", "request p99", "scan lookups", "indexed lookups"],
+    )
+
+
+if __name__ == "__main__":
+    main()
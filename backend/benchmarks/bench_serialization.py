@@ -0,0 +1,68 @@
+"""
+Response serialization cost of /directory/freelancers/sort with and without
+a `fields=` projection, by page size.
+
+Directory results are cached, so after the first call a request is mostly
+routing plus turning profiles into JSON. "serialize" isolates the latter:
+the full response is validated against the response model and dumped, as
+FastAPI does, while the projected one reads the selected attributes straight off the models.
+
+    python -m benchmarks.bench_serialization [page sizes...]   # default: 100 1000 10000
+"""
+from benchmarks.common import make_profiles, measure, parse_sizes, report
+
+DIRECTORY_SIZE = 20_000
+FIELDS = "@laundrID,headline,rating"
+
+
+def main():
+    from typing import List
+
+    from fastapi.testclient import TestClient
+    from pydantic import TypeAdapter
+    from pydantic_core import to_json
+
+    from app import crud
+    from app.main import app
+    from app.schemas.directory import FreelancerProfile, SortParams
+    from app.utils.pagination import parse_fields, project
+
+    client = TestClient(app)
+    crud.db_profiles.clear()
+    for profile in make_profiles(DIRECTORY_SIZE, freelancer_ratio=1.0):
+        crud.db_profiles[profile.user_id] = profile
+
+    adapter = TypeAdapter(List[FreelancerProfile])
+    fields = parse_fields(FIELDS, FreelancerProfile)
+    rows = []
+    for limit in parse_sizes([100, 1_000, 10_000]):
+        body = {"sort_by": "rating", "limit": limit}
+        items = crud._sort_freelancers(SortParams(**body)).items
+
+        def full():
+            return client.post("/api/v1/directory/freelancers/sort", json=body)
+
+        def projected():
+            return client.post("/api/v1/directory/freelancers/sort", json=body, params={"fields": FIELDS})
+
+        full_bytes, projected_bytes = len(full().content), len(projected().content)
+        serialize_full = measure(lambda: adapter.dump_json(adapter.validate_python(items), by_alias=True))
+        serialize_projected = measure(lambda: to_json(project(items, fields)))
+        request_full = measure(full)
+        request_projected = measure(projected)
+        rows.append([
+            limit, full_bytes, projected_bytes,
+            serialize_full["p50"], serialize_projected["p50"],
+            request_full["p50"], request_projected["p50"],
+        ])
+
+    report(
+        f"sort response by page size, {DIRECTORY_SIZE} freelancers, fields={FIELDS} (ms)",
+        rows,
+        ["limit", "full bytes", "projected bytes", "serialize full", "serialize projected",
+         "request full", "request projected"],
+    )
+
+
+if __name__ == "__main__":
+    main()
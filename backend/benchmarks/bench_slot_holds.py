@@ -0,0 +1,154 @@
+"""
+Slot holds from concurrent bookings: blocking client vs async vs pipelined.
+
+Each caller holds the four slots of a new one-hour booking again and
+again, through the same Lua script in every variant:
+
+    blocking    a synchronous redis.Redis called from the event loop, as
+                create_booking did: every hold stalls the loop for a round trip
+    async       a redis.asyncio client on a connection pool, one call per hold
+    pipelined   SlotHolds: holds queued in the same loop iteration share a pipeline
+
+"lag" is how late a 1 ms timer on the same loop fires while the holds
+run: what every other request on the worker waits on top of its own work.
+
+Runs against REDIS_URL when it is set, otherwise against fakeredis' TCP
+server in a subprocess, so every hold still crosses a socket. fakeredis
+serves each connection by polling every 10 ms and runs on the client's
+cores, so only a real server gives representative throughput.
+
+    python -m benchmarks.bench_slot_holds [callers...]   # default: 1 16 64
+"""
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import parse_sizes, report
+from benchmarks.load_workers import _free_port
+
+HOLDS = 4_000
+HOLD = timedelta(minutes=10)
+
+
+@contextlib.contextmanager
+def redis_server():
+    """Yields REDIS_URL, or the URL of a fakeredis server started for the run."""
+    if os.getenv("REDIS_URL"):
+        yield os.environ["REDIS_URL"]
+        return
+    import redis
+
+    port = _free_port()
+    server = subprocess.Popen([
+        sys.executable, "-c",
+        f"from fakeredis import TcpFakeServer; TcpFakeServer(('127.0.0.1', {port})).serve_forever()",
+    ])
+    try:
+        for _ in range(100):
+            try:
+                redis.Redis(port=port).ping()
+                break
+            except redis.ConnectionError:
+                time.sleep(0.1)
+        yield f"redis://127.0.0.1:{port}/0"
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def _run(reserve, callers: int, run: int) -> list:
+    latencies = []
+    per_caller = HOLDS // callers
+    start = datetime(2030, 1, 1)
+
+    async def caller(index: int):
+        for i in range(per_caller):
+            # A slot nobody else holds, so every hold goes through the whole script.
+            begin = start + timedelta(hours=(run * HOLDS + index * per_caller + i))
+            began = time.perf_counter()
+            assert await reserve(f"@bench{callers}", begin, begin + timedelta(hours=1))
+            latencies.append(time.perf_counter() - began)
+
+    lags = []
+    done = False
+
+    async def ticker():
+        while not done:
+            began = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - began - 0.001)
+
+    tick = asyncio.create_task(ticker())
+    began = time.perf_counter()
+    await asyncio.gather(*(caller(index) for index in range(callers)))
+    elapsed = time.perf_counter() - began
+    done = True
+    await tick
+    latencies.sort()
+    lags.sort()
+    return [len(latencies) / elapsed, latencies[int(len(latencies) * 0.99)] * 1000, lags[int(len(lags) * 0.99)] * 1000]
+
+
+async def _measure(url: str, callers: int) -> list:
+    import redis
+    import redis.asyncio
+
+    from app.services.redis import _RESERVE_SCRIPT, SlotHolds
+
+    holds = SlotHolds(url, max_connections=max(callers, 1))
+    blocking_script = redis.Redis.from_url(url).register_script(_RESERVE_SCRIPT)
+    async_client = redis.asyncio.Redis(connection_pool=redis.asyncio.BlockingConnectionPool.from_url(
+        url, max_connections=max(callers, 1)))
+    async_script = async_client.register_script(_RESERVE_SCRIPT)
+    hold_ms = int(HOLD.total_seconds() * 1000)
+
+    def keys(freelancer_id, start, end):
+        return [f"slot:{{{freelancer_id}}}:{slot}" for slot in holds.slots(start, end)]
+
+    async def blocking(freelancer_id, start, end):
+        return blocking_script(keys(freelancer_id, start, end), ["reserved", hold_ms])
+
+    async def unpipelined(freelancer_id, start, end):
+        return await async_script(keys(freelancer_id, start, end), ["reserved", hold_ms])
+
+    async def pipelined(freelancer_id, start, end):
+        return await holds.reserve(freelancer_id, holds.slots(start, end), HOLD)
+
+    row = [callers]
+    for run, reserve in enumerate((blocking, unpipelined, pipelined)):
+        row += await _run(reserve, callers, run)
+    row.append(holds.commands / holds.round_trips)
+    await holds.aclose()
+    await async_client.aclose()
+    return row
+
+
+def main():
+    import redis
+
+    from app.services.redis import _RESERVE_SCRIPT
+
+    with redis_server() as url:
+        rows = []
+        for callers in parse_sizes([1, 16, 64]):
+            client = redis.Redis.from_url(url)
+            client.flushdb()
+            # Loaded up front, so no variant pays for the first NOSCRIPT.
+            client.script_load(_RESERVE_SCRIPT)
+            client.close()
+            rows.append(asyncio.run(_measure(url, callers)))
+
+    report(
+        f"{HOLDS} slot holds of four slots each (holds/s, ms)",
+        rows,
+        ["callers", "blocking/s", "p99", "lag p99", "async/s", "p99", "lag p99", "pipelined/s", "p99", "lag p99",
+         "holds per trip"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Repository throughput of the in-memory and SQLite (WAL) storage backends.
+
+"cold get" reopens the database first so every read misses the identity
+map and has to hit SQLite.
+
+    python -m benchmarks.bench_storage [sizes...]   # default: 10000 100000
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import parse_sizes, report
+
+
+def ops_per_second(fn, count: int) -> float:
+    start = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    from app.schemas.bookings import BookingResponse, BookingStatus
+    from app.storage.repositories import Storage
+
+    rows = []
+    for size in parse_sizes([10_000, 100_000]):
+        rng = random.Random(7)
+        start = datetime(2025, 1, 1)
+        bookings = {}
+        for i in range(size):
+            begin = start + timedelta(minutes=rng.randrange(525_600))
+            bookings[f"b{i}"] = BookingResponse.model_construct(
+                id=f"b{i}",
+                client_id=f"client{rng.randrange(size // 10)}",
+                freelancer_id=f"freelancer{rng.randrange(size // 10)}",
+                start_time=begin,
+                end_time=begin + timedelta(hours=1),
+                service="Cleaning",
+                price=float(rng.randrange(20, 500)),
+                status=BookingStatus.CONFIRMED,
+            )
+        keys = rng.sample(list(bookings), min(size, 10_000))
+        freelancers = [f"freelancer{rng.randrange(size // 10)}" for _ in range(200)]
+        events = [
+            {"action": "send_load", "details": {"amount": 1.0}, "timestamp": start + timedelta(seconds=i)}
+            for i in range(size)
+        ]
+
+        for backend in ("memory", "sqlite"):
+            path = os.path.join(tempfile.mkdtemp(), "bench.db")
+            storage = Storage(backend, path)
+            repo = storage.bookings
+            single = min(size, 10_000)
+
+            def insert_one():
+                for key in keys[:single]:
+                    repo[key] = bookings[key]
+
+            insert = ops_per_second(insert_one, single)
+            repo.clear()
+            batched = ops_per_second(lambda: repo.put_many(bookings), size)
+            if backend == "sqlite":
+                storage.close()
+                storage = Storage(backend, path)
+                repo = storage.bookings
+            cold = ops_per_second(lambda: [repo[key] for key in keys], len(keys))
+            warm = ops_per_second(lambda: [repo[key] for key in keys], len(keys))
+            find = ops_per_second(lambda: [repo.find(freelancer_id=f) for f in freelancers], len(freelancers))
+
+            log = storage.transactions
+            log_single = ops_per_second(lambda: [log.append(e) for e in events[:single]], single)
+            log.clear()
+            log_batched = ops_per_second(lambda: log.extend(events), size)
+            window = ops_per_second(
+                lambda: [log.between(e["timestamp"], e["timestamp"] + timedelta(minutes=1)) for e in events[:50]],
+                50,
+            )
+            storage.close()
+            rows.append([
+                size, backend, int(insert), int(batched), int(cold), int(warm), int(find),
+                int(log_single), int(log_batched), int(window),
+            ])
+
+    report(
+        "booking repository / transaction log throughput (ops/s)",
+        rows,
+        ["rows", "backend", "insert", "put_many", "cold get", "warm get", "find",
+         "log append", "log extend", "log window"],
+    )
+
+
+if __name__ == "__main__":
+    main()
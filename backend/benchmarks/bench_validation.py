@@ -0,0 +1,111 @@
+"""
+Per-item cost of re-validating internal data vs passing it on trusted.
+
+    activity item        ActivityItem(...) vs the plain dict the feed now builds
+    feed response        validating the items against ActivityFeedResponse and dumping
+                         them, as FastAPI does for a response model, vs to_json of the dicts
+    booking              BookingResponse(**create.model_dump()) vs (**vars(create))
+    routine              the contract check create_routine made (dump + validate) vs none
+    feed (N)             a user's whole feed of N transactions, built and serialized
+
+model_construct is measured too: with pydantic-core validating in Rust,
+constructing without validation in Python is the slower of the two.
+
+    python -m benchmarks.bench_validation [feed sizes...]   # default: 1000 10000
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from benchmarks.common import measure, parse_sizes, report
+
+USER = "@target"
+ITEMS = 10_000
+
+
+def per_item(fn, count: int, repeat: int = 5) -> float:
+    """Microseconds per item of `fn`, which handles `count` items."""
+    return measure(fn, repeat=repeat)["p50"] * 1000 / count
+
+
+def main():
+    from pydantic import TypeAdapter
+    from pydantic_core import to_json
+
+    from app.schemas.analytics import (ActivityFeedResponse, ActivityItem,
+                                       ActivityType)
+    from app.schemas.bookings import (BookingCreate, BookingResponse,
+                                      BookingStatus)
+    from app.schemas.loads import AstraRoutineCreate
+    from app.services import analytics
+    from app.services.astra import transactions_db
+    from app.utils.astra_contract import validate_astra_contract
+
+    start = datetime(2025, 1, 1)
+    rows_in = [
+        {"id": f"tx{i}", "type": ActivityType.LOAD.value, "timestamp": start + timedelta(minutes=i),
+         "description": f"Sent load to @user{i}", "amount": 12.5, "status": "completed"}
+        for i in range(ITEMS)
+    ]
+    validated = [ActivityItem(**row) for row in rows_in]
+    response_adapter = TypeAdapter(ActivityFeedResponse)
+
+    def validated_response(items):
+        return response_adapter.dump_json(response_adapter.validate_python({"items": items}))
+
+    assert to_json({"items": rows_in}) == validated_response(validated)
+
+    creates = [
+        BookingCreate(client_id=f"@client{i}", freelancer_id="@f", start_time=start, end_time=start + timedelta(hours=1),
+                      service="Cleaning", price=80.0)
+        for i in range(ITEMS)
+    ]
+    routines = [
+        AstraRoutineCreate(type="send", amount=12.5, source_id=f"@user{i}", destination_id="@f")
+        for i in range(ITEMS)
+    ]
+
+    rows = [
+        ["activity item",
+         per_item(lambda: [ActivityItem(**row) for row in rows_in], ITEMS),
+         per_item(lambda: [dict(row) for row in rows_in], ITEMS)],
+        ["  model_construct", "-", per_item(lambda: [ActivityItem.model_construct(**row) for row in rows_in], ITEMS)],
+        ["feed response", per_item(lambda: validated_response(validated), ITEMS),
+         per_item(lambda: to_json({"items": rows_in}), ITEMS)],
+        ["booking",
+         per_item(lambda: [BookingResponse(id="b", status=BookingStatus.PENDING, **create.model_dump())
+                           for create in creates], ITEMS),
+         per_item(lambda: [BookingResponse(id="b", status=BookingStatus.PENDING, **vars(create))
+                           for create in creates], ITEMS)],
+        ["  model_construct", "-",
+         per_item(lambda: [BookingResponse.model_construct(id="b", status=BookingStatus.PENDING, **dict(create))
+                           for create in creates], ITEMS)],
+        ["routine",
+         per_item(lambda: [validate_astra_contract(routine.model_dump(), AstraRoutineCreate) for routine in routines],
+                  ITEMS),
+         0.0],
+    ]
+
+    for size in parse_sizes([1_000, 10_000]):
+        transactions_db.clear()
+        transactions_db.extend(
+            {"action": "send_load",
+             "details": {"transaction_id": f"tx{i}", "sender_id": USER, "recipient_id": f"@user{i}", "amount": 12.5},
+             "timestamp": start + timedelta(minutes=i), "status": "completed"}
+            for i in range(size)
+        )
+
+        def feed():
+            return asyncio.run(analytics.get_activity_feed(USER)).items
+
+        rows.append([
+            f"feed ({size})",
+            per_item(lambda: validated_response([ActivityItem(**item) for item in feed()]), size),
+            per_item(lambda: to_json({"items": feed()}), size),
+        ])
+    transactions_db.clear()
+
+    report("Cost per item, µs", rows, ["", "validated", "trusted"])
+
+
+if __name__ == "__main__":
+    main()
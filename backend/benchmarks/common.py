@@ -0,0 +1,94 @@
+"""
+Shared helpers for the backend micro-benchmarks.
+
+Run a benchmark from the backend directory, e.g.:
+
+    python -m benchmarks.bench_search 10000 100000
+"""
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+# Mirror tests/conftest.py so `app` and `agents` are importable.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+SKILLS = [
+    "Python", "FastAPI", "PyTorch", "Figma", "Sketch", "Agile", "Scrum", "Cleaning",
+    "Plumbing", "Tutoring", "Photography", "Copywriting", "Bookkeeping", "React",
+    "Dog Walking", "Carpentry", "Translation", "Video Editing", "SEO", "Catering",
+]
+TITLES = [
+    "Software Engineer", "Data Scientist", "Product Manager", "UX Designer",
+    "House Cleaner", "Math Tutor", "Wedding Photographer", "Handyman",
+    "Copywriter", "Bookkeeper", "Personal Chef", "Translator",
+]
+
+
+def parse_sizes(default: List[int]) -> List[int]:
+    """Reads profile counts from argv, falling back to `default`."""
+    return [int(arg) for arg in sys.argv[1:]] or default
+
+
+def make_profiles(count: int, seed: int = 42, freelancer_ratio: float = 0.6) -> list:
+    """Builds `count` synthetic profiles without paying for validation."""
+    from app.schemas.directory import FreelancerProfile
+    from app.schemas.profile import Profile
+
+    rng = random.Random(seed)
+    profiles = []
+    for user_id in range(1, count + 1):
+        fields = {
+            "user_id": user_id,
+            "laundr_id": f"@user{user_id}_{rng.randrange(36 ** 4):x}",
+            "bio": None,
+            "headline": rng.choice(TITLES),
+            "skill_tags": rng.sample(SKILLS, 2),
+            "user_intent_id": None,
+            "kyc_status": "verified",
+            # Spread across the continental US
+            "latitude": rng.uniform(25.0, 49.0),
+            "longitude": rng.uniform(-124.0, -67.0),
+        }
+        if rng.random() < freelancer_ratio:
+            profiles.append(FreelancerProfile.model_construct(
+                rating=round(rng.uniform(1.0, 5.0), 1),
+                reviews=rng.randrange(200),
+                is_verified_freelancer=False,
+                availability="available",
+                **fields,
+            ))
+        else:
+            profiles.append(Profile.model_construct(**fields))
+    return profiles
+
+
+def measure(fn: Callable[[], object], repeat: int = 20) -> Dict[str, float]:
+    """Calls `fn` `repeat` times and returns latency percentiles in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "mean": statistics.fmean(samples),
+    }
+
+
+def report(title: str, rows: List[List[object]], headers: List[str]) -> None:
+    """Prints a fixed-width results table."""
+    print(f"\n{title}")
+    widths = [max(len(str(h)), *(len(_fmt(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(_fmt(v).rjust(w) for v, w in zip(row, widths)))
+
+
+def _fmt(value: object) -> str:
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
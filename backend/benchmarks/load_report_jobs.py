@@ -0,0 +1,147 @@
+"""
+Latency of light requests while heavy financial reports are being built.
+
+One uvicorn worker on shared SQLite storage. Light clients read profiles
+and revenue projections; one heavy client at a time downloads financial
+reports for users with many transactions, cycling through them so that no
+report is reused:
+
+    idle     no reports
+    inline   GET /export/financial-report, built by the serving process
+    jobs     POST /jobs, then GET /jobs/{id}/result?wait=true, built by the
+             niced report worker processes
+
+With a free core for the report workers, light latency under "jobs" stays
+near "idle". On a single core the workers only get what the server leaves
+over, so it is the reports that slow down instead of the light requests.
+
+    python -m benchmarks.load_report_jobs [transactions per report user...]   # default: 20000
+"""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_profiles, parse_sizes, report
+from benchmarks.load_workers import BACKEND_DIR, _free_port, _wait_ready
+
+PROFILES = 10_000
+REPORT_USERS = 10
+DURATION = 10.0
+LIGHT_CONNECTIONS = 16
+HEAVY_CONNECTIONS = 2
+MODES = ("idle", "inline", "jobs")
+
+
+def seed(path: str, transactions: int) -> None:
+    from app.storage.repositories import Storage
+
+    storage = Storage("sqlite", path)
+    storage.profiles.put_many({profile.user_id: profile for profile in make_profiles(PROFILES)})
+    start = datetime(2023, 1, 1)
+    step = timedelta(days=3 * 365) / transactions
+    for user in range(REPORT_USERS):
+        storage.transactions.extend(
+            {
+                "action": "send_load",
+                "details": {
+                    "transaction_id": f"rt_{user}_{i}",
+                    "sender_id": f"@report{user}" if i % 2 else f"@user{i % 5000}",
+                    "recipient_id": f"@user{i % 5000}" if i % 2 else f"@report{user}",
+                    "amount": (i % 50_000) / 100 + 5,
+                },
+                "timestamp": start + step * i,
+                "status": "completed",
+            }
+            for i in range(transactions)
+        )
+    storage.close()
+
+
+async def load(base_url: str, mode: str):
+    import httpx
+
+    rng = random.Random(7)
+    deadline = time.perf_counter() + DURATION
+    latencies, reports, errors = [], [], 0
+    users = iter(range(REPORT_USERS))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        async def light():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                if rng.random() < 0.7:
+                    response = await client.get(f"/api/v1/profiles/{rng.randrange(1, PROFILES + 1)}")
+                else:
+                    response = await client.get(f"/api/v1/analytics/projections/@user{rng.randrange(5000)}")
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code >= 400
+
+        async def heavy():
+            nonlocal errors
+            for user in users:
+                if time.perf_counter() >= deadline:
+                    return
+                start = time.perf_counter()
+                if mode == "inline":
+                    response = await client.get(f"/api/v1/analytics/export/financial-report/@report{user}")
+                else:
+                    job = (await client.post(
+                        "/api/v1/analytics/jobs", json={"user_id": f"@report{user}", "report": "financial_report"}
+                    )).json()
+                    response = await client.get(f"/api/v1/analytics/jobs/{job['job_id']}/result?wait=true")
+                reports.append(time.perf_counter() - start)
+                errors += response.status_code >= 400
+
+        tasks = [light() for _ in range(LIGHT_CONNECTIONS)]
+        if mode != "idle":
+            tasks.extend(heavy() for _ in range(HEAVY_CONNECTIONS))
+        await asyncio.gather(*tasks)
+    return sorted(latencies), sorted(reports), errors
+
+
+def run(path: str, mode: str) -> list:
+    port = _free_port()
+    pythonpath = os.pathsep.join([os.path.dirname(BACKEND_DIR), BACKEND_DIR])
+    env = {**os.environ, "PYTHONPATH": pythonpath, "STORAGE_BACKEND": "sqlite", "STORAGE_PATH": path}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(port)
+        latencies, reports, errors = asyncio.run(load(f"http://127.0.0.1:{port}", mode))
+    finally:
+        server.terminate()
+        server.wait()
+    return [
+        mode,
+        int(len(latencies) / DURATION),
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.99)] * 1000,
+        len(reports),
+        reports[len(reports) // 2] * 1000 if reports else "-",
+        errors,
+    ]
+
+
+def main():
+    for transactions in parse_sizes([20_000]):
+        path = os.path.join(tempfile.mkdtemp(), "load.db")
+        seed(path, transactions)
+        rows = [run(path, mode) for mode in MODES]
+        report(
+            f"Light requests while building reports of {transactions} transactions (ms)",
+            rows,
+            ["mode", "light req/s", "p50", "p99", "reports", "report p50", "errors"],
+        )
+
+
+if __name__ == "__main__":
+    main()
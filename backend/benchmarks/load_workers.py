@@ -0,0 +1,142 @@
+"""
+Load test of the API across uvicorn worker counts on shared SQLite storage.
+
+Every worker opens the same database file. The client mix is 70% profile
+reads, 20% directory searches and 10% profile creations; the created user
+ids are checked for duplicates across workers. Run it on a machine with at
+least as many free cores as workers plus client processes, otherwise the
+workers just time-slice one core.
+
+    python -m benchmarks.load_workers [worker counts...]   # default: 1 2 4
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import SKILLS, make_profiles, parse_sizes, report
+
+PROFILES = 10_000
+DURATION = 10.0
+CLIENT_PROCESSES = 2
+CONNECTIONS_PER_CLIENT = 32
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+async def _client(base_url: str, seed: int, deadline: float):
+    import httpx
+
+    rng = random.Random(seed)
+    latencies, created, errors = [], [], 0
+    limits = httpx.Limits(max_connections=CONNECTIONS_PER_CLIENT)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def run():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                roll = rng.random()
+                start = time.perf_counter()
+                try:
+                    if roll < 0.7:
+                        response = await client.get(f"/api/v1/profiles/{rng.randrange(1, PROFILES + 1)}")
+                    elif roll < 0.9:
+                        response = await client.post(
+                            "/api/v1/directory/search", json={"term": rng.choice(SKILLS), "limit": 20}
+                        )
+                    else:
+                        response = await client.post(
+                            "/api/v1/profiles/", json={"@laundrID": f"@load_{seed}_{rng.getrandbits(64):x}"}
+                        )
+                        if response.status_code == 201:
+                            created.append(response.json()["user_id"])
+                except httpx.TransportError:
+                    # e.g. a keep-alive connection the server closed as it was reused
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+
+        await asyncio.gather(*(run() for _ in range(CONNECTIONS_PER_CLIENT)))
+    return latencies, created, errors
+
+
+def _client_process(args):
+    return asyncio.run(_client(*args))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(port: int, timeout: float = 60.0) -> None:
+    import httpx
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+def run(workers: int) -> list:
+    from app.storage.repositories import Storage
+
+    path = os.path.join(tempfile.mkdtemp(), "load.db")
+    seed = Storage("sqlite", path)
+    seed.profiles.put_many({profile.user_id: profile for profile in make_profiles(PROFILES)})
+    seed.close()
+
+    port = _free_port()
+    # The app imports `agents` from the repository root, like the tests do.
+    pythonpath = os.pathsep.join([os.path.dirname(BACKEND_DIR), BACKEND_DIR])
+    env = {**os.environ, "PYTHONPATH": pythonpath, "STORAGE_BACKEND": "sqlite", "STORAGE_PATH": path}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(port)
+        deadline = time.perf_counter() + DURATION
+        args = [(f"http://127.0.0.1:{port}", i, deadline) for i in range(CLIENT_PROCESSES)]
+        with multiprocessing.Pool(CLIENT_PROCESSES) as pool:
+            results = pool.map(_client_process, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    created = [user_id for result in results for user_id in result[1]]
+    errors = sum(result[2] for result in results)
+    return [
+        workers,
+        int(len(latencies) / DURATION),
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.99)] * 1000,
+        len(created),
+        len(created) - len(set(created)),
+        errors,
+    ]
+
+
+def main():
+    rows = [run(workers) for workers in parse_sizes([1, 2, 4])]
+    report(
+        f"API throughput by worker count, {PROFILES} profiles on shared SQLite (ms)",
+        rows,
+        ["workers", "req/s", "p50", "p99", "created", "duplicate ids", "errors"],
+    )
+
+
+if __name__ == "__main__":
+    main()
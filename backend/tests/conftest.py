@@ -1,5 +1,24 @@
 import sys
 import os
+import tempfile
 
 # Add the root directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--storage",
+        choices=["memory", "sqlite"],
+        default=os.getenv("STORAGE_BACKEND", "memory"),
+        help="Storage backend the app runs against (default: memory)",
+    )
+
+
+def pytest_configure(config):
+    # The repositories are created when `app` is first imported, which
+    # happens while test modules are collected, i.e. after this hook.
+    backend = config.getoption("--storage")
+    os.environ["STORAGE_BACKEND"] = backend
+    if backend == "sqlite" and "STORAGE_PATH" not in os.environ:
+        os.environ["STORAGE_PATH"] = os.path.join(tempfile.mkdtemp(), "test.db")
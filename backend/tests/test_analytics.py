@@ -1,3 +1,7 @@
+import asyncio
+import gzip
+import os
+
 import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime, timedelta, timezone
@@ -5,7 +9,11 @@ from datetime import datetime, timedelta, timezone
 from app.main import app
 from app.services.bookings import bookings_db
 from app.services.astra import transactions_db
+from app.services import analytics as analytics_service
+from app.schemas.analytics import ActivityFeedResponse, ActivityType, ReportJobCreate
 from app.schemas.bookings import BookingResponse, BookingStatus
+from app.services.report_jobs import ReportJobs, report_jobs
+from app.utils.pagination import encode_cursor
 
 client = TestClient(app)
 
@@ -92,6 +100,90 @@ def test_get_activity_feed():
     assert items[1]["id"] == "tx1"
     assert items[2]["id"] == "booking3"
     assert items[0]["description"] == "Sent load to other_user"
+    # Served without the response model, so check it still holds
+    assert ActivityFeedResponse.model_validate(data).items[2].type == ActivityType.BOOKING
+
+
+def test_activity_feed_pages_with_before_cursor():
+    """
+    Tests that following the cursor pages through the whole feed, including items sharing a timestamp.
+    """
+    for i in range(3):
+        transactions_db.append({
+            "action": "request_load",
+            "details": {"transaction_id": f"req{i}", "requester_id": USER_ID, "sender_id": "other_user", "amount": 5.0},
+            "timestamp": datetime(2023, 7, 7, 12, 0, 0),
+            "status": "pending"
+        })
+    url = f"/api/v1/analytics/activity/{USER_ID}"
+    expected = [item["id"] for item in client.get(url).json()["items"]]
+    assert expected == ["req2", "req1", "req0", "tx2", "tx1", "booking3"]
+
+    seen, cursor = [], None
+    while True:
+        response = client.get(url, params={"limit": 2, **({"before": cursor} if cursor else {})})
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert len(items) <= 2
+        seen.extend(item["id"] for item in items)
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert seen == expected
+
+    assert client.get(url, params={"before": "not-a-cursor"}).status_code == 400
+    for key in ((), ("7", "id"), (7,), (7, ["id"])):
+        assert client.get(url, params={"before": encode_cursor("activity", *key)}).status_code == 400
+    assert client.get(url, params={"limit": 0}).status_code == 422
+
+
+def test_activity_feed_cursor_survives_its_booking_moving():
+    """
+    Tests that items sharing the cursor's timestamp are not lost when the booking it was taken from moves.
+    """
+    for booking_id in ("slot_a", "slot_b", "slot_c"):
+        bookings_db[booking_id] = BookingResponse(
+            id=booking_id,
+            client_id=USER_ID,
+            freelancer_id=FREELANCER_ID,
+            start_time=datetime(2023, 7, 20, 10, 0, 0),
+            end_time=datetime(2023, 7, 20, 11, 0, 0),
+            service="Consulting",
+            price=80.0,
+            status=BookingStatus.PENDING,
+        )
+    url = f"/api/v1/analytics/activity/{USER_ID}"
+    response = client.get(url, params={"limit": 1})
+    assert [item["id"] for item in response.json()["items"]] == ["slot_c"]
+
+    # Countered to a later time after the client read it
+    moved = bookings_db["slot_c"]
+    moved.start_time, moved.end_time = datetime(2023, 7, 21, 10, 0, 0), datetime(2023, 7, 21, 11, 0, 0)
+    bookings_db["slot_c"] = moved
+
+    response = client.get(url, params={"limit": 3, "before": response.headers["x-next-cursor"]})
+    assert [item["id"] for item in response.json()["items"]] == ["slot_b", "slot_a", "tx2"]
+
+
+def test_activity_feed_follows_booking_changes():
+    """
+    Tests that the feed takes in bookings written after it was first read.
+    """
+    url = f"/api/v1/analytics/activity/{USER_ID}"
+    assert client.get(url, params={"limit": 1}).json()["items"][0]["id"] == "tx2"
+    bookings_db["booking4"] = BookingResponse(
+        id="booking4",
+        client_id=USER_ID,
+        freelancer_id=FREELANCER_ID,
+        start_time=datetime(2023, 7, 10, 10, 0, 0),
+        end_time=datetime(2023, 7, 10, 11, 0, 0),
+        service="Consulting",
+        price=80.0,
+        status=BookingStatus.PENDING,
+    )
+    del bookings_db["booking3"]
+    ids = [item["id"] for item in client.get(url).json()["items"]]
+    assert ids == ["booking4", "tx2", "tx1"]
 
 
 def test_get_revenue_projections():
@@ -106,6 +198,43 @@ def test_get_revenue_projections():
     assert data["from_booking_count"] == 1
 
 
+def test_revenue_follows_booking_status_changes():
+    """
+    Tests that projections and reports follow bookings being declined, countered and confirmed.
+    """
+    projections = f"/api/v1/analytics/projections/{FREELANCER_ID}"
+    report = f"/api/v1/analytics/revenue-report/{FREELANCER_ID}?breakdown_by=service"
+    assert client.get(projections).json()["projected_revenue"] == 500.0
+    assert len(client.get(report).json()["data"]) == 2
+
+    assert client.post("/api/v1/bookings/booking2/decline").status_code == 200
+    assert client.get(projections).json() == {"projected_revenue": 0.0, "from_booking_count": 0}
+    assert client.post("/api/v1/bookings/booking1/counter", json={"price": 120.0}).status_code == 200
+    assert client.get(report).json()["data"] == [
+        {"category": "Data Analysis", "total_revenue": 300.0, "transaction_count": 1},
+    ]
+
+    booking = bookings_db["booking1"]
+    booking.status = BookingStatus.CONFIRMED
+    bookings_db["booking1"] = booking
+    start = datetime.now(timezone.utc) + timedelta(days=3)
+    bookings_db["booking4"] = BookingResponse(
+        id="booking4",
+        client_id=CLIENT_ID,
+        freelancer_id=FREELANCER_ID,
+        start_time=start,
+        end_time=start + timedelta(hours=1),
+        service="Consulting",
+        price=60.25,
+        status=BookingStatus.CONFIRMED,
+    )
+    assert client.get(projections).json() == {"projected_revenue": 60.25, "from_booking_count": 1}
+    services = {row["category"]: row for row in client.get(report).json()["data"]}
+    # booking4 hasn't started, so only the countered price of booking1 is revenue yet
+    assert services["Consulting"]["total_revenue"] == 120.0
+    assert services["Consulting"]["transaction_count"] == 1
+
+
 def test_get_income_trend():
     """
     Tests the income trend aggregation over a specific date range.
@@ -146,6 +275,9 @@ def test_get_revenue_report():
     # The freelancer has two past clients in the test data
     assert len(data["data"]) == 2
 
+    response = client.get(f"/api/v1/analytics/revenue-report/{FREELANCER_ID}?breakdown_by=region")
+    assert response.status_code == 422
+
     # Sort by category to ensure consistent order for assertions
     sorted_data = sorted(data["data"], key=lambda x: x['category'])
 
@@ -176,3 +308,200 @@ def test_financial_report_csv_export():
     assert "75.0" in content
     assert "Load sent" in content
     assert "50.0" in content
+
+
+def test_financial_report_is_in_date_order():
+    """
+    Tests that bookings and transactions are interleaved by date, however the report is chunked.
+    """
+    bookings_db["booking4"] = BookingResponse(
+        id="booking4",
+        client_id=CLIENT_ID,
+        freelancer_id=USER_ID,
+        start_time=datetime(2023, 7, 5, 18, 0, 0),
+        end_time=datetime(2023, 7, 5, 19, 0, 0),
+        service="Consulting",
+        price=40.0,
+        status=BookingStatus.CONFIRMED,
+    )
+    content = client.get(f"/api/v1/analytics/export/financial-report/{USER_ID}").text
+    lines = content.splitlines()
+    assert [line.split(",")[0] for line in lines[1:]] == ["2023-07-02", "2023-07-05", "2023-07-05", "2023-07-06"]
+    assert lines[3] == "2023-07-05,Payment for 'Consulting' from client1,40.0,,Booking Revenue"
+
+    chunks = list(analytics_service.stream_financial_report_csv(USER_ID, chunk_size=16))
+    assert len(chunks) > 1
+    assert b"".join(chunks).decode() == content
+
+
+def test_financial_report_reads_bookings_as_it_goes():
+    """
+    Tests that the report walks the user's booking timeline, taking in bookings written while it runs.
+    """
+    def booking(booking_id, day, status=BookingStatus.CONFIRMED):
+        return BookingResponse(
+            id=booking_id, client_id=CLIENT_ID, freelancer_id=USER_ID, start_time=datetime(2023, 7, day, 9, 0, 0),
+            end_time=datetime(2023, 7, day, 10, 0, 0), service="Consulting", price=float(day), status=status,
+        )
+
+    bookings_db["booking4"] = booking("booking4", 3)
+    rows = analytics_service.financial_report_rows(USER_ID)
+    assert next(rows)[0] == "2023-07-02"
+    bookings_db["booking5"] = booking("booking5", 4)
+    bookings_db["booking6"] = booking("booking6", 8, BookingStatus.PENDING)
+    bookings_db["booking4"] = booking("booking4", 1)
+    assert [row[0] for row in rows] == ["2023-07-04", "2023-07-05", "2023-07-06"]
+
+
+def test_financial_report_gzip_export():
+    """
+    Tests that the compressed export holds the same CSV.
+    """
+    url = f"/api/v1/analytics/export/financial-report/{USER_ID}"
+    response = client.get(f"{url}?compression=gzip")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    assert "filename=financial_report.csv.gz" in response.headers["content-disposition"]
+    assert gzip.decompress(response.content).decode() == client.get(url).text
+    assert client.get(f"{url}?compression=zip").status_code == 422
+
+
+def test_income_trend_by_week_and_month():
+    """
+    Tests that weekly and monthly points add up the days in each period.
+    """
+    url = f"/api/v1/analytics/income-trend/{USER_ID}?start_date=2023-06-28&end_date=2023-07-31"
+    weekly = client.get(f"{url}&granularity=week").json()["trend"]
+    # 2023-07-03 is a Monday; the first point starts at the range start
+    assert [point["date"] for point in weekly[:3]] == ["2023-06-28", "2023-07-03", "2023-07-10"]
+    assert weekly[0]["expenses"] == 300.0
+    assert weekly[1] == {"date": "2023-07-03", "income": 75.0, "expenses": 50.0, "net_income": 25.0}
+
+    monthly = client.get(f"{url}&granularity=month").json()["trend"]
+    assert [point["date"] for point in monthly] == ["2023-06-28", "2023-07-01"]
+    assert monthly[1]["net_income"] == 75.0 - 50.0 - 300.0
+
+    assert client.get(f"{url}&granularity=year").status_code == 422
+
+
+def test_income_trend_follows_new_writes():
+    """
+    Tests that rollups built by one request take in later transfers and bookings.
+    """
+    url = f"/api/v1/analytics/income-trend/{USER_ID}?start_date=2023-07-01&end_date=2023-07-31&granularity=month"
+    assert client.get(url).json()["trend"][0]["income"] == 75.0
+
+    transactions_db.append({
+        "action": "swap_funds",
+        "details": {"transaction_id": "tx3", "source_id": "other_user", "destination_id": USER_ID, "amount": 20.0},
+        "timestamp": datetime(2023, 7, 20, 9, 0, 0),
+        "status": "completed"
+    })
+    booking = bookings_db["booking3"]
+    booking.status = BookingStatus.CANCELLED
+    bookings_db["booking3"] = booking
+    # Earlier than anything the user had so far
+    bookings_db["booking4"] = BookingResponse(
+        id="booking4",
+        client_id=CLIENT_ID,
+        freelancer_id=USER_ID,
+        start_time=datetime(2023, 6, 1, 10, 0, 0),
+        end_time=datetime(2023, 6, 1, 11, 0, 0),
+        service="Consulting",
+        price=40.0,
+        status=BookingStatus.CONFIRMED,
+    )
+
+    july = client.get(url).json()["trend"][0]
+    assert july["income"] == 95.0
+    assert july["expenses"] == 50.0
+    june = client.get(url.replace("2023-07-01", "2023-06-01")).json()["trend"][0]
+    assert june["income"] == 40.0
+
+
+def test_financial_report_job():
+    """
+    Tests that a report job builds the same file as the direct export, and is reused until the data changes.
+    """
+    url = "/api/v1/analytics/jobs"
+    response = client.post(url, json={"user_id": USER_ID, "report": "financial_report"})
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] in ("pending", "running", "completed")
+
+    result = client.get(f"{url}/{job['job_id']}/result?wait=true")
+    assert result.status_code == 200
+    assert "attachment; filename=financial_report.csv" in result.headers["content-disposition"]
+    assert result.text == client.get(f"/api/v1/analytics/export/financial-report/{USER_ID}").text
+    finished = client.get(f"{url}/{job['job_id']}").json()
+    assert finished["status"] == "completed"
+    assert finished["finished_at"] is not None
+
+    again = client.post(url, json={"user_id": USER_ID, "report": "financial_report"}).json()
+    assert again["job_id"] == job["job_id"]
+    gzipped = client.post(url, json={"user_id": USER_ID, "report": "financial_report", "compression": "gzip"}).json()
+    assert gzipped["job_id"] != job["job_id"]
+    result = client.get(f"{url}/{gzipped['job_id']}/result?wait=true")
+    assert gzip.decompress(result.content).decode() == client.get(f"{url}/{job['job_id']}/result").text
+
+    transactions_db.append({
+        "action": "swap_funds",
+        "details": {"transaction_id": "tx3", "source_id": "other_user", "destination_id": USER_ID, "amount": 20.0},
+        "timestamp": datetime(2023, 7, 20, 9, 0, 0),
+        "status": "completed"
+    })
+    fresh = client.post(url, json={"user_id": USER_ID, "report": "financial_report"}).json()
+    assert fresh["job_id"] != job["job_id"]
+    assert "20.0" in client.get(f"{url}/{fresh['job_id']}/result?wait=true").text
+
+
+def test_income_trend_job():
+    """
+    Tests that an income trend job returns what the endpoint does, and that bad jobs are refused.
+    """
+    url = "/api/v1/analytics/jobs"
+    params = {"start_date": "2023-07-01", "end_date": "2023-07-31", "granularity": "week"}
+    job = client.post(url, json={"user_id": USER_ID, "report": "income_trend", **params}).json()
+    result = client.get(f"{url}/{job['job_id']}/result?wait=true")
+    assert result.status_code == 200
+    assert result.headers["content-type"] == "application/json"
+    direct = client.get(f"/api/v1/analytics/income-trend/{USER_ID}", params=params).json()
+    assert result.json() == direct
+
+    assert client.post(url, json={"user_id": USER_ID, "report": "income_trend"}).status_code == 422
+    assert client.post(url, json={"user_id": USER_ID, "report": "tax_return"}).status_code == 422
+    assert client.get(f"{url}/unknown").status_code == 404
+    assert client.get(f"{url}/unknown/result").status_code == 404
+
+
+def test_report_job_is_answered_by_another_worker(tmp_path):
+    """
+    Tests that a worker process other than the one that accepted a job can follow it and read its result.
+    """
+    accepting = ReportJobs(executor="thread", directory=str(tmp_path))
+    other = ReportJobs(executor="thread", directory=str(tmp_path))
+    try:
+        job = accepting.submit(ReportJobCreate(user_id=USER_ID, report="financial_report"))
+        seen = other.get(job.id)
+        assert seen is not None
+        finished = asyncio.run(other.wait(seen, interval=0.01))
+        assert finished.status == "completed"
+        with open(finished.path, "rb") as f:
+            assert f.read().decode() == client.get(f"/api/v1/analytics/export/financial-report/{USER_ID}").text
+    finally:
+        accepting.close()
+    assert other.get(job.id) is None
+    assert not os.path.exists(job.path)
+
+
+def test_report_jobs_are_refused_once_the_queue_is_full(monkeypatch):
+    """
+    Tests that a report job is turned away with a 429 while the queue is full, and that reused jobs are not.
+    """
+    url = "/api/v1/analytics/jobs"
+    job = client.post(url, json={"user_id": USER_ID, "report": "financial_report"}).json()
+    client.get(f"{url}/{job['job_id']}/result?wait=true")
+    monkeypatch.setattr(report_jobs, "queue_size", 0)
+    response = client.post(url, json={"user_id": USER_ID, "report": "financial_report", "compression": "gzip"})
+    assert response.status_code == 429
+    assert client.post(url, json={"user_id": USER_ID, "report": "financial_report"}).json()["job_id"] == job["job_id"]
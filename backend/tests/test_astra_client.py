@@ -0,0 +1,339 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.crud import db_profiles
+from app.main import app
+from app.schemas.loads import AstraRoutine, AstraRoutineCreate
+from app.schemas.profile import Profile
+from app.services import astra
+from app.services.astra import RoutineBatcher
+from app.services.astra_client import (AstraClient, AstraError,
+                                       AstraUnavailable, CircuitBreaker,
+                                       RetryBudget)
+from app.services.astra_stub import create_app
+
+client = TestClient(app)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def scripted(*statuses):
+    """A transport answering with `statuses` in turn, recording each request."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        status = statuses[min(len(requests), len(statuses)) - 1]
+        return httpx.Response(status, json={"id": "rt_1", "status": "completed"})
+
+    return httpx.MockTransport(handler), requests
+
+
+def make_client(transport, **kwargs):
+    kwargs.setdefault("backoff_base", 0.0)
+    return AstraClient("http://astra.test", transport=transport, **kwargs)
+
+
+def test_post_returns_response_body():
+    transport, requests = scripted(200)
+    body = asyncio.run(make_client(transport).post("/routines", {"type": "send"}))
+    assert body == {"id": "rt_1", "status": "completed"}
+    assert len(requests) == 1
+
+
+def test_transient_failures_are_retried_under_one_idempotency_key():
+    transport, requests = scripted(503, 502, 200)
+    body = asyncio.run(make_client(transport).post("/routines", {}))
+    assert body["id"] == "rt_1"
+    assert len(requests) == 3
+    assert len({request.headers["Idempotency-Key"] for request in requests}) == 1
+
+
+def test_client_errors_are_not_retried():
+    transport, requests = scripted(422)
+    with pytest.raises(AstraError) as excinfo:
+        asyncio.run(make_client(transport).post("/routines", {}))
+    assert excinfo.value.status_code == 422
+    assert not isinstance(excinfo.value, AstraUnavailable)
+    assert len(requests) == 1
+
+
+def test_retries_stop_at_max_retries():
+    transport, requests = scripted(503)
+    with pytest.raises(AstraUnavailable):
+        asyncio.run(make_client(transport, max_retries=2).post("/routines", {}))
+    assert len(requests) == 3
+
+
+def test_retry_budget_limits_retries():
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, capacity=1.0)
+    transport, requests = scripted(503)
+    astra_client = make_client(transport, retry_budget=budget, breaker=CircuitBreaker(failure_threshold=100))
+
+    with pytest.raises(AstraUnavailable):
+        asyncio.run(astra_client.post("/routines", {}))
+    assert len(requests) == 2  # the budget held a single retry
+
+    with pytest.raises(AstraUnavailable):
+        asyncio.run(astra_client.post("/routines", {}))
+    assert len(requests) == 3  # and none is left
+
+
+def test_deadline_covers_a_slow_response():
+    async def handler(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={})
+
+    astra_client = make_client(httpx.MockTransport(handler), timeout=0.05)
+    with pytest.raises(AstraUnavailable):
+        asyncio.run(astra_client.post("/routines", {}))
+
+
+def test_circuit_opens_fails_fast_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=clock)
+    transport, requests = scripted(503, 503, 200)
+    astra_client = make_client(transport, max_retries=0, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(AstraUnavailable):
+            asyncio.run(astra_client.post("/routines", {}))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(AstraUnavailable) as excinfo:
+        asyncio.run(astra_client.post("/routines", {}))
+    assert excinfo.value.retry_after == 10.0
+    assert len(requests) == 2  # rejected without calling Astra
+
+    clock.now = 10.0
+    asyncio.run(astra_client.post("/routines", {}))
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert len(requests) == 3
+
+
+def test_half_open_circuit_lets_one_probe_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1.0, clock=clock)
+    breaker.record_failure()
+    clock.now = 1.0
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_cancelled_probe_does_not_wedge_the_circuit():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1.0, clock=clock)
+    started = asyncio.Event()
+
+    async def handler(request):
+        started.set()
+        await asyncio.sleep(10)
+
+    astra_client = make_client(httpx.MockTransport(handler), max_retries=0, breaker=breaker)
+    breaker.record_failure()
+    clock.now = 1.0
+
+    async def run():
+        probe = asyncio.create_task(astra_client.post("/routines", {}))
+        await started.wait()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(run())
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 2.0
+    assert breaker.allow()
+
+
+def test_unexpected_errors_count_as_failures():
+    def handler(request):
+        raise RuntimeError("broken transport")
+
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(make_client(httpx.MockTransport(handler), breaker=breaker).post("/routines", {}))
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_a_body_that_is_not_json_is_an_astra_error():
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text="<html>maintenance</html>"))
+    with pytest.raises(AstraError) as excinfo:
+        asyncio.run(make_client(transport).post("/routines", {}))
+    assert excinfo.value.status_code == 200
+
+
+def test_a_new_loop_closes_the_previous_pool():
+    transport, _ = scripted(200)
+    astra_client = make_client(transport)
+    old_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=old_loop.run_forever)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(astra_client.post("/routines", {}), old_loop).result(5)
+        old_client = astra_client._client
+        asyncio.run(astra_client.post("/routines", {}))
+        assert astra_client._client is not old_client
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.01), old_loop).result(5)
+        assert old_client.is_closed
+    finally:
+        old_loop.call_soon_threadsafe(old_loop.stop)
+        thread.join()
+        old_loop.close()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub_app = create_app(seed=0)
+    monkeypatch.setattr(astra, "astra_client", make_client(httpx.ASGITransport(app=stub_app)))
+    db_profiles.clear()
+    db_profiles[1] = Profile(user_id=1, laundr_id="@user1", user_intent_id="ui_1", kyc_status="verified")
+    db_profiles[2] = Profile(user_id=2, laundr_id="@user2", user_intent_id="ui_2", kyc_status="verified")
+    yield stub_app
+    db_profiles.clear()
+
+
+def test_send_load_calls_astra_stub(stub):
+    response = client.post("/api/v1/loads/send-load", json={"sender_id": "@user1", "recipient_id": "@user2", "amount": 10.0})
+    assert response.status_code == 200
+    assert response.json()["transaction_id"].startswith("rt_")
+    assert stub.state.calls == 1
+
+
+def test_send_load_answers_503_while_astra_is_down(stub):
+    stub.state.error_rate = 1.0
+    response = client.post("/api/v1/loads/send-load", json={"sender_id": "@user1", "recipient_id": "@user2", "amount": 10.0})
+    assert response.status_code == 503
+
+
+def routine_request(amount=10.0):
+    return AstraRoutineCreate(type="send", amount=amount, source_id="@a", destination_id="@b")
+
+
+def recording_sender(batches):
+    async def send(routines):
+        batches.append(len(routines))
+        return [AstraRoutine(id=f"rt_{routine.amount:g}", status="completed") for routine in routines]
+    return send
+
+
+def test_batcher_coalesces_concurrent_routines():
+    batches = []
+    batcher = RoutineBatcher(recording_sender(batches), max_batch_size=4, max_wait=10.0)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(routine_request(i)) for i in range(8)))
+
+    routines = asyncio.run(main())
+    assert [routine.id for routine in routines] == [f"rt_{i}" for i in range(8)]
+    assert batches == [4, 4]
+    stats = batcher.stats()
+    assert stats["batches"] == 2 and stats["full_batches"] == 2 and stats["fill_ratio"] == 1.0
+
+
+def test_batcher_sends_a_partial_batch_after_max_wait():
+    batches = []
+    batcher = RoutineBatcher(recording_sender(batches), max_batch_size=50, max_wait=0.01)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(routine_request(i)) for i in range(3)))
+
+    assert len(asyncio.run(main())) == 3
+    assert batches == [3]
+    stats = batcher.stats()
+    assert stats["fill_ratio"] == 3 / 50
+    assert stats["mean_wait_ms"] >= 5
+
+
+def test_batcher_fails_only_the_affected_callers():
+    async def send(routines):
+        if len(routines) == 1:
+            raise AstraUnavailable("down")
+        return [AstraError("rejected", 422) if routine.amount == 1 else AstraRoutine(id="rt", status="completed")
+                for routine in routines]
+
+    batcher = RoutineBatcher(send, max_batch_size=2, max_wait=0.001)
+
+    async def main():
+        pair = await asyncio.gather(*(batcher.submit(routine_request(i)) for i in range(2)), return_exceptions=True)
+        single = await asyncio.gather(batcher.submit(routine_request()), return_exceptions=True)
+        return pair + single
+
+    ok, rejected, down = asyncio.run(main())
+    assert ok.id == "rt"
+    assert isinstance(rejected, AstraError) and rejected.status_code == 422
+    assert isinstance(down, AstraUnavailable)
+
+
+def test_batcher_fails_callers_a_short_reply_leaves_out():
+    async def send(routines):
+        return [AstraRoutine(id="rt", status="completed")] * (len(routines) - 1)
+
+    batcher = RoutineBatcher(send, max_batch_size=3, max_wait=10.0)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(routine_request(i)) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, AstraError) for result in results)
+    assert "2 routines for a batch of 3" in str(results[0])
+
+
+def test_batcher_fails_callers_when_the_batch_is_cancelled():
+    started = asyncio.Event()
+
+    async def send(routines):
+        started.set()
+        await asyncio.sleep(10)
+
+    batcher = RoutineBatcher(send, max_batch_size=2, max_wait=10.0)
+
+    async def main():
+        callers = asyncio.gather(*(batcher.submit(routine_request(i)) for i in range(2)), return_exceptions=True)
+        await started.wait()
+        for task in batcher._in_flight:
+            task.cancel()
+        return await asyncio.wait_for(callers, 1)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, AstraError) for result in results)
+
+
+def test_batcher_gives_each_caller_its_own_exception():
+    async def send(routines):
+        raise AstraUnavailable("down", retry_after=3.0)
+
+    batcher = RoutineBatcher(send, max_batch_size=2, max_wait=10.0)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(routine_request(i)) for i in range(2)), return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert first is not second
+    assert isinstance(first, AstraUnavailable) and isinstance(second, AstraUnavailable)
+    assert second.retry_after == 3.0 and str(second) == "down"
+
+
+def test_create_routine_batches_through_the_stub(monkeypatch):
+    stub_app = create_app()
+    monkeypatch.setattr(astra, "astra_client", make_client(httpx.ASGITransport(app=stub_app)))
+    monkeypatch.setattr(astra, "routine_batcher", RoutineBatcher(astra._create_routines, max_batch_size=10))
+
+    async def main():
+        return await asyncio.gather(*(astra.create_routine(routine_request(i + 5)) for i in range(10)))
+
+    routines = asyncio.run(main())
+    assert len({routine.id for routine in routines}) == 10
+    assert stub_app.state.calls == 1
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from agents.security import FraudService
+from fastapi.testclient import TestClient
+
+from app.crud import db_profiles
+from app.main import app
+from app.services import audit
+from app.services.audit import AuditOutbox
+
+client = TestClient(app)
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    """Routes the app's audit trail to a file for the test."""
+    outbox = AuditOutbox(str(tmp_path / "audit.jsonl"))
+    monkeypatch.setattr(audit, "audit_outbox", outbox)
+    yield outbox
+    outbox.close()
+
+
+def test_handlers_audit_through_the_outbox(outbox):
+    db_profiles.clear()
+    response = client.post("/api/v1/profiles/", json={"@laundrID": "@audited"})
+    assert response.status_code == 201
+    outbox.flush()
+
+    records = read_lines(outbox.path)
+    actions = [record.get("action") for record in records]
+    assert "create_profile" in actions
+    created = records[actions.index("create_profile")]
+    assert created["details"]["laundr_id"] == "@audited"
+    assert created["timestamp"].endswith("Z")
+    db_profiles.clear()
+
+
+def test_agent_audit_messages_use_the_outbox(outbox):
+    FraudService().get_risk_score({"amount": 10})
+    outbox.flush()
+    messages = [record["message"] for record in read_lines(outbox.path) if record.get("source") == "agents"]
+    assert any("Risk score calculated" in message for message in messages)
+
+
+def test_rotation_keeps_backup_count_files(tmp_path):
+    path = tmp_path / "audit.jsonl"
+    outbox = AuditOutbox(str(path), batch_size=1, max_bytes=200, backup_count=2)
+    for i in range(30):
+        outbox.submit({"action": "a", "details": {"i": i}})
+    outbox.close()
+
+    assert path.exists() and (tmp_path / "audit.jsonl.1").exists() and (tmp_path / "audit.jsonl.2").exists()
+    assert not (tmp_path / "audit.jsonl.3").exists()
+    for name in ("audit.jsonl", "audit.jsonl.1", "audit.jsonl.2"):
+        assert (tmp_path / name).stat().st_size <= 200
+    newest = [record["details"]["i"] for record in read_lines(path)]
+    assert newest[-1] == 29
+
+
+def test_full_queue_blocks_callers_without_losing_records(tmp_path):
+    release = threading.Event()
+
+    class SlowOutbox(AuditOutbox):
+        def _write(self, records):
+            release.wait()
+            super()._write(records)
+
+    outbox = SlowOutbox(str(tmp_path / "audit.jsonl"), max_queue=2, batch_size=1)
+    producer = threading.Thread(target=lambda: [outbox.submit({"i": i}) for i in range(10)])
+    producer.start()
+    producer.join(timeout=0.2)
+    assert producer.is_alive()  # held back while the writer is stuck
+
+    release.set()
+    producer.join()
+    outbox.close()
+    assert [record["i"] for record in read_lines(outbox.path)] == list(range(10))
+    assert outbox.stats()["blocked"] > 0
+
+
+def test_full_queue_does_not_block_the_event_loop(tmp_path):
+    release = threading.Event()
+
+    class SlowOutbox(AuditOutbox):
+        def _write(self, records):
+            release.wait()
+            super()._write(records)
+
+    outbox = SlowOutbox(str(tmp_path / "audit.jsonl"), max_queue=2, batch_size=1)
+
+    async def handler():
+        for i in range(10):
+            outbox.submit({"i": i})
+
+    asyncio.run(asyncio.wait_for(handler(), 1))
+    release.set()
+    outbox.close()
+    assert [record["i"] for record in read_lines(outbox.path)] == list(range(10))
+    assert outbox.stats()["spilled"] > 0 and outbox.stats()["blocked"] == 0
+
+
+def test_an_unserializable_record_does_not_lose_its_batch(tmp_path):
+    release = threading.Event()
+
+    class GatedOutbox(AuditOutbox):
+        def _write(self, records):
+            release.wait()
+            super()._write(records)
+
+    circular = {}
+    circular["self"] = circular
+    outbox = GatedOutbox(str(tmp_path / "audit.jsonl"))
+    outbox.submit({"action": "first"})
+    # Queued while the writer is held up, so they share a batch
+    outbox.submit({"action": "before", "details": {"at": object()}})
+    outbox.submit({"action": "broken", "details": circular})
+    outbox.submit({"action": "after", "details": {}})
+    release.set()
+    outbox.close()
+
+    records = read_lines(outbox.path)
+    assert [record.get("action") for record in records] == ["first", "before", None, "after"]
+    assert outbox.stats()["batches"] <= 2
+    assert records[1]["details"]["at"].startswith("<object object")
+    assert "broken" in records[2]["unserializable"]
+    assert outbox.stats()["rejected"] == 1
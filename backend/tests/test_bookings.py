@@ -3,6 +3,8 @@ from fastapi.testclient import TestClient
 from app.main import app
 from app.schemas.bookings import BookingStatus
 from app.services.bookings import bookings_db
+from app.services.calendar import calendar_db
+from app.utils.pagination import encode_cursor
 from unittest.mock import patch, AsyncMock
 
 client = TestClient(app)
@@ -11,8 +13,10 @@ client = TestClient(app)
 def setup_and_teardown():
     """Clear and repopulate the dummy database before each test."""
     bookings_db.clear()
+    calendar_db.clear()
     yield
     bookings_db.clear()
+    calendar_db.clear()
 
 # --- Test Data ---
 booking_payload = {
@@ -26,9 +30,9 @@ booking_payload = {
 
 # --- Comprehensive Tests ---
 
-@patch('app.api.bookings.redis_service.reserve_slot', return_value=True)
+@patch('app.api.bookings.redis_service.reserve_slots', return_value=True)
 @patch('app.api.bookings.bookings_service.send_load', new_callable=AsyncMock)
-def test_full_negotiation_flow_happy_path(mock_send_load, mock_reserve_slot):
+def test_full_negotiation_flow_happy_path(mock_send_load, mock_reserve_slots):
     """
     Tests the entire negotiation loop:
     1. Client creates a booking request.
@@ -64,8 +68,8 @@ def test_full_negotiation_flow_happy_path(mock_send_load, mock_reserve_slot):
     assert load_create_arg.recipient_id == "freelancer1"
     assert load_create_arg.amount == 120.0 * 0.2  # 20% of the countered price
 
-@patch('app.api.bookings.redis_service.reserve_slot', return_value=True)
-def test_decline_flow(mock_reserve_slot):
+@patch('app.api.bookings.redis_service.reserve_slots', return_value=True)
+def test_decline_flow(mock_reserve_slots):
     """
     Tests the flow where a booking is declined by the freelancer.
     """
@@ -83,16 +87,96 @@ def test_create_booking_slot_already_reserved():
     """
     Tests that a booking cannot be created for a time slot that is already reserved.
     """
-    with patch('app.api.bookings.redis_service.reserve_slot', return_value=False) as mock_reserve_slot:
+    with patch('app.api.bookings.redis_service.reserve_slots', return_value=False) as mock_reserve_slots:
         response = client.post("/api/v1/bookings/", json=booking_payload)
         assert response.status_code == 409
         assert "Time slot is currently reserved" in response.json()["detail"]
-        mock_reserve_slot.assert_called_once()
+        mock_reserve_slots.assert_called_once()
 
-@patch('app.api.bookings.redis_service.reserve_slot', return_value=True)
-def test_approve_non_existent_booking(mock_reserve_slot):
+@patch('app.api.bookings.redis_service.reserve_slots', return_value=True)
+def test_approve_non_existent_booking(mock_reserve_slots):
     """
     Tests that approving a non-existent booking returns a 404 error.
     """
     response = client.post("/api/v1/bookings/non-existent-id/approve")
     assert response.status_code == 404
+
+@patch('app.api.bookings.redis_service.reserve_slots', return_value=True)
+def test_list_bookings_paginated_with_projection(mock_reserve_slots):
+    created = []
+    for hour, price in ((10, 100.0), (11, 110.0), (12, 120.0)):
+        slot = {"start_time": f"2025-10-01T{hour}:00:00", "end_time": f"2025-10-01T{hour}:30:00"}
+        response = client.post("/api/v1/bookings/", json={**booking_payload, **slot, "price": price})
+        created.append(response.json()["id"])
+
+    response = client.get("/api/v1/bookings/", params={"limit": 2, "fields": "id,price"})
+    assert response.status_code == 200
+    assert response.json() == [{"id": created[0], "price": 100.0}, {"id": created[1], "price": 110.0}]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get("/api/v1/bookings/", params={"limit": 2, "cursor": cursor})
+    assert [b["id"] for b in response.json()] == [created[2]]
+    assert response.json()[0]["status"] == BookingStatus.PENDING
+    assert "X-Next-Cursor" not in response.headers
+
+    # A deleted booking's cursor, and well-formed cursors holding the wrong key
+    del bookings_db[created[1]]
+    for key in ([created[1]], [["x"]], ["a", "b"], []):
+        response = client.get("/api/v1/bookings/", params={"cursor": encode_cursor("bookings", *key)})
+        assert response.status_code == 400
+
+
+@patch('app.api.bookings.redis_service.release_slots')
+@patch('app.api.bookings.redis_service.reserve_slots', return_value=True)
+def test_overlapping_bookings_are_refused(mock_reserve_slots, mock_release_slots):
+    """
+    Tests that a booking overlapping an active one is refused, whatever its exact times.
+    """
+    def book(start, end, freelancer_id="freelancer1"):
+        return client.post("/api/v1/bookings/", json={
+            **booking_payload, "freelancer_id": freelancer_id,
+            "start_time": f"2025-10-01T{start}:00", "end_time": f"2025-10-01T{end}:00",
+        })
+
+    first = book("09:00", "11:00")
+    assert first.status_code == 200
+    response = book("10:00", "12:00")
+    assert response.status_code == 409
+    assert "overlaps" in response.json()["detail"]
+    mock_release_slots.assert_called_once()
+    assert book("08:00", "09:30").status_code == 409
+    # Back to back, or with someone else, is fine.
+    assert book("11:00", "12:00").status_code == 200
+    assert book("10:00", "12:00", freelancer_id="freelancer2").status_code == 200
+
+    # A declined booking frees its slot.
+    client.post(f"/api/v1/bookings/{first.json()['id']}/decline")
+    assert book("10:00", "11:00").status_code == 200
+
+
+@patch('app.api.bookings.redis_service.release_slots')
+@patch('app.api.bookings.redis_service.reserve_slots', return_value=True)
+def test_bookings_respect_unavailable_calendar_events(mock_reserve_slots, mock_release_slots):
+    """
+    Tests that calendar events marking the freelancer unavailable block bookings, and
+    that countering into a taken slot is refused too.
+    """
+    event = {"id": "placeholder-id", "freelancer_id": "freelancer1", "is_available": False,
+             "start_time": "2025-10-01T13:00:00", "end_time": "2025-10-01T15:00:00"}
+    event_id = client.post("/api/v1/calendar/events", json=event).json()["id"]
+    client.post("/api/v1/calendar/events", json={**event, "is_available": True,
+                                                 "start_time": "2025-10-01T16:00:00", "end_time": "2025-10-01T18:00:00"})
+
+    slot = {"start_time": "2025-10-01T14:00:00", "end_time": "2025-10-01T15:00:00"}
+    assert client.post("/api/v1/bookings/", json={**booking_payload, **slot}).status_code == 409
+    later = {"start_time": "2025-10-01T16:30:00", "end_time": "2025-10-01T17:00:00"}
+    assert client.post("/api/v1/bookings/", json={**booking_payload, **later}).status_code == 200
+
+    # The booking at 10:00 can't be moved onto the one at 16:30.
+    booking_id = client.post("/api/v1/bookings/", json=booking_payload).json()["id"]
+    response = client.post(f"/api/v1/bookings/{booking_id}/counter", json=later)
+    assert response.status_code == 409
+    assert client.post(f"/api/v1/bookings/{booking_id}/counter", json={"end_time": "2025-10-01T11:30:00"}).status_code == 200
+
+    client.delete(f"/api/v1/calendar/events/{event_id}")
+    assert client.post("/api/v1/bookings/", json={**booking_payload, **slot}).status_code == 200
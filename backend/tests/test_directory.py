@@ -4,6 +4,7 @@ from app.main import app
 from app.crud import db_profiles
 from app.schemas.profile import Profile
 from app.schemas.directory import FreelancerProfile
+from app.utils.pagination import encode_cursor
 
 client = TestClient(app)
 
@@ -125,3 +126,261 @@ def test_sort_freelancers_by_ranking_score_deterministic():
 
     ranked_ids = [d["@laundrID"] for d in data]
     assert ranked_ids == ["@emily_white", "@john_smith", "@jane_doe"]
+
+def test_search_matches_substrings_case_insensitively():
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post("/api/v1/directory/search", json={"term": "GMA"}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [f["@laundrID"] for f in data["freelancers"]] == ["@emily_white"]
+
+    response = client.post("/api/v1/directory/search", json={"term": "_smi"}, headers=headers)
+    assert [f["@laundrID"] for f in response.json()["freelancers"]] == ["@john_smith"]
+
+def test_search_reflects_profile_updates():
+    headers = {"X-Compliance-Token": "test-token"}
+    db_profiles[3].kyc_status = "verified"
+    response = client.put("/api/v1/profiles/3", json={"skill_tags": ["Rust"]})
+    assert response.status_code == 200
+
+    response = client.post("/api/v1/directory/search", json={"term": "rust"}, headers=headers)
+    assert [u["@laundrID"] for u in response.json()["users"]] == ["@sam_jones"]
+    response = client.post("/api/v1/directory/search", json={"term": "scrum"}, headers=headers)
+    assert response.json()["users"] == []
+
+def test_sort_freelancers_pages_ranked_results():
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post(
+        "/api/v1/directory/freelancers/sort",
+        json={"sort_by": "score", "offset": 1, "limit": 1},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert [d["@laundrID"] for d in response.json()] == ["@john_smith"]
+
+def test_sort_freelancers_reflects_rating_updates():
+    headers = {"X-Compliance-Token": "test-token"}
+    db_profiles[1] = db_profiles[1].model_copy(update={"rating": 5.0})
+    response = client.post(
+        "/api/v1/directory/freelancers/sort",
+        json={"sort_by": "rating", "limit": 2},
+        headers=headers,
+    )
+    assert [d["@laundrID"] for d in response.json()] == ["@jane_doe", "@emily_white"]
+
+def test_filter_freelancers_by_availability():
+    headers = {"X-Compliance-Token": "test-token"}
+    db_profiles[4] = db_profiles[4].model_copy(update={"availability": "busy"})
+    response = client.post("/api/v1/directory/freelancers/filter", json={"availability": "available"}, headers=headers)
+    assert response.status_code == 200
+    assert [d["@laundrID"] for d in response.json()] == ["@jane_doe", "@john_smith"]
+
+def test_filter_freelancers_faceted_counts():
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post("/api/v1/directory/freelancers/filter/faceted", json={"category": "Python"}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [d["@laundrID"] for d in data["freelancers"]] == ["@jane_doe", "@john_smith"]
+    assert data["facets"]["skill_tags"] == {"Python": 2, "FastAPI": 1, "PyTorch": 1}
+    assert data["facets"]["rating"] == {"4": 2}
+    assert data["facets"]["availability"] == {"available": 2}
+
+# --- Location Tests ---
+
+def place_freelancers():
+    # Jane in Brooklyn, John in Jersey City, Emily in Philadelphia
+    for user_id, (lat, lon) in {1: (40.6782, -73.9442), 2: (40.7178, -74.0431), 4: (39.9526, -75.1652)}.items():
+        db_profiles[user_id] = db_profiles[user_id].model_copy(update={"latitude": lat, "longitude": lon})
+
+def test_filter_freelancers_by_location():
+    place_freelancers()
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post(
+        "/api/v1/directory/freelancers/filter",
+        json={"location": "40.7128,-74.0060", "radius_km": 20},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert [d["@laundrID"] for d in response.json()] == ["@jane_doe", "@john_smith"]
+
+def test_filter_freelancers_rejects_malformed_location():
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post("/api/v1/directory/freelancers/filter", json={"location": "Brooklyn"}, headers=headers)
+    assert response.status_code == 422
+
+def test_sort_freelancers_by_proximity():
+    place_freelancers()
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post(
+        "/api/v1/directory/freelancers/sort",
+        json={
+            "sort_by": "score",
+            "rating_weight": 0.0,
+            "sentiment_weight": 0.0,
+            "activity_weight": 0.0,
+            "price_weight": 0.0,
+            "location": "39.95,-75.16",
+            "proximity_radius_km": 200,
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert [d["@laundrID"] for d in response.json()] == ["@emily_white", "@john_smith", "@jane_doe"]
+
+def test_nearby_freelancers():
+    place_freelancers()
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post("/api/v1/directory/freelancers/nearby", json={"location": "40.72,-74.04", "k": 2}, headers=headers)
+    assert response.status_code == 200
+    assert [d["@laundrID"] for d in response.json()] == ["@john_smith", "@jane_doe"]
+
+# --- Result Cache Tests ---
+
+def test_repeated_search_is_served_from_cache():
+    headers = {"X-Compliance-Token": "test-token"}
+    before = client.get("/api/v1/directory/cache/stats").json()
+    client.post("/api/v1/directory/search", json={"term": "Python"}, headers=headers)
+    client.post("/api/v1/directory/search", json={"term": "python"}, headers=headers)
+    after = client.get("/api/v1/directory/cache/stats").json()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+def test_cached_results_invalidated_by_profile_writes():
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post("/api/v1/directory/freelancers/filter", json={"category": "Figma"}, headers=headers)
+    assert len(response.json()) == 1
+
+    db_profiles[6] = FreelancerProfile(user_id=6, laundr_id="@new_designer", skill_tags=["Figma"], rating=4.0)
+    response = client.post("/api/v1/directory/freelancers/filter", json={"category": "Figma"}, headers=headers)
+    assert [d["@laundrID"] for d in response.json()] == ["@emily_white", "@new_designer"]
+
+# --- Fuzzy Search and Autocomplete Tests ---
+
+def test_fuzzy_search_tolerates_typos():
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post("/api/v1/directory/search", json={"term": "Pyhton"}, headers=headers)
+    assert response.json() == {"users": [], "freelancers": []}
+
+    response = client.post("/api/v1/directory/search", json={"term": "Pyhton", "fuzzy": True}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [u["@laundrID"] for u in data["users"]] == ["@chris_green"]
+    assert [f["@laundrID"] for f in data["freelancers"]] == ["@jane_doe", "@john_smith"]
+
+def test_fuzzy_search_respects_max_distance():
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post(
+        "/api/v1/directory/search",
+        json={"term": "@jnae_doe", "fuzzy": True, "max_distance": 1},
+        headers=headers,
+    )
+    assert response.json()["freelancers"] == []
+
+    response = client.post(
+        "/api/v1/directory/search",
+        json={"term": "@jnae_doe", "fuzzy": True, "max_distance": 2},
+        headers=headers,
+    )
+    assert [f["@laundrID"] for f in response.json()["freelancers"]] == ["@jane_doe"]
+
+def test_autocomplete_prefix():
+    response = client.get("/api/v1/directory/autocomplete", params={"prefix": "@j"})
+    assert response.status_code == 200
+    assert response.json()["suggestions"] == [
+        {"text": "@jane_doe", "kind": "laundr_id", "count": 1},
+        {"text": "@john_smith", "kind": "laundr_id", "count": 1},
+    ]
+
+    response = client.get("/api/v1/directory/autocomplete", params={"prefix": "py", "limit": 1})
+    assert response.json()["suggestions"] == [{"text": "Python", "kind": "skill", "count": 3}]
+
+# --- Pagination and Projection Tests ---
+
+def test_search_cursor_pagination():
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post("/api/v1/directory/search", json={"term": "", "limit": 2}, headers=headers)
+    data = response.json()
+    assert [p["user_id"] for p in data["freelancers"] + data["users"]] == [1, 2]
+    cursor = response.headers["X-Next-Cursor"]
+
+    # A profile created mid-pagination lands after the pages already served
+    db_profiles[6] = Profile(user_id=6, laundr_id="@new_user", headline="Newcomer")
+
+    seen = []
+    while cursor:
+        response = client.post(
+            "/api/v1/directory/search", json={"term": "", "limit": 2, "cursor": cursor}, headers=headers
+        )
+        data = response.json()
+        seen += sorted(p["user_id"] for p in data["freelancers"] + data["users"])
+        cursor = response.headers.get("X-Next-Cursor")
+    assert seen == [3, 4, 5, 6]
+
+def test_filter_cursor_pagination():
+    response = client.post("/api/v1/directory/freelancers/filter", json={"limit": 2})
+    assert [f["user_id"] for f in response.json()] == [1, 2]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.post("/api/v1/directory/freelancers/filter", json={"limit": 2, "cursor": cursor})
+    assert [f["user_id"] for f in response.json()] == [4]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_sort_cursor_pagination_is_stable_under_inserts():
+    response = client.post("/api/v1/directory/freelancers/sort", json={"sort_by": "rating", "limit": 1})
+    assert [f["user_id"] for f in response.json()] == [4]
+    cursor = response.headers["X-Next-Cursor"]
+
+    # Ranked ahead of everything already served, so it must not shift the next page
+    db_profiles[6] = FreelancerProfile(user_id=6, laundr_id="@top_rated", rating=5.0)
+
+    response = client.post(
+        "/api/v1/directory/freelancers/sort", json={"sort_by": "rating", "limit": 2, "cursor": cursor}
+    )
+    assert [f["user_id"] for f in response.json()] == [2, 1]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_invalid_cursor_is_rejected():
+    response = client.post("/api/v1/directory/freelancers/filter", json={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+    # Cursors are tied to the endpoint that issued them
+    response = client.post("/api/v1/directory/freelancers/filter", json={"limit": 1})
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.post("/api/v1/directory/freelancers/sort", json={"limit": 1, "cursor": cursor})
+    assert response.status_code == 400
+
+    # Well-formed cursors of the right kind, holding the wrong key
+    for key in ([1, 2], ["x"], [[1]]):
+        cursor = encode_cursor("search", *key)
+        response = client.post(
+            "/api/v1/directory/search", json={"term": "", "cursor": cursor},
+            headers={"X-Compliance-Token": "test-token"},
+        )
+        assert response.status_code == 400
+    for key in ([1], ["x", 1], [1, "x"]):
+        cursor = encode_cursor("sort", *key)
+        response = client.post("/api/v1/directory/freelancers/sort", json={"sort_by": "rating", "cursor": cursor})
+        assert response.status_code == 400
+
+def test_fields_projection():
+    response = client.post(
+        "/api/v1/directory/freelancers/sort",
+        params={"fields": "@laundrID,rating"},
+        json={"sort_by": "rating", "limit": 2},
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"@laundrID": "@emily_white", "rating": 4.9},
+        {"@laundrID": "@john_smith", "rating": 4.8},
+    ]
+    assert "X-Next-Cursor" in response.headers
+
+    headers = {"X-Compliance-Token": "test-token"}
+    response = client.post(
+        "/api/v1/directory/search", params={"fields": "user_id"}, json={"term": "Python"}, headers=headers
+    )
+    assert response.json() == {"users": [{"user_id": 5}], "freelancers": [{"user_id": 1}, {"user_id": 2}]}
+
+def test_fields_projection_rejects_unknown_fields():
+    response = client.post("/api/v1/directory/freelancers/filter", params={"fields": "rating,password"}, json={})
+    assert response.status_code == 422
@@ -0,0 +1,206 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.crud import db_profiles
+from app.main import app
+from app.schemas.loads import AstraRoutine, LoadCreate
+from app.schemas.profile import Profile
+from app.services import astra
+from app.services.astra import transactions_db
+from app.services.idempotency import IdempotencyStore, idempotency_store
+
+client = TestClient(app)
+
+LOAD = {"sender_id": "@user1", "recipient_id": "@user2", "amount": 100.0}
+
+
+@pytest.fixture(autouse=True)
+def setup_and_teardown():
+    db_profiles.clear()
+    db_profiles[1] = Profile(user_id=1, laundr_id="@user1", user_intent_id="ui_1", kyc_status="verified")
+    db_profiles[2] = Profile(user_id=2, laundr_id="@user2", user_intent_id="ui_2", kyc_status="verified")
+    idempotency_store.clear()
+    yield
+    db_profiles.clear()
+    idempotency_store.clear()
+
+
+@pytest.fixture
+def routine_calls(monkeypatch):
+    """Counts Astra routine creations, each taking a little while."""
+    calls = []
+
+    async def create_routine(routine_data):
+        calls.append(routine_data)
+        await asyncio.sleep(0.05)
+        return AstraRoutine(id=f"rt_{len(calls)}", status="completed")
+
+    monkeypatch.setattr(astra, "create_routine", create_routine)
+    return calls
+
+
+def test_retry_with_same_key_is_replayed(routine_calls):
+    transactions_before = len(transactions_db)
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post("/api/v1/loads/send-load", json=LOAD, headers=headers)
+    second = client.post("/api/v1/loads/send-load", json=LOAD, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert len(routine_calls) == 1
+    assert len(transactions_db) == transactions_before + 1
+
+
+def test_keys_are_scoped_per_endpoint_and_optional(routine_calls):
+    headers = {"Idempotency-Key": "shared"}
+    client.post("/api/v1/loads/send-load", json=LOAD, headers=headers)
+    client.post("/api/v1/loads/request-load", json=LOAD, headers=headers)
+    client.post("/api/v1/loads/send-load", json=LOAD)
+    client.post("/api/v1/loads/send-load", json=LOAD)
+    assert len(routine_calls) == 4
+
+
+def test_reusing_a_key_for_another_request_is_refused(routine_calls):
+    headers = {"Idempotency-Key": "reused"}
+    client.post("/api/v1/loads/swap-funds", json={"source_id": "@user1", "destination_id": "@user2", "amount": 10.0}, headers=headers)
+    response = client.post("/api/v1/loads/swap-funds", json={"source_id": "@user1", "destination_id": "@user2", "amount": 20.0}, headers=headers)
+    assert response.status_code == 422
+    assert len(routine_calls) == 1
+
+
+def test_client_errors_are_replayed_server_errors_are_not(routine_calls, monkeypatch):
+    headers = {"Idempotency-Key": "missing-sender"}
+    load = {**LOAD, "sender_id": "@ghost"}
+    assert client.post("/api/v1/loads/send-load", json=load, headers=headers).status_code == 404
+    db_profiles[3] = Profile(user_id=3, laundr_id="@ghost", kyc_status="verified")
+    replay = client.post("/api/v1/loads/send-load", json=load, headers=headers)
+    assert replay.status_code == 404
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+    async def unavailable(routine_data):
+        raise HTTPException(status_code=503, detail="Astra is down")
+
+    monkeypatch.setattr(astra, "create_routine", unavailable)
+    headers = {"Idempotency-Key": "astra-down"}
+    assert client.post("/api/v1/loads/send-load", json=LOAD, headers=headers).status_code == 503
+    monkeypatch.undo()
+    assert client.post("/api/v1/loads/send-load", json=LOAD, headers=headers).status_code == 200
+
+
+def test_concurrent_duplicates_wait_for_the_first_request(routine_calls):
+    headers = {"Idempotency-Key": "double-tap"}
+    joined_before = idempotency_store.joined
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.post("/api/v1/loads/send-load", json=LOAD, headers=headers) for _ in range(5)
+            ))
+
+    responses = asyncio.run(main())
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.json()["transaction_id"] for response in responses}) == 1
+    assert len(routine_calls) == 1
+    assert idempotency_store.joined - joined_before == 4
+
+
+class DictOutcomes:
+    """Stands in for RedisOutcomes: what another worker process would see."""
+
+    def __init__(self, delays=()):
+        self.data = {}
+        self.running = set()
+        # Seconds each get() takes, in turn
+        self.delays = list(delays)
+
+    async def get(self, key):
+        outcome = self.data.get(key)
+        # Read as the round trip starts, as over a network
+        await asyncio.sleep(self.delays.pop(0) if self.delays else 0)
+        return outcome
+
+    async def put(self, key, outcome, ttl):
+        self.data[key] = outcome
+
+    async def claim(self, key, lease):
+        if key in self.running:
+            return False
+        self.running.add(key)
+        return True
+
+    async def release(self, key):
+        self.running.discard(key)
+
+
+def test_outcomes_are_shared_through_the_remote_store():
+    remote = DictOutcomes()
+    request = LoadCreate(**LOAD)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"transaction_id": "rt_1"}
+
+    async def main():
+        await IdempotencyStore(remote=remote).run("send-load", "k", request, compute)
+        # A second process has an empty local cache but the same remote.
+        return await IdempotencyStore(remote=remote).run("send-load", "k", request, compute)
+
+    replay = asyncio.run(main())
+    assert replay.status_code == 200
+    assert replay.body == b'{"transaction_id":"rt_1"}'
+    assert calls == [1]
+
+
+def test_a_duplicate_that_sees_the_first_finish_is_replayed():
+    remote = DictOutcomes(delays=[0.01, 0.05])
+    store = IdempotencyStore(remote=remote)
+    request = LoadCreate(**LOAD)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"transaction_id": f"rt_{len(calls)}"}
+
+    async def main():
+        first = asyncio.create_task(store.run("send-load", "k", request, compute))
+        # Both look the key up remotely; the first request runs to the end before the second hears back.
+        second = asyncio.create_task(store.run("send-load", "k", request, compute))
+        return await asyncio.gather(first, second)
+
+    first, second = asyncio.run(main())
+    assert first == {"transaction_id": "rt_1"}
+    assert second.body == b'{"transaction_id":"rt_1"}'
+    assert calls == [1]
+
+
+def test_a_duplicate_on_another_worker_is_refused_while_the_first_runs():
+    remote = DictOutcomes()
+    request = LoadCreate(**LOAD)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"transaction_id": "rt_1"}
+
+    async def main():
+        first = asyncio.create_task(IdempotencyStore(remote=remote).run("send-load", "k", request, compute))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as refused:
+            await IdempotencyStore(remote=remote).run("send-load", "k", request, compute)
+        assert refused.value.status_code == 409
+        await first
+        return await IdempotencyStore(remote=remote).run("send-load", "k", request, compute)
+
+    replay = asyncio.run(main())
+    assert replay.body == b'{"transaction_id":"rt_1"}'
+    assert calls == [1]
+    assert remote.running == set()
@@ -1,9 +1,13 @@
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 from app.crud import db_profiles, db_settings
 from app.schemas.profile import Profile
+from app.api import loads
 from app.api.loads import invite_serializer
+from app.services.astra import transactions_db
 
 client = TestClient(app)
 
@@ -155,3 +159,102 @@ def test_swap_funds_below_minimum_amount():
     )
     assert response.status_code == 400
     assert "at least $5.00" in response.json()["detail"]
+
+def test_send_load_follows_laundr_id_changes():
+    db_profiles[1] = Profile(user_id=1, laundr_id="@renamed", bio="user 1", user_intent_id="ui_1", kyc_status="verified")
+
+    response = client.post(
+        "/api/v1/loads/send-load",
+        json={"sender_id": "@user1", "recipient_id": "@user2", "amount": 100.0}
+    )
+    assert response.status_code == 404
+
+    response = client.post(
+        "/api/v1/loads/send-load",
+        json={"sender_id": "@renamed", "recipient_id": "@user2", "amount": 100.0}
+    )
+    assert response.status_code == 200
+
+
+# --- Tests for /send-batch ---
+
+def batch_results(response):
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return {line["index"]: line for line in lines}
+
+def test_send_batch_reports_every_item():
+    transactions_before = len(transactions_db)
+    response = client.post("/api/v1/loads/send-batch", json=[
+        {"sender_id": "@user1", "recipient_id": "@user2", "amount": 100.0},
+        {"sender_id": "@user2", "recipient_id": "@newuser", "amount": 50.0},
+        {"sender_id": "@ghost", "recipient_id": "@user2", "amount": 50.0},
+        {"sender_id": "@user1", "recipient_id": "@user2", "amount": 4.99},
+        {"sender_id": "@user1", "amount": 10.0},
+    ])
+    results = batch_results(response)
+    assert sorted(results) == [0, 1, 2, 3, 4]
+
+    assert results[0]["status_code"] == 200
+    assert results[0]["result"]["total_fee"] == 3.74
+    assert results[0]["result"]["net_amount"] == 96.26
+    assert results[0]["result"]["invite_link"] is None
+    assert results[1]["status_code"] == 200
+    assert results[1]["result"]["invite_link"].startswith("https://laundr.me/claim?token=")
+    assert results[2]["status_code"] == 404
+    assert results[3]["status_code"] == 400
+    assert results[4]["status_code"] == 422
+    assert len(transactions_db) == transactions_before + 2
+
+def test_send_batch_matches_send_load():
+    item = {"sender_id": "@user1", "recipient_id": "@user2", "amount": 123.45}
+    single = client.post("/api/v1/loads/send-load", json=item).json()
+    batched = batch_results(client.post("/api/v1/loads/send-batch", json=[item]))[0]["result"]
+    del single["transaction_id"], batched["transaction_id"]
+    assert batched == single
+
+def test_send_batch_accepts_ndjson():
+    body = "\n".join(json.dumps({"sender_id": "@user1", "recipient_id": "@user2", "amount": amount}) for amount in (10, 20, 30))
+    response = client.post(
+        "/api/v1/loads/send-batch", content=body + "\n", headers={"Content-Type": "application/x-ndjson"}
+    )
+    results = batch_results(response)
+    assert [results[i]["status_code"] for i in range(3)] == [200, 200, 200]
+
+def test_send_batch_runs_compliance_per_item():
+    db_profiles[3] = Profile(user_id=3, laundr_id="@unverified", user_intent_id="ui_3", kyc_status="pending")
+    response = client.post("/api/v1/loads/send-batch", json=[
+        {"sender_id": "@unverified", "recipient_id": "@user2", "amount": 10.0},
+        {"sender_id": "@user1", "recipient_id": "@user2", "amount": 5000.0},
+        {"sender_id": "@user1", "recipient_id": "@user2", "amount": 10.0},
+    ])
+    results = batch_results(response)
+    assert results[0] == {"index": 0, "status_code": 403, "detail": "KYC not verified"}
+    assert results[1] == {"index": 1, "status_code": 403, "detail": "Transaction risk too high"}
+    assert results[2]["status_code"] == 200
+
+def test_send_batch_answers_every_item_when_one_fails_unexpectedly(monkeypatch):
+    create_routine = loads.astra.create_routine
+
+    async def flaky(routine_data):
+        if routine_data.amount == 20.0:
+            raise RuntimeError("boom")
+        return await create_routine(routine_data)
+
+    monkeypatch.setattr(loads.astra, "create_routine", flaky)
+    transactions_before = len(transactions_db)
+    response = client.post("/api/v1/loads/send-batch", json=[
+        {"sender_id": "@user1", "recipient_id": "@user2", "amount": amount} for amount in (10.0, 20.0, 30.0)
+    ])
+    results = batch_results(response)
+    assert [results[i]["status_code"] for i in range(3)] == [200, 500, 200]
+    assert len(transactions_db) == transactions_before + 2
+
+def test_send_batch_rejects_malformed_bodies(monkeypatch):
+    assert client.post("/api/v1/loads/send-batch", json={"sender_id": "@user1"}).status_code == 400
+    assert client.post("/api/v1/loads/send-batch", content=b"[not json").status_code == 400
+
+    monkeypatch.setattr(loads, "SEND_BATCH_MAX_ITEMS", 2)
+    item = {"sender_id": "@user1", "recipient_id": "@user2", "amount": 10.0}
+    assert client.post("/api/v1/loads/send-batch", json=[item] * 3).status_code == 413
@@ -63,3 +63,11 @@ def test_update_profile_verified():
     assert response.status_code == 200
     data = response.json()
     assert data["bio"] == "updated bio for verified user"
+
+def test_create_profile_after_previous_owner_removed():
+    response = client.post("/api/v1/profiles/", json={"@laundrID": "recycled", "bio": "test bio"})
+    assert response.status_code == 201
+    del db_profiles[response.json()["user_id"]]
+
+    response = client.post("/api/v1/profiles/", json={"@laundrID": "recycled", "bio": "test bio"})
+    assert response.status_code == 201
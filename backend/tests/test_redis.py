@@ -0,0 +1,227 @@
+import asyncio
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import redis as redis_service
+from app.services.bookings import bookings_db
+from app.services.redis import SlotHolds
+
+client = TestClient(app)
+
+HOLD = timedelta(minutes=10)
+
+
+def make_holds() -> SlotHolds:
+    """Holds on the Redis at TEST_REDIS_URL, or on fakeredis when it is unset."""
+    url = os.getenv("TEST_REDIS_URL")
+    if url:
+        return SlotHolds(url)
+    fakeredis = pytest.importorskip("fakeredis")
+    # The reservation script needs fakeredis' Lua support.
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    return SlotHolds(client_factory=lambda: fakeredis.FakeAsyncRedis(server=server))
+
+
+@pytest.fixture
+def holds(monkeypatch):
+    holds = make_holds()
+    monkeypatch.setattr(redis_service, "slot_holds", holds)
+    yield holds
+    bookings_db.clear()
+
+
+@pytest.fixture
+def freelancer_id():
+    # Unique, so runs against a real server don't see each other's holds.
+    return f"freelancer-{uuid.uuid4().hex}"
+
+
+def test_slots_cover_the_booking():
+    holds = SlotHolds(slot_minutes=30)
+    assert holds.slots(datetime(2025, 10, 1, 9, 0), datetime(2025, 10, 1, 10, 0)) == [
+        "2025-10-01T09:00", "2025-10-01T09:30"]
+    assert holds.slots(datetime(2025, 10, 1, 9, 10), datetime(2025, 10, 1, 9, 20)) == ["2025-10-01T09:00"]
+    assert holds.slots(datetime(2025, 10, 1, 9, 50), datetime(2025, 10, 1, 10, 10)) == [
+        "2025-10-01T09:30", "2025-10-01T10:00"]
+    # Each end is taken as UTC on its own when naive.
+    assert holds.slots(datetime(2025, 10, 1, 9, 0, tzinfo=timezone.utc), datetime(2025, 10, 1, 10, 0)) == [
+        "2025-10-01T09:00", "2025-10-01T09:30"]
+    assert len(holds.slots(datetime(2025, 10, 1), datetime(2025, 10, 8))) == 336
+    with pytest.raises(ValueError):
+        holds.slots(datetime(2025, 10, 1), datetime(2035, 10, 1))
+
+
+def test_slots_are_held_all_or_none(holds, freelancer_id):
+    async def run():
+        morning = holds.slots(datetime(2025, 10, 1, 9, 0), datetime(2025, 10, 1, 11, 0))
+        overlapping = holds.slots(datetime(2025, 10, 1, 10, 0), datetime(2025, 10, 1, 12, 0))
+        later = holds.slots(datetime(2025, 10, 1, 11, 0), datetime(2025, 10, 1, 12, 0))
+        assert await holds.reserve(freelancer_id, morning, HOLD)
+        assert not await holds.reserve(freelancer_id, overlapping, HOLD)
+        # Nothing of the refused booking was held.
+        assert await holds.reserve(freelancer_id, later, HOLD)
+        assert await holds.reserve("someone-else", overlapping, HOLD)
+
+        await holds.release(freelancer_id, morning)
+        assert await holds.reserve(freelancer_id, morning, HOLD)
+        await holds.aclose()
+
+    asyncio.run(run())
+
+
+def test_concurrent_holds_share_a_round_trip(holds, freelancer_id):
+    async def run():
+        slots = holds.slots(datetime(2025, 10, 1, 9, 0), datetime(2025, 10, 1, 10, 0))
+        results = await asyncio.gather(*(holds.reserve(freelancer_id, slots, HOLD) for _ in range(20)))
+        assert results.count(True) == 1
+        assert (holds.round_trips, holds.commands) == (1, 20)
+        await holds.aclose()
+
+    asyncio.run(run())
+
+
+def test_holds_fail_open_without_redis():
+    holds = SlotHolds("redis://127.0.0.1:1/0", timeout=0.1)
+
+    async def run():
+        assert await holds.reserve("freelancer1", ["2025-10-01T09:00"], HOLD)
+        await holds.release("freelancer1", ["2025-10-01T09:00"])
+        await holds.aclose()
+
+    asyncio.run(run())
+
+
+class StubRedis:
+    """A client whose pipelines end however `execute` does."""
+
+    def __init__(self, execute):
+        self.execute = execute
+        self.closed = False
+
+    def register_script(self, script):
+        async def run(keys, args, client=None):
+            pass
+        return run
+
+    def pipeline(self, transaction=True):
+        return StubPipeline(self.execute)
+
+    async def aclose(self):
+        self.closed = True
+
+
+class StubPipeline:
+    def __init__(self, execute):
+        self.execute = execute
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def delete(self, *keys):
+        pass
+
+
+def test_holds_fail_open_however_the_pipeline_ends():
+    async def broken(raise_on_error):
+        raise ValueError("unexpected")
+
+    async def short(raise_on_error):
+        return []
+
+    async def hangs(raise_on_error):
+        await asyncio.Event().wait()
+
+    async def run(execute, cancel_after=None):
+        holds = SlotHolds(client_factory=lambda: StubRedis(execute))
+        reserve = asyncio.create_task(holds.reserve("freelancer1", ["2025-10-01T09:00"], HOLD))
+        release = asyncio.create_task(holds.release("freelancer1", ["2025-10-01T09:00"]))
+        if cancel_after is not None:
+            while not holds._in_flight:
+                await asyncio.sleep(0)
+            # Either before the pipeline task has started or while it waits on Redis
+            await asyncio.sleep(cancel_after)
+            for task in holds._in_flight:
+                task.cancel()
+        assert await asyncio.wait_for(reserve, 1) is True
+        assert await asyncio.wait_for(release, 1) is None
+
+    for execute in (broken, short):
+        asyncio.run(run(execute))
+    for cancel_after in (0, 0.01):
+        asyncio.run(run(hangs, cancel_after))
+
+
+def test_a_new_loop_closes_the_previous_client():
+    async def execute(raise_on_error):
+        return [1]
+
+    holds = SlotHolds(client_factory=lambda: StubRedis(execute))
+    old_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=old_loop.run_forever)
+    thread.start()
+    try:
+        reserve = holds.reserve("freelancer1", ["2025-10-01T09:00"], HOLD)
+        assert asyncio.run_coroutine_threadsafe(reserve, old_loop).result(5)
+        old_client = holds._client
+        assert asyncio.run(holds.reserve("freelancer1", ["2025-10-01T10:00"], HOLD))
+        assert holds._client is not old_client
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.01), old_loop).result(5)
+        assert old_client.closed
+    finally:
+        old_loop.call_soon_threadsafe(old_loop.stop)
+        thread.join()
+        old_loop.close()
+
+
+def test_create_booking_holds_slots_across_workers(holds, freelancer_id):
+    """
+    Tests that a booking another worker has not seen yet still holds its slots.
+    """
+    payload = {
+        "client_id": "client1",
+        "freelancer_id": freelancer_id,
+        "start_time": "2025-10-01T09:00:00",
+        "end_time": "2025-10-01T11:00:00",
+        "service": "Deep Cleaning",
+        "price": 100.0,
+    }
+    response = client.post("/api/v1/bookings/", json=payload)
+    assert response.status_code == 200
+    # As if written by another worker process, before this one synced it
+    del bookings_db[response.json()["id"]]
+
+    overlapping = {**payload, "start_time": "2025-10-01T10:30:00", "end_time": "2025-10-01T12:00:00"}
+    response = client.post("/api/v1/bookings/", json=overlapping)
+    assert response.status_code == 409
+    assert "currently reserved" in response.json()["detail"]
+    later = {**payload, "start_time": "2025-10-01T11:00:00", "end_time": "2025-10-01T12:00:00"}
+    assert client.post("/api/v1/bookings/", json=later).status_code == 200
+
+
+def test_create_booking_refuses_spans_too_long_to_hold(holds, freelancer_id):
+    """
+    Tests that a booking covering more slots than a hold may take is refused before Redis is asked.
+    """
+    payload = {
+        "client_id": "client1",
+        "freelancer_id": freelancer_id,
+        "start_time": "2025-10-01T09:00:00+00:00",
+        "end_time": "2035-10-01T09:00:00",
+        "service": "Deep Cleaning",
+        "price": 100.0,
+    }
+    response = client.post("/api/v1/bookings/", json=payload)
+    assert response.status_code == 400
+    assert holds.commands == 0
+    mixed = {**payload, "end_time": "2025-10-01T11:00:00"}
+    assert client.post("/api/v1/bookings/", json=mixed).status_code == 200
@@ -0,0 +1,523 @@
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.indexes.profile_store import ProfileStore
+from app.indexes.revenue import RevenueIndex
+from app.indexes.rollups import IncomeRollups
+from app.indexes.schedules import IntervalTree
+from app.schemas.bookings import BookingResponse, BookingStatus
+from app.schemas.directory import FreelancerProfile
+from app.schemas.profile import Profile
+from app.storage.ledger import LedgerEventLog, micros
+from app.storage.repositories import Storage
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    storage = Storage(request.param, str(tmp_path / "storage.db"))
+    yield storage
+    storage.close()
+
+
+def make_booking(booking_id, client_id="client1", freelancer_id="freelancer1", start_time=None, **fields):
+    start = start_time or datetime(2025, 10, 1, 10, 0)
+    fields = {"service": "Cleaning", "price": 100.0, "status": BookingStatus.PENDING, **fields}
+    return BookingResponse(
+        id=booking_id,
+        client_id=client_id,
+        freelancer_id=freelancer_id,
+        start_time=start,
+        end_time=start + timedelta(hours=1),
+        **fields,
+    )
+
+
+def test_repository_behaves_like_a_dict(storage):
+    bookings = storage.bookings
+    bookings["b1"] = make_booking("b1")
+    bookings["b2"] = make_booking("b2")
+    bookings["b1"] = make_booking("b1", client_id="client2")
+
+    assert list(bookings) == ["b1", "b2"]
+    assert len(bookings) == 2
+    assert "b2" in bookings and "b3" not in bookings
+    assert bookings["b1"].client_id == "client2"
+
+    del bookings["b1"]
+    assert list(bookings) == ["b2"]
+    with pytest.raises(KeyError):
+        del bookings["b1"]
+    bookings.clear()
+    assert len(bookings) == 0
+
+
+def test_repository_items_after(storage):
+    bookings = storage.bookings
+    for i in range(6):
+        bookings[f"b{i}"] = make_booking(f"b{i}")
+    # Deleting most keys compacts the memory backend's insertion order.
+    for i in (1, 2, 4, 5):
+        del bookings[f"b{i}"]
+    bookings["b1"] = make_booking("b1")
+    bookings["b3"] = make_booking("b3", client_id="client2")
+    bookings["b6"] = make_booking("b6")
+
+    assert [key for key, _ in bookings.items_after()] == ["b0", "b3", "b1", "b6"]
+    assert [key for key, _ in bookings.items_after("b0", 2)] == ["b3", "b1"]
+    assert bookings.items_after("b0", 1)[0][1].client_id == "client2"
+    assert bookings.items_after("b3")[-1][0] == "b6"
+    assert bookings.items_after("b6") == []
+    with pytest.raises(KeyError):
+        bookings.items_after("b2")
+
+
+def test_repository_find(storage):
+    bookings = storage.bookings
+    bookings.put_many({
+        "b1": make_booking("b1", client_id="alice", freelancer_id="bob"),
+        "b2": make_booking("b2", client_id="carol", freelancer_id="alice"),
+        "b3": make_booking("b3", client_id="carol", freelancer_id="bob"),
+    })
+
+    assert [b.id for b in bookings.find(freelancer_id="bob")] == ["b1", "b3"]
+    assert [b.id for b in bookings.find(client_id="carol", freelancer_id="bob")] == ["b3"]
+    assert [b.id for b in bookings.find_any(client_id="alice", freelancer_id="alice")] == ["b1", "b2"]
+    assert [b.id for b in bookings.find(start_time=datetime(2025, 10, 1, 10, 0, tzinfo=timezone.utc))] == ["b1", "b2", "b3"]
+    with pytest.raises(ValueError):
+        bookings.find(service="Cleaning")
+
+
+def test_repository_find_follows_updates(storage):
+    bookings = storage.bookings
+    bookings["b1"] = make_booking("b1", client_id="alice")
+    bookings["b2"] = make_booking("b2", client_id="alice")
+
+    # Mutated in place and assigned back, as the booking service does
+    moved = bookings["b1"]
+    moved.client_id = "dave"
+    bookings["b1"] = moved
+    assert [b.id for b in bookings.find(client_id="alice")] == ["b2"]
+    bookings["b1"] = make_booking("b1", client_id="alice")
+    assert [b.id for b in bookings.find(client_id="alice")] == ["b1", "b2"]
+    del bookings["b2"]
+    assert [b.id for b in bookings.find_any(client_id="alice", freelancer_id="nobody")] == ["b1"]
+    assert bookings.find(client_id="dave") == []
+
+
+def test_repository_watch(storage):
+    changed = []
+    storage.bookings.watch(changed.append)
+    storage.bookings["b1"] = make_booking("b1")
+    storage.bookings.put_many({"b2": make_booking("b2")})
+    del storage.bookings["b1"]
+    storage.bookings.clear()
+    assert changed == ["b1", "b2", "b1", None]
+
+
+def test_revenue_index_settles_bookings_as_time_passes(storage):
+    bookings = storage.bookings
+    revenue = RevenueIndex(bookings)
+    day = timedelta(days=1)
+    start = datetime(2025, 10, 1, 10, 0)
+    for i in range(4):
+        bookings[f"b{i}"] = make_booking(f"b{i}", client_id=f"client{i % 2}", start_time=start + i * day,
+                                         price=10.0 * (i + 1), status=BookingStatus.CONFIRMED)
+    bookings["b4"] = make_booking("b4", start_time=start, status=BookingStatus.PENDING)
+
+    assert revenue.projection("freelancer1", micros(start)) == (90.0, 3)
+    assert revenue.breakdown("freelancer1", micros(start + 2 * day), "client") == {
+        "client0": (10.0, 1), "client1": (20.0, 1)}
+    assert revenue.breakdown("freelancer1", micros(start + 3 * day + day), "service") == {"Cleaning": (100.0, 4)}
+    # Written into the settled past, then moved out of it
+    bookings["b5"] = make_booking("b5", client_id="client2", start_time=start - day, status=BookingStatus.CONFIRMED)
+    assert revenue.breakdown("freelancer1", micros(start + 4 * day), "client")["client2"] == (100.0, 1)
+    booking = bookings["b0"]
+    booking.status = BookingStatus.DECLINED
+    bookings["b0"] = booking
+    assert revenue.breakdown("freelancer1", micros(start + 4 * day), "client")["client0"] == (30.0, 1)
+    # An earlier `now` leaves out what had settled since
+    assert revenue.breakdown("freelancer1", micros(start + 2 * day), "client") == {
+        "client1": (20.0, 1), "client2": (100.0, 1)}
+    assert revenue.projection("freelancer1", micros(start + 2 * day)) == (40.0, 1)
+    assert revenue.breakdown("freelancer1", micros(start + 4 * day), "region") == {}
+    bookings.clear()
+    assert revenue.projection("freelancer1", micros(start)) == (0.0, 0)
+
+
+def test_repository_find_any_while_another_thread_writes(storage):
+    bookings = storage.bookings
+    errors = []
+
+    def write():
+        for i in range(2000):
+            bookings[f"b{i}"] = make_booking(f"b{i}", client_id=f"client{i % 3}")
+            if i % 2:
+                del bookings[f"b{i - 1}"]
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    while writer.is_alive():
+        try:
+            found = bookings.find_any(client_id="client0", freelancer_id="nobody")
+            assert all(booking.client_id == "client0" for booking in found)
+            bookings.items_after(limit=10)
+        except Exception as exc:
+            errors.append(exc)
+            break
+    writer.join()
+    assert errors == []
+    assert len(bookings.find(freelancer_id="freelancer1")) == 1000
+
+
+def test_income_rollups_build_without_keeping_off_the_loop(storage):
+    rollups = IncomeRollups(storage.transactions, storage.bookings)
+    start = datetime(2025, 10, 1, 10, 0)
+    storage.bookings["b1"] = make_booking("b1", start_time=start, status=BookingStatus.CONFIRMED)
+    storage.transactions.append({
+        "action": "swap_funds",
+        "details": {"source_id": "client1", "destination_id": "freelancer1", "amount": 20.0},
+        "timestamp": start,
+        "status": "completed",
+    })
+    day = start.date()
+
+    trend = rollups.trend("freelancer1", day, day, keep=False)
+    assert trend[0]["income"] == 120.0
+    # Nothing was kept, so nothing logged since can be counted twice.
+    assert "freelancer1" not in rollups._users
+    assert rollups.trend("freelancer1", day, day) == trend
+    assert "freelancer1" in rollups._users
+    # Kept totals are read as they are.
+    storage.bookings["b2"] = make_booking("b2", start_time=start, status=BookingStatus.CONFIRMED)
+    assert rollups.trend("freelancer1", day, day, keep=False)[0]["income"] == 220.0
+
+
+def test_income_rollups_build_without_syncing_storage(storage, monkeypatch):
+    rollups = IncomeRollups(storage.transactions, storage.bookings)
+    start = datetime(2025, 10, 1, 10, 0)
+    storage.bookings["b1"] = make_booking("b1", start_time=start, status=BookingStatus.CONFIRMED)
+
+    def sync():
+        raise AssertionError("synced on the event loop")
+
+    monkeypatch.setattr(storage.transactions, "sync", sync)
+    assert rollups.trend("freelancer1", start.date(), start.date())[0]["income"] == 100.0
+
+
+def test_interval_tree_matches_a_scan():
+    rng = random.Random(3)
+    intervals = set()
+    for i in range(200):
+        start = rng.randrange(10_000)
+        intervals.add((start, start + rng.randrange(1, 500), ("booking", f"b{i}")))
+    tree = IntervalTree(intervals)
+    for i in range(2_000):
+        roll = rng.random()
+        if roll < 0.25:
+            start = rng.randrange(10_000)
+            interval = (start, start + rng.randrange(1, 500), ("event", f"e{i}"))
+            intervals.add(interval)
+            tree.add(interval)
+        elif roll < 0.5:
+            interval = rng.choice(sorted(intervals))
+            intervals.remove(interval)
+            tree.remove(interval)
+        else:
+            start = rng.randrange(-100, 10_500)
+            end = start + rng.randrange(1, 300)
+            assert tree.overlapping(start, end) == sorted(
+                interval for interval in intervals if interval[0] < end and interval[1] > start)
+    assert len(tree) == len(intervals)
+    with pytest.raises(KeyError):
+        tree.remove((0, 1, ("booking", "missing")))
+    assert len(tree.overlapping(0, 20_000)) == len(intervals)
+
+
+def test_repository_get_many(storage):
+    bookings = storage.bookings
+    bookings.put_many({f"b{i}": make_booking(f"b{i}") for i in range(1200)})
+    if storage.db is not None:
+        bookings._cache.clear()  # read back from the table, across several IN chunks
+
+    found = bookings.get_many([f"b{i}" for i in range(0, 1200, 2)] + ["missing"])
+    assert len(found) == 600
+    assert found["b1198"].id == "b1198"
+    assert "missing" not in found
+
+
+def test_profile_store_get_many_by_laundr_id(storage):
+    profiles = ProfileStore(storage.profiles)
+    profiles[1] = Profile(user_id=1, laundr_id="@one")
+    profiles[2] = Profile(user_id=2, laundr_id="@two")
+
+    found = profiles.get_many_by_laundr_id(["@one", "@two", "@nobody"])
+    assert {laundr_id: profile.user_id for laundr_id, profile in found.items()} == {"@one": 1, "@two": 2}
+
+
+def test_event_log_between(storage):
+    transactions = storage.transactions
+    transactions.append({"action": "send_load", "details": {"amount": 1.0}, "timestamp": datetime(2023, 7, 5, 12, 0)})
+    transactions.extend([
+        {"action": "send_load", "details": {"amount": 2.0}, "timestamp": datetime(2023, 7, 6, 12, 0, tzinfo=timezone.utc)},
+        {"action": "swap_funds", "details": {"amount": 3.0}, "timestamp": datetime(2023, 7, 7, 12, 0)},
+    ])
+
+    assert len(transactions) == 3
+    assert [tx["details"]["amount"] for tx in transactions] == [1.0, 2.0, 3.0]
+    window = transactions.between(datetime(2023, 7, 6), datetime(2023, 7, 7, 12, 0))
+    assert [tx["details"]["amount"] for tx in window] == [2.0]
+    assert window[0]["timestamp"] == datetime(2023, 7, 6, 12, 0, tzinfo=timezone.utc)
+
+
+def test_event_log_involving(storage):
+    transactions = storage.transactions
+    transactions.extend([
+        {"action": "send_load", "details": {"sender_id": "@a", "recipient_id": "@b", "amount": 1.0},
+         "timestamp": datetime(2023, 7, 5)},
+        {"action": "request_load", "details": {"requester_id": "@c", "sender_id": "@a", "amount": 2.0},
+         "timestamp": datetime(2023, 7, 6)},
+        {"action": "swap_funds", "details": {"source_id": "@b", "destination_id": "@b", "amount": 3.0},
+         "timestamp": datetime(2023, 7, 7)},
+        {"action": "refund", "details": {"sender_id": "@a", "amount": 4.0}, "timestamp": datetime(2023, 7, 8)},
+    ])
+
+    assert [tx["details"]["amount"] for tx in transactions.involving("@a")] == [1.0, 2.0]
+    assert [tx["details"]["amount"] for tx in transactions.involving("@b")] == [1.0, 3.0]
+    assert [tx["details"]["amount"] for tx in transactions.involving("@b", datetime(2023, 7, 6))] == [3.0]
+    assert transactions.involving("@nobody") == []
+    transactions.clear()
+    assert transactions.involving("@a") == []
+
+
+def test_event_log_iter_involving_pages_through_entries(storage, monkeypatch):
+    monkeypatch.setattr("app.storage.sqlite._PAGE_SIZE", 2)
+    monkeypatch.setattr("app.storage.ledger._DECODE_CHUNK", 2)
+    transactions = storage.transactions
+    transactions.extend(
+        {"action": "send_load", "details": {"sender_id": "@a", "recipient_id": f"@u{i}", "amount": float(i)},
+         "timestamp": datetime(2023, 7, 1) + timedelta(hours=i)}
+        for i in range(7)
+    )
+
+    assert [tx["details"]["amount"] for tx in transactions.iter_involving("@a")] == [float(i) for i in range(7)]
+    window = transactions.iter_involving("@a", datetime(2023, 7, 1, 2), datetime(2023, 7, 1, 5))
+    assert [tx["details"]["amount"] for tx in window] == [2.0, 3.0, 4.0]
+    assert list(transactions.iter_involving("@a")) == transactions.involving("@a")
+    newest = transactions.iter_involving("@a", end=datetime(2023, 7, 1, 5), newest_first=True)
+    assert [tx["details"]["amount"] for tx in newest] == [4.0, 3.0, 2.0, 1.0, 0.0]
+    assert list(transactions.iter_involving("@nobody")) == []
+
+
+def test_event_log_listeners_hear_other_workers_after_sync(tmp_path):
+    path = str(tmp_path / "storage.db")
+    first, second = Storage("sqlite", path), Storage("sqlite", path)
+    heard = []
+    second.transactions.listen(heard.append)
+
+    first.transactions.append({"action": "send_load", "details": {"amount": 1.0}, "timestamp": datetime(2023, 7, 5)})
+    second.transactions.append({"action": "send_load", "details": {"amount": 2.0}, "timestamp": datetime(2023, 7, 6)})
+    assert [[tx["details"]["amount"] for tx in batch] for batch in heard] == [[2.0]]
+    second.sync()
+    second.sync()
+    assert [[tx["details"]["amount"] for tx in batch] for batch in heard] == [[2.0], [1.0]]
+    second.transactions.clear()
+    assert heard[-1] is None
+    first.close()
+    second.close()
+
+
+def test_sqlite_party_index_is_backfilled(tmp_path):
+    path = str(tmp_path / "storage.db")
+    storage = Storage("sqlite", path)
+    storage.transactions.append(
+        {"action": "send_load", "details": {"sender_id": "@a", "recipient_id": "@b"}, "timestamp": datetime(2023, 7, 5)}
+    )
+    with storage.db.connection() as connection:
+        connection.execute("DROP TABLE transactions_parties")
+    storage.close()
+
+    storage = Storage("sqlite", path)
+    assert len(storage.transactions.involving("@b")) == 1
+    storage.close()
+
+
+def test_sqlite_storage_survives_reopening(tmp_path):
+    path = str(tmp_path / "storage.db")
+    storage = Storage("sqlite", path)
+    profiles = ProfileStore(storage.profiles)
+    profiles[1] = Profile(user_id=1, laundr_id="@plain")
+    profiles[2] = FreelancerProfile(user_id=2, laundr_id="@pro", rating=4.5)
+    storage.bookings["b1"] = make_booking("b1")
+    storage.transactions.append({"action": "send_load", "details": {}, "timestamp": datetime(2023, 7, 5)})
+    storage.close()
+
+    storage = Storage("sqlite", path)
+    profiles = ProfileStore(storage.profiles)
+    assert isinstance(profiles[2], FreelancerProfile) and profiles[2].rating == 4.5
+    assert profiles.get_by_laundr_id("@plain").user_id == 1
+    assert storage.bookings["b1"] == make_booking("b1")
+    assert len(storage.transactions) == 1
+    storage.close()
+
+
+def test_next_id_is_unique_across_workers(tmp_path):
+    path = str(tmp_path / "storage.db")
+    workers = [Storage("sqlite", path, id_block_size=4) for _ in range(3)]
+    workers[0].profiles[7] = Profile(user_id=7, laundr_id="@existing")
+
+    ids = [worker.next_id("profiles") for _ in range(10) for worker in workers]
+    assert len(set(ids)) == len(ids)
+    assert min(ids) == 8
+    for worker in workers:
+        worker.close()
+
+
+def test_memory_next_id_follows_existing_keys():
+    storage = Storage("memory")
+    storage.profiles[3] = Profile(user_id=3, laundr_id="@three")
+    assert [storage.next_id("profiles") for _ in range(3)] == [4, 5, 6]
+
+
+def test_workers_see_each_others_writes_after_sync(tmp_path):
+    from app.indexes.search import SearchIndex
+
+    path = str(tmp_path / "storage.db")
+    first, second = Storage("sqlite", path), Storage("sqlite", path)
+    first_profiles = ProfileStore(first.profiles)
+    second_profiles = ProfileStore(second.profiles)
+    search = SearchIndex()
+    second_profiles.register_index(search)
+
+    first_profiles[1] = Profile(user_id=1, laundr_id="@shared", skill_tags=["Python"])
+    first.bookings["b1"] = make_booking("b1")
+    assert second_profiles.get_by_laundr_id("@shared") is None
+    assert second.bookings["b1"].status == BookingStatus.PENDING
+
+    generation = second_profiles.generation
+    second.sync()
+    assert second_profiles.get_by_laundr_id("@shared").skill_tags == ["Python"]
+    assert search.search("python") == [1]
+    assert second_profiles.generation > generation
+
+    # Updates evict the stale copy from the other worker's identity map
+    first.bookings["b1"] = make_booking("b1").model_copy(update={"status": BookingStatus.APPROVED})
+    first_profiles[1] = Profile(user_id=1, laundr_id="@renamed")
+    second.sync()
+    assert second.bookings["b1"].status == BookingStatus.APPROVED
+    assert second_profiles.get_by_laundr_id("@shared") is None
+    assert second_profiles.get_by_laundr_id("@renamed").user_id == 1
+
+    del first_profiles[1]
+    first.bookings.clear()
+    second.sync()
+    assert 1 not in second_profiles and search.search("renamed") == []
+    assert "b1" not in second.bookings
+    first.close()
+    second.close()
+
+
+def test_overlapping_syncs_replay_each_write_once(tmp_path):
+    path = str(tmp_path / "storage.db")
+    first, second = Storage("sqlite", path), Storage("sqlite", path)
+    changed, heard = [], []
+    second.bookings.watch(changed.append)
+    second.transactions.listen(heard.append)
+
+    first.bookings["b1"] = make_booking("b1")
+    first.transactions.append({"action": "send_load", "details": {"amount": 1.0}, "timestamp": datetime(2023, 7, 5)})
+    # Read by two requests at once, e.g. on worker threads
+    earlier = second.pending()
+    first.bookings["b2"] = make_booking("b2")
+    first.transactions.append({"action": "send_load", "details": {"amount": 2.0}, "timestamp": datetime(2023, 7, 6)})
+    later = second.pending()
+
+    second.replay(later)
+    second.replay(earlier)
+    assert changed == ["b1", "b2"]
+    assert [[tx["details"]["amount"] for tx in batch] for batch in heard] == [[1.0, 2.0]]
+    second.sync()
+    assert changed == ["b1", "b2"] and len(heard) == 1
+    first.close()
+    second.close()
+
+
+def test_ledger_round_trips_entries():
+    ledger = LedgerEventLog()
+    sent = {
+        "action": "send_load",
+        "details": {"transaction_id": f"rt_{uuid.uuid4()}", "sender_id": "@a", "recipient_id": "@b", "amount": 10.25, "fee": 1.5},
+        "timestamp": datetime(2023, 7, 5, 12, 0, 0, 123456),
+        "status": "completed",
+    }
+    odd = {
+        "action": "refund",
+        "details": {"transaction_id": "tx1", "sender_id": "@a", "amount": 0.125, "note": "partial"},
+        "timestamp": datetime(2023, 7, 6, 12, 0, tzinfo=timezone(timedelta(hours=2))),
+        "origin": "import",
+    }
+    ledger.extend([sent, odd])
+
+    assert list(ledger) == [sent, {**odd, "timestamp": datetime(2023, 7, 6, 10, 0, tzinfo=timezone.utc)}]
+    # UUID-suffixed transaction ids don't each take a string table entry
+    assert ledger.string_id("rt_") is not None
+    assert ledger.string_id(sent["details"]["transaction_id"]) is None
+
+
+def test_ledger_segments_prune_by_timestamp():
+    ledger = LedgerEventLog(segment_records=4)
+    start = datetime(2023, 7, 1)
+    ledger.extend(
+        {"action": "send_load", "details": {"sender_id": "@a", "recipient_id": f"@u{i % 3}", "amount": float(i)},
+         "timestamp": start + timedelta(days=i)}
+        for i in range(10)
+    )
+    assert ledger.stats()["segments"] == 3
+
+    window = ledger.between(start + timedelta(days=5), start + timedelta(days=7))
+    assert [tx["details"]["amount"] for tx in window] == [5.0, 6.0]
+    records = ledger.scan(start + timedelta(days=3))
+    assert records["amount"][records["destination"] == ledger.string_id("@u0")].sum() == 300 + 600 + 900
+
+
+def test_ledger_files_survive_reopening(tmp_path):
+    path = str(tmp_path / "ledger")
+    ledger = LedgerEventLog(path, segment_records=2)
+    ledger.extend(
+        {"action": "swap_funds", "details": {"source_id": "@a", "destination_id": "@b", "amount": 1.0},
+         "timestamp": datetime(2023, 7, 5, i)}
+        for i in range(3)
+    )
+    with pytest.raises(RuntimeError):
+        LedgerEventLog(path)
+    ledger.close()
+
+    ledger = LedgerEventLog(path, segment_records=2)
+    ledger.append({"action": "swap_funds", "details": {"source_id": "@c"}, "timestamp": datetime(2023, 7, 6)})
+    assert len(ledger) == 4
+    assert [tx["details"].get("destination_id") for tx in ledger] == ["@b", "@b", "@b", None]
+    assert len(ledger.involving("@a")) == 3 and len(ledger.involving("@c")) == 1
+    ledger.close()
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_ledger_keeps_unique_details_out_of_the_string_table(tmp_path, on_disk):
+    path = str(tmp_path / "ledger") if on_disk else None
+    ledger = LedgerEventLog(path)
+    entries = [
+        {"action": "refund", "details": {"sender_id": "@a", "note": f"order {i}"}, "timestamp": datetime(2023, 7, 5, i)}
+        for i in range(5)
+    ]
+    ledger.extend(entries)
+    assert ledger.stats()["strings"] == 1  # "refund"
+    assert list(ledger) == entries
+    if on_disk:
+        ledger.close()
+        ledger = LedgerEventLog(path)
+        assert list(ledger) == entries
+    ledger.clear()
+    assert ledger.stats()["extra_bytes"] == 0
+    ledger.close()